@@ -0,0 +1,13 @@
+"""
+Benchmark suite measuring the throughput of a full Radarr/Sonarr pass against local stand-in services.
+
+Modules:
+    - benchmarks.fake_services: Fake Radarr, Sonarr and TMDB HTTP servers with synthetic libraries.
+    - benchmarks.fake_ffmpeg: Stand-in for the ffmpeg binary with a configurable latency.
+    - benchmarks.run: Command line entry point running the passes and printing the report.
+
+Usage:
+    .. code-block:: bash
+
+        python -m benchmarks.run --movies 1000 --shows 200 --seasons 5
+"""
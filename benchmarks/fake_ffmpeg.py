@@ -0,0 +1,33 @@
+"""
+Stand-in for the ffmpeg binary used by the benchmark suite.
+
+The script waits for a configurable latency, then copies its input file to its output file, so the ffmpeg stage
+of the pipeline pays a realistic process start-up cost without transcoding anything.
+
+Usage:
+    .. code-block:: bash
+
+        python benchmarks/fake_ffmpeg.py --latency 0.2 input.webm output.mkv
+"""
+
+import argparse
+import shutil
+import time
+
+
+def main() -> None:
+    """
+    Parse the arguments, wait and copy the input to the output.
+    """
+    parser = argparse.ArgumentParser(description="Fake ffmpeg for the benchmark suite.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before writing the output.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args()
+
+    time.sleep(args.latency)
+    shutil.copyfile(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Fake Radarr, Sonarr and TMDB HTTP servers serving synthetic libraries for the benchmark suite.
+
+Each service runs its own `ThreadingHTTPServer` on a free local port:
+    - Radarr: `GET /api/v3/movie` and `GET /api/v3/movie/{id}`.
+    - Sonarr: `GET /api/v3/series` and `GET /api/v3/series/{id}`.
+    - TMDB: `GET /3/movie/{id}/videos`, `GET /3/tv/{id}` (with `append_to_response`) and
+      `GET /3/tv/{id}/season/{n}/videos`.
+
+Library listings are encoded once and served from memory; TMDB responses can be delayed to emulate the network.
+
+Dependencies:
+    - json: Encoding of the responses.
+    - re: Routing of the TMDB paths.
+    - threading: Server threads.
+    - time: Emulated TMDB latency.
+    - http.server: Built-in HTTP server.
+    - urllib.parse: Query string parsing.
+
+Classes:
+    - FakeServices:
+        Starts and stops the three fake services for a synthetic library.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+def _video(key: str) -> dict:
+    """
+    Build a TMDB video entry matching the default `TMDB_*` filters.
+
+    :param key: YouTube key of the video
+    :return: TMDB video dictionary
+    """
+    return {
+        "key": key,
+        "name": "Official Trailer",
+        "official": True,
+        "type": "Trailer",
+        "size": 1080,
+        "site": "YouTube",
+        "published_at": "2020-01-01T00:00:00.000Z",
+    }
+
+
+class FakeServices:
+    """
+    Fake Radarr, Sonarr and TMDB servers for a synthetic library.
+
+    Attributes:
+        movies (list): Radarr movie resources.
+        series (list): Sonarr series resources.
+        radarr_url (str): Base URL of the fake Radarr, set by `start()`.
+        sonarr_url (str): Base URL of the fake Sonarr, set by `start()`.
+        tmdb_url (str): Base URL of the fake TMDB API (including `/3`), set by `start()`.
+
+    Usage:
+        .. code-block:: python
+
+            services = FakeServices("/tmp/library", movies=1000, shows=100, seasons=5, tmdb_latency=0.02)
+            services.start()
+            ...
+            services.stop()
+    """
+
+    def __init__(self, root: str, movies: int, shows: int, seasons: int, tmdb_latency: float = 0.0) -> None:
+        """
+        Build the synthetic library.
+
+        :param root: Directory holding the `movies` and `shows` root folders
+        :param movies: Number of movies
+        :param shows: Number of TV shows
+        :param seasons: Number of seasons per TV show
+        :param tmdb_latency: Seconds added to every TMDB response
+        """
+        self.tmdb_latency = tmdb_latency
+        self.movies = [
+            {
+                "id": index,
+                "title": f"Movie {index}",
+                "year": 1980 + index % 45,
+                "path": f"{root}/movies/Movie {index} ({1980 + index % 45})",
+                "tmdbId": index,
+                "added": "2024-01-01T00:00:00Z",
+            }
+            for index in range(1, movies + 1)
+        ]
+        self.series = [
+            {
+                "id": index,
+                "title": f"Show {index}",
+                "year": 1990 + index % 35,
+                "path": f"{root}/shows/Show {index}",
+                "tmdbId": 100000 + index,
+                "added": "2024-01-01T00:00:00Z",
+                "seasons": [{"seasonNumber": number} for number in range(1, seasons + 1)],
+            }
+            for index in range(1, shows + 1)
+        ]
+        self.radarr_url = self.sonarr_url = self.tmdb_url = None
+        self._servers: List[ThreadingHTTPServer] = []
+
+    def start(self) -> None:
+        """
+        Start the three servers in background threads.
+        """
+        movies = {movie["id"]: movie for movie in self.movies}
+        series = {show["id"]: show for show in self.series}
+        radarr = self._serve(self._arr_routes("movie", self.movies, movies))
+        sonarr = self._serve(self._arr_routes("series", self.series, series))
+        tmdb = self._serve(self._tmdb)
+        self.radarr_url = f"http://127.0.0.1:{radarr.server_port}"
+        self.sonarr_url = f"http://127.0.0.1:{sonarr.server_port}"
+        self.tmdb_url = f"http://127.0.0.1:{tmdb.server_port}/3"
+
+    def stop(self) -> None:
+        """
+        Stop the servers.
+        """
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def _serve(self, route: Callable[[str, dict], Optional[object]]) -> ThreadingHTTPServer:
+        """
+        Start one server answering every GET request with `route`.
+
+        :param route: Function returning the JSON body (or pre-encoded bytes) for a path and query, None for 404
+        :return: Running server
+        """
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real services, so the client connection pools are exercised
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                body = route(url.path, {name: values[0] for name, values in parse_qs(url.query).items()})
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-service", daemon=True).start()
+        self._servers.append(server)
+        return server
+
+    @staticmethod
+    def _arr_routes(resource: str, items: list, by_id: Dict[int, dict]) -> Callable[[str, dict], Optional[object]]:
+        """
+        Build the routes of a fake Radarr or Sonarr.
+
+        :param resource: "movie" or "series"
+        :param items: Every item of the library
+        :param by_id: Items by id
+        :return: Route function
+        """
+        listing = json.dumps(items).encode("utf-8")
+        single = re.compile(rf"^/api/v3/{resource}/(\d+)$")
+
+        def route(path: str, query: dict) -> Optional[object]:
+            if path == f"/api/v3/{resource}":
+                return listing
+            match = single.match(path)
+            if match:
+                return by_id.get(int(match.group(1)))
+            if path == "/api/v3/history/since":
+                return []
+            return None
+
+        return route
+
+    def _tmdb(self, path: str, query: dict) -> Optional[object]:
+        """
+        Route of the fake TMDB API.
+
+        :param path: Request path
+        :param query: Query parameters
+        :return: JSON body, or None for unknown paths
+        """
+        if self.tmdb_latency:
+            time.sleep(self.tmdb_latency)
+
+        match = re.match(r"^/3/movie/(\d+)/videos$", path)
+        if match:
+            return {"id": int(match.group(1)), "results": [_video(f"movie{match.group(1)}")]}
+
+        match = re.match(r"^/3/tv/(\d+)/season/(\d+)/videos$", path)
+        if match:
+            return {"results": [_video(f"tv{match.group(1)}s{match.group(2)}")]}
+
+        match = re.match(r"^/3/tv/(\d+)$", path)
+        if match:
+            show = {"id": int(match.group(1))}
+            for name in filter(None, query.get("append_to_response", "").split(",")):
+                season = re.match(r"^season/(\d+)/videos$", name)
+                key = f"tv{match.group(1)}s{season.group(1)}" if season else f"tv{match.group(1)}"
+                show[name] = {"results": [_video(key)]}
+            return show
+
+        return None
+
+
+def percentiles(samples: List[float]) -> Tuple[float, float]:
+    """
+    Compute the median and 95th percentile of a list of durations.
+
+    :param samples: Durations in seconds
+    :return: Tuple (p50, p95), zeros when there is no sample
+    """
+    if not samples:
+        return 0.0, 0.0
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return at(0.50), at(0.95)
@@ -0,0 +1,123 @@
+"""
+Stand-in for `yt_dlp.YoutubeDL` used by the benchmark suite.
+
+The fake answers metadata extractions immediately and "downloads" a video by waiting for a configurable latency
+and writing a small file to the output template, then calls the progress hooks like yt-dlp does. Everything
+around it (candidate ranking, staging directories, hooks, format bookkeeping) is the application's own code.
+
+Classes:
+    - FakeYoutubeDL:
+        Replacement for `yt_dlp.YoutubeDL`, configured through class attributes.
+"""
+
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeYoutubeDL:
+    """
+    Replacement for `yt_dlp.YoutubeDL`.
+
+    Attributes:
+        latency (float): Seconds spent by every download.
+        size (int): Size in bytes of every downloaded file.
+        duration (int): Duration in seconds reported for every video.
+    """
+
+    latency = 0.0
+    size = 64 * 1024
+    duration = 120
+
+    def __init__(self, params: dict = None) -> None:
+        """
+        Keep the options like yt-dlp, with `outtmpl` normalised into a dictionary.
+
+        :param params: yt-dlp options
+        """
+        self.params = dict(params or {})
+        self.params["outtmpl"] = {"default": "%(title)s.%(ext)s"}
+
+    @staticmethod
+    def _video_id(url: str) -> str:
+        """
+        Extract the video id of a YouTube URL, or derive one from a search query.
+
+        :param url: Video URL or `ytsearch` query
+        :return: Video id
+        """
+        query = parse_qs(urlparse(url).query)
+        if "v" in query:
+            return query["v"][0]
+        return f"search{abs(hash(url)) % 10**8}"
+
+    def extract_info(self, url: str, download: bool = True) -> dict:
+        """
+        Return the metadata of a video, downloading it when asked.
+
+        Search queries return flat entries, without formats, like yt-dlp with `extract_flat`.
+
+        :param url: Video URL or `ytsearch` query
+        :param download: Write the video to the output template
+        :return: Information dictionary
+        """
+        video_id = self._video_id(url)
+        info = {
+            "id": video_id,
+            "title": f"Trailer {video_id}",
+            "duration": self.duration,
+            "height": 1080,
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "ext": "webm",
+            "acodec": "opus",
+        }
+        if url.startswith("ytsearch"):
+            return {"id": url, "entries": [dict(info, _type="url", url=info["webpage_url"])]}
+        info["formats"] = [{"format_id": "251", "ext": "webm", "acodec": "opus"}]
+        return self.process_ie_result(info, download)
+
+    @staticmethod
+    def sanitize_info(info_dict: dict, remove_private_keys: bool = False) -> dict:
+        """
+        Copy an information dictionary, dropping what a download adds to it.
+
+        :param info_dict: Information dictionary
+        :param remove_private_keys: Drop the download results
+        :return: Copy of the dictionary
+        """
+        info = dict(info_dict)
+        if remove_private_keys:
+            info.pop("requested_downloads", None)
+        return info
+
+    def process_ie_result(self, info: dict, download: bool = True) -> dict:
+        """
+        Download a video from metadata extracted earlier.
+
+        :param info: Information dictionary returned by `extract_info`
+        :param download: Write the video to the output template
+        :return: Information dictionary
+        """
+        if not download:
+            return info
+
+        time.sleep(self.latency)
+        template = self.params["outtmpl"]["default"]
+        filepath = template.replace("%(ext)s", "webm") if "%(ext)s" in template else f"{template}.webm"
+        with open(filepath, "wb") as f:
+            f.write(os.urandom(self.size))
+        for hook in self.params.get("progress_hooks", []):
+            hook({"status": "finished", "filename": filepath, "info_dict": info})
+        info["requested_downloads"] = [{"filepath": filepath, "ext": "webm", "acodec": "opus"}]
+        return info
+
+    def download(self, urls) -> int:
+        """
+        Download one or several videos.
+
+        :param urls: Video URL or list of URLs
+        :return: 0, like yt-dlp on success
+        """
+        for url in [urls] if isinstance(urls, str) else urls:
+            self.extract_info(url, download=True)
+        return 0
@@ -0,0 +1,223 @@
+"""
+Run full Radarr and Sonarr passes against the fake services and report their throughput.
+
+The passes use the application's own code end to end: `radarr()` and `sonarr()` list the fake libraries through
+pyarr, the shared `TrailerPipeline` looks the items up on the fake TMDB API, the fake yt-dlp "downloads" the
+trailers into the staging directories and `benchmarks/fake_ffmpeg.py` stands in for ffmpeg. The library folders
+live in a temporary directory removed at the end of the run.
+
+For every pass the report gives the number of items, the items per second, the p50/p95 duration of the TMDB,
+download and ffmpeg stages, and the peak resident memory of the process so far.
+
+Dependencies:
+    - argparse: Command line parsing.
+    - contextlib: Silences the console output of the passes.
+    - os: Operating system interface for file operations.
+    - resource: Peak resident memory of the process.
+    - shlex: Quoting of the fake ffmpeg command.
+    - shutil: Removal of the temporary libraries.
+    - sys: Path of the Python interpreter.
+    - tempfile: Temporary library folders.
+    - threading: Protects the stage timings recorded by the workers.
+    - time: Measurement of the passes and stages.
+    - yaml: Loading of the example configuration.
+    - benchmarks.fake_services.FakeServices: Fake Radarr, Sonarr and TMDB servers.
+    - benchmarks.fake_ytdlp.FakeYoutubeDL: Stand-in for `yt_dlp.YoutubeDL`.
+    - modules.async_engine.AsyncPipeline: Pipeline of the asyncio engine, with `--engine asyncio`.
+
+Functions:
+    - build_config(args, services, root) -> dict:
+        Build the configuration of the run from `config/example.config.yaml`.
+    - instrument(pipeline) -> dict:
+        Record the duration of every stage of a pipeline.
+    - main():
+        Parse the arguments, run the passes and print the report.
+
+Usage:
+    .. code-block:: bash
+
+        python -m benchmarks.run --movies 10000 --shows 1000 --seasons 5 --download-latency 0.05
+"""
+
+import argparse
+import contextlib
+import os
+import resource
+import shlex
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import yaml
+import yt_dlp
+from benchmarks.fake_services import FakeServices, percentiles
+from benchmarks.fake_ytdlp import FakeYoutubeDL
+from modules.logger import Logger
+from modules.utils import Utils
+from modules.pipeline import TrailerPipeline
+from modules.async_engine import AsyncPipeline
+from modules.radarr import radarr
+from modules.sonarr import sonarr
+
+
+def build_config(args: argparse.Namespace, services: FakeServices, root: str) -> dict:
+    """
+    Build the configuration of the run from `config/example.config.yaml`.
+
+    Persistence, rate limiting, the free space check and the console output are disabled so the passes measure
+    the application and not the environment.
+
+    :param args: Parsed command line arguments
+    :param services: Started fake services
+    :param root: Temporary directory of the libraries
+    :return: Configuration dictionary
+    """
+    with open("config/example.config.yaml", "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    fake_ffmpeg = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ffmpeg.py")
+    config.update(
+        {
+            "RADARR_HOST": services.radarr_url,
+            "RADARR_API": "benchmark",
+            "SONARR_HOST": services.sonarr_url,
+            "SONARR_API": "benchmark",
+            "TMDB_API_KEY": "benchmark",
+            "TMDB_RATE_LIMIT": 0,
+            "TMDB_CACHE_PATH": "",
+            "APP_STATE_PATH": "",
+            "APP_INCREMENTAL_SYNC": False,
+            "APP_WEBHOOK_ENABLED": False,
+            "APP_CUSTOM_PATH": "",
+            "APP_FREE_SPACE_GB": 0,
+            "APP_QUIET_MODE": True,
+            "APP_LOG_PATH": None,
+            "YT_DLP_INTERVAL_REQUESTS": 0,
+            "FFMPEG_COMMAND_TEMPLATE": f"{shlex.quote(sys.executable)} {shlex.quote(fake_ffmpeg)} --latency {args.ffmpeg_latency} '{{path}}' '{{path_file}}'",
+        }
+    )
+    for key in ("APP_TMDB_WORKERS", "APP_DOWNLOAD_WORKERS", "APP_FFMPEG_WORKERS"):
+        value = getattr(args, key.lower()[4:])
+        if value is not None:
+            config[key] = value
+    return config
+
+
+def instrument(pipeline: TrailerPipeline) -> dict:
+    """
+    Record the duration of every stage of a pipeline.
+
+    Must be called before `pipeline.start()`, the workers bind the stage handlers when they start.
+
+    :param pipeline: Pipeline to instrument
+    :return: Dictionary of stage name to the list of durations, filled while the pipeline runs
+    """
+    timings = {stage: [] for stage in TrailerPipeline.STAGES}
+    lock = threading.Lock()
+
+    def timed(stage, handler):
+        def run(job):
+            started = time.perf_counter()
+            try:
+                return handler(job)
+            finally:
+                with lock:
+                    timings[stage].append(time.perf_counter() - started)
+
+        return run
+
+    def timed_async(stage, handler):
+        async def run(job):
+            started = time.perf_counter()
+            try:
+                return await handler(job)
+            finally:
+                with lock:
+                    timings[stage].append(time.perf_counter() - started)
+
+        return run
+
+    if isinstance(pipeline, AsyncPipeline):
+        pipeline._lookup_async = timed_async("tmdb", pipeline._lookup_async)
+        pipeline._download_async = timed_async("download", pipeline._download_async)
+        pipeline._post_process_async = timed_async("ffmpeg", pipeline._post_process_async)
+        return timings
+    pipeline._lookup = timed("tmdb", pipeline._lookup)
+    pipeline._download = timed("download", pipeline._download)
+    pipeline._post_process = timed("ffmpeg", pipeline._post_process)
+    return timings
+
+
+def main():
+    """
+    Parse the arguments, run the passes and print the report.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark full Radarr/Sonarr passes against local fake services.")
+    parser.add_argument("--movies", type=int, default=1000, help="Number of movies in the fake Radarr library.")
+    parser.add_argument("--shows", type=int, default=100, help="Number of TV shows in the fake Sonarr library.")
+    parser.add_argument("--seasons", type=int, default=5, help="Number of seasons per TV show.")
+    parser.add_argument("--tmdb-latency", type=float, default=0.0, help="Seconds added to every TMDB response.")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="Seconds spent by every fake download.")
+    parser.add_argument("--ffmpeg-latency", type=float, default=0.0, help="Seconds spent by every fake ffmpeg run.")
+    parser.add_argument("--tmdb-workers", type=int, default=None, help="Override APP_TMDB_WORKERS.")
+    parser.add_argument("--download-workers", type=int, default=None, help="Override APP_DOWNLOAD_WORKERS.")
+    parser.add_argument("--ffmpeg-workers", default=None, help="Override APP_FFMPEG_WORKERS.")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="Pipeline engine, see APP_ENGINE.")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="trailer-finder-bench-")
+    services = FakeServices(root, args.movies, args.shows, args.seasons, args.tmdb_latency)
+    services.start()
+    try:
+        config = build_config(args, services, root)
+        logger = Logger(local=config.get("APP_TRANSLATE"), log_level="WARNING")
+        FakeYoutubeDL.latency = args.download_latency
+        yt_dlp.YoutubeDL = FakeYoutubeDL
+
+        utils = Utils(logger, config)
+        utils.tmdb.BASE_URL = services.tmdb_url
+        # The fake TMDB API is plain HTTP, it gets the same pool and retry policy as the real one
+        utils.tmdb.session.mount("http://", utils.tmdb.session.get_adapter("https://"))
+
+        pipeline = AsyncPipeline(logger, config, utils) if args.engine == "asyncio" else TrailerPipeline(logger, config, utils)
+        timings = instrument(pipeline)
+        pipeline.start()
+
+        print(
+            f"Library: {args.movies} movies, {args.shows} shows x {args.seasons} seasons. Engine: {args.engine}. "
+            f"Workers: {pipeline.workers['tmdb']} TMDB, {pipeline.workers['download']} download, {pipeline.workers['ffmpeg']} ffmpeg."
+        )
+        header = f"{'pass':<8}{'items':>8}{'seconds':>10}{'items/s':>10}"
+        for stage in TrailerPipeline.STAGES:
+            header += f"{stage + ' p50/p95 ms':>24}"
+        print(header + f"{'peak RSS MB':>14}")
+
+        for name, library_pass in (("radarr", radarr), ("sonarr", sonarr)):
+            for samples in timings.values():
+                samples.clear()
+            utils.scan.reset()
+            started = time.perf_counter()
+            with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+                library_pass(logger, config, utils, pipeline)
+            elapsed = time.perf_counter() - started
+            stats = pipeline.summary().get(name, {})
+            items = sum(stats.values())
+
+            line = f"{name:<8}{items:>8}{elapsed:>10.2f}{items / elapsed if elapsed else 0:>10.1f}"
+            for stage in TrailerPipeline.STAGES:
+                p50, p95 = percentiles(timings[stage])
+                line += f"{f'{p50 * 1000:.1f}/{p95 * 1000:.1f}':>24}"
+            # ru_maxrss is in kilobytes on Linux
+            line += f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>14.1f}"
+            print(line)
+            print("        outcomes: " + ", ".join(f"{outcome} {stats.get(outcome, 0)}" for outcome in TrailerPipeline.OUTCOMES))
+
+        pipeline.close()
+    finally:
+        services.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
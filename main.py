@@ -1,28 +1,51 @@
 """
 Main script to run Sonarr and Radarr processes for finding and downloading trailers.
 
-This script executes Sonarr and Radarr processes in a loop to find and download trailers
-for both TV shows and movies. It utilizes configurations from 'config/config.yaml' for
-customizing settings such as API keys, file paths, and sleep duration between runs.
+This script runs the Sonarr and Radarr processes on a schedule to find and download trailers
+for both TV shows and movies. Both passes feed a single shared trailer pipeline, so the
+download and ffmpeg worker limits are global, and with `APP_PARALLEL_LIBRARIES` enabled
+the two library scans run concurrently. It utilizes configurations from 'config/config.yaml' for
+customizing settings such as API keys, file paths, and the schedule of each job (`APP_SCHEDULE`).
 Events and errors are logged using a Logger instance configured with localization and
 date formatting settings from the configuration file.
 
 Dependencies:
-    - os: Operating system interface for file operations and clearing console screen.
+    - argparse: Command line options.
+    - os: Operating system interface for file operations.
     - sys: System-specific parameters and functions.
-    - time.sleep: Function to pause execution for a specified amount of time.
+    - shutil: Removal of the staging directory left by older versions.
+    - threading: Runs the Radarr and Sonarr scans concurrently in parallel mode.
     - yaml: Library for reading YAML configuration files.
     - modules.sonarr.sonarr: Module for interacting with Sonarr API to find and download TV show trailers.
     - modules.radarr.radarr: Module for interacting with Radarr API to find and download movie trailers.
     - modules.logger.Logger: Logger instance for logging messages with custom formatting and color output.
     - modules.utils.Utils: Utility functions instance for handling trailer downloads and processing.
+    - modules.pipeline.TrailerPipeline: Staged pipeline shared by the Radarr and Sonarr passes.
+    - modules.async_engine.AsyncPipeline: Asyncio variant of the pipeline, enabled by `APP_ENGINE: asyncio`.
+    - modules.state_store.StateStore: Persistent record of processed items, enabled by `APP_STATE_PATH`.
+    - modules.incremental_sync.IncrementalSync: Change detection for incremental passes, enabled by `APP_INCREMENTAL_SYNC`.
+    - modules.webhook.WebhookServer: Listener for Radarr/Sonarr webhooks, enabled by `APP_WEBHOOK_ENABLED`.
+    - modules.metrics.MetricsServer: Prometheus metrics endpoint, enabled by `APP_METRICS_ENABLED`.
+    - modules.scheduler.Scheduler: Runs the library passes and maintenance jobs on their schedules.
+    - modules.work_queue.WorkQueue: Work queue shared by several nodes, enabled by `APP_QUEUE_PATH`.
+    - modules.profiler: Stage timers, enabled by `APP_PROFILE`, and the cycle profile of `--profile`.
     - modules.exceptions.FfmpegError: Exception raised for errors related to FFMPEG processing.
     - modules.exceptions.FfmpegCommandMissing: Exception raised when FFMPEG command is missing in configuration.
     - modules.exceptions.InvalidLogLevelError: Exception raised for invalid logging levels.
     - modules.exceptions.InvalidLogCountError: Exception raised for invalid log backup count.
     - modules.exceptions.InvalidLogSizeError: Exception raised for invalid log file size.
+    - modules.exceptions.InvalidLogFormatError: Exception raised for an invalid log format.
+    - modules.exceptions.InvalidScheduleError: Exception raised for an invalid job schedule.
 
 Functions:
+    - parse_args(argv=None) -> argparse.Namespace:
+        Parse the command line options.
+    - create_pipeline(logger, config, utils, state=None) -> TrailerPipeline:
+        Create the pipeline of the engine selected by `APP_ENGINE`.
+    - run_libraries(logger, config, utils, pipeline, sync=None, queue=None):
+        Run the Radarr and Sonarr passes, sequentially or concurrently.
+    - schedule_jobs(logger, config, utils, pipeline, sync=None, queue=None) -> Scheduler:
+        Register the jobs of `APP_SCHEDULE` in a new scheduler.
     - main():
         Main function to run Sonarr and Radarr processes for finding and downloading trailers.
 
@@ -30,7 +53,7 @@ Usage:
     This script is intended to be executed directly to continuously run processes that find and
     download trailers for movies and TV shows managed by Radarr and Sonarr respectively. It uses
     configurations from 'config/config.yaml' to customize behavior such as file paths, API keys,
-    and sleep duration between runs. Ensure 'config/config.yaml' is correctly configured before
+    and the schedule of each job. Sending `SIGUSR1` to the process runs the library passes immediately. Ensure 'config/config.yaml' is correctly configured before
     running the script.
 
 Example:
@@ -40,35 +63,204 @@ Example:
     ```
     Ensure 'config/config.yaml' is present and correctly configured to avoid errors during execution.
 
+    To find out where the time of a slow cycle goes, run one cycle with the stage timers, cProfile and
+    tracemalloc, and write the profile to `APP_PROFILE_PATH`:
+    ```bash
+    python main.py --profile
+    ```
+
 Error Handling:
     - If the configuration file 'config/config.yaml' is missing or incorrectly defined, the script will exit with an error message.
     - The script raises specific exceptions with translated messages if there are issues with logging configuration:
         - `InvalidLogLevelError`: Raised for invalid logging levels in the configuration.
         - `InvalidLogCountError`: Raised for invalid log backup count in the configuration.
         - `InvalidLogSizeError`: Raised for invalid log file size in the configuration.
+        - `InvalidLogFormatError`: Raised for an invalid log format in the configuration.
+    - An invalid entry of `APP_SCHEDULE` stops the script with an `InvalidScheduleError` message.
     - The script also handles exceptions related to FFMPEG processing and general program interruptions.
 """
 
+import argparse
 import os
 import sys
-from time import sleep
+import shutil
+import threading
 import yaml
-from modules.sonarr import sonarr
-from modules.radarr import radarr
+from modules.sonarr import sonarr, process_show
+from modules.radarr import radarr, process_movie
 from modules.logger import Logger
 from modules.utils import Utils
-from modules.exceptions import FfmpegError, FfmpegCommandMissing, InvalidLogLevelError, InvalidLogCountError, InvalidLogSizeError
+from modules.pipeline import TrailerPipeline
+from modules.async_engine import AsyncPipeline
+from modules.state_store import StateStore
+from modules.incremental_sync import IncrementalSync
+from modules.webhook import WebhookServer
+from modules.metrics import MetricsServer
+from modules.scheduler import Scheduler
+from modules.work_queue import WorkQueue
+from modules.profiler import profiler, ProfileCapture
+from modules.exceptions import FfmpegError, FfmpegCommandMissing, InvalidLogLevelError, InvalidLogCountError, InvalidLogSizeError, InvalidLogFormatError, InvalidScheduleError
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """
+    Parse the command line options.
+
+    :param argv: Options, those of the command line when omitted
+    :return: Parsed options
+    """
+    parser = argparse.ArgumentParser(description="Find and download the trailers of the Radarr and Sonarr libraries.")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="run one cycle with the stage timers, cProfile and tracemalloc, write the profile to APP_PROFILE_PATH and exit",
+    )
+    return parser.parse_args(argv)
+
+
+def create_pipeline(logger: Logger, config: dict, utils: Utils, state: StateStore = None) -> TrailerPipeline:
+    """
+    Create the pipeline of the engine selected by `APP_ENGINE`.
+
+    Both engines have the same stages, limits and outcomes: "threads" runs each stage in its own pool of worker
+    threads, "asyncio" runs every job as a coroutine on one event loop (see `modules.async_engine`).
+
+    :param logger: Logger instance for logging messages
+    :param config: Configuration dictionary
+    :param utils: Utility functions instance
+    :param state: Optional state store recording the job outcomes
+    :return: Pipeline, not started
+    """
+    engine = config.get("APP_ENGINE", "threads")
+    if engine == "asyncio":
+        return AsyncPipeline(logger, config, utils, state)
+    if engine != "threads":
+        logger.warning("Unknown engine « {engine} », the « threads » engine is used.", engine=engine)
+    return TrailerPipeline(logger, config, utils, state)
+
+
+def run_libraries(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline, sync: IncrementalSync = None, queue: WorkQueue = None) -> None:
+    """
+    Run the Radarr and Sonarr passes for one cycle.
+
+    When `APP_PARALLEL_LIBRARIES` is enabled both library scans run in their own thread and feed the shared
+    pipeline at the same time; otherwise Radarr runs first, then Sonarr. In both cases the download and ffmpeg
+    budgets are the pipeline's, so they are shared by the two libraries.
+
+    :param logger: Logger instance for logging messages
+    :param config: Configuration dictionary
+    :param utils: Utility functions instance
+    :param pipeline: Shared trailer pipeline
+    :param sync: Incremental sync, or None to process every item
+    :param queue: Shared work queue receiving the items in distributed mode
+    """
+    passes = (radarr, sonarr)
+
+    if not config.get("APP_PARALLEL_LIBRARIES", False):
+        for library_pass in passes:
+            library_pass(logger, config, utils, pipeline, sync, queue)
+        return
+
+    errors = []
+
+    def run(library_pass):
+        try:
+            library_pass(logger, config, utils, pipeline, sync, queue)
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=run, args=(library_pass,), name=library_pass.__name__, daemon=True) for library_pass in passes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Surface the first failure (e.g. a missing ffmpeg command) in the main thread
+    if errors:
+        raise errors[0]
+
+
+def schedule_jobs(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline, sync: IncrementalSync = None, queue: WorkQueue = None) -> Scheduler:
+    """
+    Register the jobs of `APP_SCHEDULE` in a new scheduler.
+
+    Jobs:
+        - radarr, sonarr: Pass over the library, incremental when `APP_INCREMENTAL_SYNC` is enabled.
+        - full_sync: Full reconciliation of both libraries, only with `APP_INCREMENTAL_SYNC`.
+        - cache_prune: Removal of the unused TMDB cache entries, only with `TMDB_CACHE_PATH`.
+
+    Without `APP_SCHEDULE`, the jobs registered on this node get a default schedule: both passes run every
+    `APP_SLEEP_TIME` hours and the cache is pruned daily. An entry of `APP_SCHEDULE` naming a job that is not
+    registered is reported with a warning. The passes of a library never run twice at the same time, and unless `APP_PARALLEL_LIBRARIES` is enabled the two
+    libraries wait for each other. In distributed mode, the library jobs only run on the coordinator node, which
+    queues the items for every node.
+
+    :param logger: Logger instance for logging messages
+    :param config: Configuration dictionary
+    :param utils: Utility functions instance
+    :param pipeline: Shared trailer pipeline
+    :param sync: Incremental sync, or None to process every item
+    :param queue: Shared work queue, or None to process the items on this node
+    :return: Scheduler with the configured jobs
+    :raises InvalidScheduleError: If a schedule is not valid
+    """
+    scheduler = Scheduler(logger, config, fatal=(FfmpegError, FfmpegCommandMissing))
+    shared = () if config.get("APP_PARALLEL_LIBRARIES", False) else ("libraries",)
+
+    def library_job(library_pass):
+        def run():
+            # Changes made to the trailer folders since the last pass must be seen
+            utils.scan.reset()
+            library_pass(logger, config, utils, pipeline, sync, queue)
+            pipeline.summary(library=library_pass.__name__)
+            if utils.tmdb.cache is not None:
+                utils.tmdb.cache.summary()
+
+        return run
+
+    def full_sync():
+        sync.request_full()
+        utils.scan.reset()
+        run_libraries(logger, config, utils, pipeline, sync, queue)
+        pipeline.summary()
+
+    def cache_prune():
+        logger.info("« {count} » unused TMDB cache entries removed.", count=utils.tmdb.cache.prune())
+
+    jobs = {}
+    # Worker nodes only process the items queued by the coordinator
+    if queue is None or queue.role == "coordinator":
+        jobs["radarr"] = (library_job(radarr), ("radarr",) + shared)
+        jobs["sonarr"] = (library_job(sonarr), ("sonarr",) + shared)
+        if sync is not None:
+            jobs["full_sync"] = (full_sync, ("radarr", "sonarr") + shared)
+    if utils.tmdb.cache is not None:
+        jobs["cache_prune"] = (cache_prune, ())
+
+    schedule = config.get("APP_SCHEDULE")
+    if schedule is None:
+        # Default schedule of the jobs registered on this node
+        hours = config.get("APP_SLEEP_TIME", 6)
+        defaults = {"radarr": hours, "sonarr": hours, "cache_prune": 24}
+        schedule = {name: spec for name, spec in defaults.items() if name in jobs}
+
+    for name, spec in schedule.items():
+        if name not in jobs:
+            logger.warning("The job « {job} » of APP_SCHEDULE is unknown or disabled.", job=name)
+        elif spec not in (None, ""):
+            scheduler.add(name, jobs[name][0], spec, locks=jobs[name][1])
+    return scheduler
 
 
 def main():
     """
     Main function to run Sonarr and Radarr processes.
 
-    This function runs a loop that executes Radarr and Sonarr processes
-    to find and download trailers for movies and TV shows.
-    It logs the start and end of the process and sleeps for a specified
-    duration between each run.
+    This function starts the shared pipeline and runs the scheduler, which executes the Radarr
+    and Sonarr processes to find and download trailers for movies and TV shows, and the
+    maintenance jobs, each on its own schedule. With `--profile`, it runs and profiles one cycle instead.
     """
+    args = parse_args()
 
     # Check if the configuration file exists
     if not os.path.exists("config/config.yaml"):
@@ -90,36 +282,73 @@ def main():
                 log_level=config.get("APP_LOG_LEVEL"),
                 log_backup_count=config.get("APP_LOG_BACKUP_COUNT"),
                 log_max_size=config.get("APP_LOG_MAX_SIZE"),
+                console_rate=config.get("APP_LOG_CONSOLE_RATE", 0),
+                console_coalesce=config.get("APP_LOG_CONSOLE_COALESCE", False),
+                log_format=config.get("APP_LOG_FORMAT", "text"),
             )
-        except (InvalidLogLevelError, InvalidLogCountError, InvalidLogSizeError) as err:
+        except (InvalidLogLevelError, InvalidLogCountError, InvalidLogSizeError, InvalidLogFormatError) as err:
             print(err)
             sys.exit(1)
 
+        # Stage timers: their table is logged at the end of every cycle
+        if args.profile:
+            config["APP_PROFILE"] = True
+        if config.get("APP_PROFILE", False):
+            profiler.enable()
+
+        # The capture starts before the pipeline, so the profile includes its worker threads
+        capture = ProfileCapture(logger, config) if args.profile else None
+        if capture is not None:
+            capture.start()
+
         # Initialize Utils object to provide utility methods for operations
         utils = Utils(logger, config)
 
-        try:
-            # Infinite loop to continuously run the processes
-            while True:
-                # Log the start of the trailer finding process
-                logger.info("Starting trailers finder.")
+        # Downloads are now staged beside each trailer folder; drop what older versions left in tmp/
+        shutil.rmtree("tmp", ignore_errors=True)
 
-                # Run the Radarr process to find and download movie trailers
-                radarr(logger, config, utils)
+        # Persistent record of processed items, so settled items are skipped in later cycles
+        state = StateStore(logger, config) if config.get("APP_STATE_PATH") else None
 
-                # Run the Sonarr process to find and download TV show trailers
-                sonarr(logger, config, utils)
+        # Incremental passes only process the items changed since the last successful pass
+        sync = IncrementalSync(logger, config, state) if state is not None and config.get("APP_INCREMENTAL_SYNC", False) else None
+
+        # Shared pipeline: the worker limits apply to both libraries together
+        pipeline = create_pipeline(logger, config, utils, state)
+        pipeline.start()
+
+        # Webhook listener: items added in Radarr/Sonarr are processed without waiting for the next cycle
+        if config.get("APP_WEBHOOK_ENABLED", False):
+            WebhookServer(logger, config, utils, pipeline).start()
+
+        # Metrics endpoint: counters and stage latencies for Prometheus
+        if config.get("APP_METRICS_ENABLED", False):
+            MetricsServer(logger, config).start()
+
+        # Distributed mode: the nodes sharing the queue process the items queued by the coordinator
+        queue = WorkQueue(logger, config) if config.get("APP_QUEUE_PATH") else None
+
+        try:
+            if capture is not None:
+                # One profiled cycle of both libraries on this node, then exit
+                run_libraries(logger, config, utils, pipeline, sync)
+                pipeline.close()
+                capture.stop()
+                pipeline.summary()
+                return
 
-                # Log a separator line between runs
-                print("--------------------------------")
+            # Run the library passes and the maintenance jobs on their own schedules until interrupted
+            scheduler = schedule_jobs(logger, config, utils, pipeline, sync, queue)
+            # `kill -USR1 <pid>` runs the library passes immediately
+            scheduler.install_signals([name for name in ("radarr", "sonarr") if name in scheduler.jobs()])
+            if queue is not None:
 
-                # Sleep for the specified duration before the next run
-                time = config["APP_SLEEP_TIME"]
-                logger.info("Please wait for {hours} hours.", hours=time)
-                sleep(time * 3600)  # Convert hours to seconds for sleep function
+                def process(library, item):
+                    (process_movie if library == "radarr" else process_show)(logger, config, utils, pipeline, item)
 
-                # Clear the console screen for better readability
-                os.system("clear")
+                # A fatal error of the worker (e.g. a missing ffmpeg command) stops the node like one of a job
+                queue.start(pipeline, process, scheduler.fail)
+            scheduler.run_forever()
 
         except (
             FfmpegError,
@@ -127,6 +356,7 @@ def main():
             InvalidLogLevelError,
             InvalidLogCountError,
             InvalidLogSizeError,
+            InvalidScheduleError,
         ) as err:
             logger.error("An error has occurred: {error}.", error=err)
 
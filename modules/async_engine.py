@@ -0,0 +1,252 @@
+"""
+Module providing an asyncio execution engine for the trailer pipeline, selected with `APP_ENGINE: asyncio`.
+
+`AsyncPipeline` is a drop-in replacement for `TrailerPipeline`: the Radarr and Sonarr passes, the webhook listener
+and the scheduler submit jobs to it the same way. Instead of one pool of worker threads per stage, every job is a
+coroutine on a single event loop and each stage is bounded by a semaphore, so thousands of items waiting for a
+TMDB answer, a download slot or an ffmpeg slot cost a coroutine each rather than a thread.
+
+Only the calls that are still blocking leave the loop, and only while they hold their stage's semaphore: the TMDB
+requests (which keep the pooled session, the retries, the rate limiter and the response cache of `TmdbClient`),
+yt-dlp, and the file system moves run in a thread pool sized to the stage limits. ffmpeg runs with
+`asyncio.create_subprocess_exec`, so a long transcode holds no thread at all.
+
+Dependencies:
+    - asyncio: Event loop, semaphores and ffmpeg subprocesses.
+    - threading: Thread running the event loop.
+    - time: Measurement of the stage and ffmpeg durations.
+    - concurrent.futures.ThreadPoolExecutor: Pool running the blocking calls.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.log_context: Fields of the item attached to the log records of its job.
+    - modules.metrics.metrics: Registry receiving the stage durations and the jobs waiting for each stage.
+    - modules.profiler.profiler: Stage timer of the post-processing.
+    - modules.exceptions.FfmpegError: Raised when the ffmpeg command cannot be started.
+    - modules.exceptions.FfmpegCommandMissing: Configuration error that stops the pipeline.
+    - modules.pipeline.TrailerPipeline: Pipeline whose interface, stages and bookkeeping are reused.
+    - modules.state_store.StateStore: Optional persistent record of the job outcomes.
+
+Classes:
+    - AsyncPipeline(TrailerPipeline):
+        Trailer pipeline running every job as a coroutine on one event loop.
+
+Configuration:
+    - APP_ENGINE (str): "threads" for `TrailerPipeline`, "asyncio" for `AsyncPipeline`. Defaults to "threads".
+    - APP_ASYNC_MAX_ITEMS (int): Maximum number of jobs in flight; producers wait beyond it. Defaults to 1000.
+    - APP_TMDB_WORKERS, APP_DOWNLOAD_WORKERS, APP_FFMPEG_WORKERS: Concurrency limit of each stage, as for
+      `TrailerPipeline`.
+
+Usage:
+    .. code-block:: python
+
+        pipeline = AsyncPipeline(logger, config, utils)
+        pipeline.start()
+        pipeline.submit({"library": "radarr", "item": movie, "tmdb_id": movie["tmdbId"], "item_type": "movie"})
+        pipeline.wait("radarr")
+        pipeline.close()
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from modules import log_context
+from modules.logger import Logger
+from modules.exceptions import FfmpegError, FfmpegCommandMissing
+from modules.metrics import metrics
+from modules.pipeline import TrailerPipeline
+from modules.profiler import profiler
+from modules.state_store import StateStore
+
+
+class AsyncPipeline(TrailerPipeline):
+    """
+    Trailer pipeline running every job as a coroutine on one event loop.
+
+    The event loop runs in its own thread, so the synchronous producers (`radarr()`, `sonarr()`, the webhook
+    handlers) keep calling `submit()` and `wait()` from theirs. Jobs, outcomes, the state store and the summary
+    are the same as for `TrailerPipeline`.
+    """
+
+    def __init__(self, logger: Logger, config: dict, utils, state: Optional[StateStore] = None) -> None:
+        """
+        Initialize the pipeline with a logger, configuration and utility instance.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        :param utils: Utils instance providing the stage operations
+        :param state: Optional state store recording the job outcomes
+        """
+        super().__init__(logger, config, utils, state)
+        self.max_items = max(1, int(config.get("APP_ASYNC_MAX_ITEMS", 1000)))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._tasks = set()
+        # Jobs waiting for the semaphore of each stage, the counterpart of the queue depths
+        self._waiting = {stage: 0 for stage in self.STAGES}
+        metrics.gauge("trailer_finder_queue_depth", lambda: [({"stage": stage}, count) for stage, count in self._waiting.items()])
+
+    def start(self) -> None:
+        """
+        Start the event loop and its thread pool.
+        """
+        if self._loop is not None:
+            return
+        if self.shards is not None:
+            self.shards.start()
+        self._loop = asyncio.new_event_loop()
+        # One thread per blocking call allowed at once: TMDB requests, downloads and the ffmpeg stage's file moves
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=sum(self.workers.values()), thread_name_prefix="async-engine"))
+        self._limits = {stage: asyncio.Semaphore(self.workers[stage]) for stage in self.STAGES}
+        self._slots = asyncio.Semaphore(self.max_items)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-engine", daemon=True)
+        self._thread.start()
+        self.logger.debug(
+            "Trailer pipeline started with « {tmdb} » TMDB, « {download} » download and « {ffmpeg} » ffmpeg workers.",
+            **self.workers,
+        )
+
+    def close(self) -> None:
+        """
+        Stop the event loop once the submitted jobs are finished.
+        """
+        if self._loop is None:
+            return
+        with self._done:
+            self._done.wait_for(lambda: self._idle(None))
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+        if self.shards is not None:
+            self.shards.close()
+
+    def submit(self, job: dict) -> None:
+        """
+        Start a job on the event loop. Blocks while `APP_ASYNC_MAX_ITEMS` jobs are in flight.
+
+        Must not be called from the event loop itself.
+
+        :param job: Job dictionary (see `TrailerPipeline`)
+        :raises FfmpegCommandMissing: If a previous job hit a configuration error
+        """
+        self._raise_fatal()
+        self._admit(job)
+        asyncio.run_coroutine_threadsafe(self._enter(job), self._loop).result()
+
+    async def _enter(self, job: dict) -> None:
+        """
+        Wait for a free slot, then start the job's task.
+
+        :param job: Job dictionary
+        """
+        await self._slots.acquire()
+        task = self._loop.create_task(self._run(job))
+        # The loop only keeps weak references to its tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: dict) -> None:
+        """
+        Run the stages of a job, then finish it.
+
+        :param job: Job dictionary
+        """
+        try:
+            with log_context.bind(**job.get("log_fields", {})):
+                stage = "tmdb"
+                while stage is not None and self._fatal is None:
+                    stage = await self._stage(stage, job)
+                await asyncio.to_thread(self._finish, job)
+        finally:
+            self._slots.release()
+
+    async def _stage(self, stage: str, job: dict) -> Optional[str]:
+        """
+        Run one stage of a job within the stage's concurrency limit.
+
+        :param stage: Stage name
+        :param job: Job dictionary
+        :return: Name of the next stage, or None when the job is finished
+        """
+        handlers = {"tmdb": self._lookup_async, "download": self._download_async, "ffmpeg": self._post_process_async}
+        self._waiting[stage] += 1
+        async with self._limits[stage]:
+            self._waiting[stage] -= 1
+            with log_context.bind(stage=stage):
+                next_stage = None
+                started = time.perf_counter()
+                try:
+                    next_stage = await handlers[stage](job)
+                except FfmpegCommandMissing as err:
+                    with self._done:
+                        self._fatal = err
+                        self._done.notify_all()
+                except Exception as err:
+                    self.logger.error("An error has occurred « {error} ».", error={"error": err, "title": job["item"].get("use_title")})
+                duration = time.perf_counter() - started
+                metrics.observe("trailer_finder_stage_duration_seconds", duration, stage=stage)
+                with log_context.bind(duration_ms=int(duration * 1000)):
+                    self.logger.debug("Stage « {stage} » of « {title} » finished in « {duration} » ms.", stage=stage, title=job["item"].get("use_title"), duration=int(duration * 1000))
+        return next_stage
+
+    async def _lookup_async(self, job: dict) -> Optional[str]:
+        """
+        TMDB stage: fetch the trailer candidates, once per batch of seasons.
+
+        :param job: Job dictionary
+        :return: Name of the next stage
+        """
+        batch = job.get("batch")
+        if batch is not None:
+            # The first season of the batch makes the request, the others wait for it on the loop, not in a thread
+            async with batch.setdefault("loop_lock", asyncio.Lock()):
+                if batch["trailers"] is None:
+                    batch["trailers"] = await asyncio.to_thread(self.utils.trailer_pull_seasons, job["tmdb_id"], batch["seasons"], job["item"])
+        return await asyncio.to_thread(self._lookup, job)
+
+    async def _download_async(self, job: dict) -> Optional[str]:
+        """
+        Download stage: run yt-dlp in the thread pool.
+
+        :param job: Job dictionary
+        :return: Name of the next stage, or None when nothing was downloaded
+        """
+        return await asyncio.to_thread(self._download, job)
+
+    @profiler.hook("post_process")
+    async def _post_process_async(self, job: dict) -> Optional[str]:
+        """
+        Ffmpeg stage: convert the downloaded files with ffmpeg subprocesses awaited on the loop.
+
+        :param job: Job dictionary
+        :return: None, the job is finished
+        :raises FfmpegError: If the ffmpeg command cannot be started
+        """
+        utils = self.utils
+        item = job["item"]
+        cache_path = job["cache_path"]
+        written_sources = []
+        for file in job["files"]:
+            path_file = utils.trailer_path(file, item)
+            if not utils.needs_transcode(file, item):
+                await asyncio.to_thread(utils.move_downloaded, cache_path, file, path_file)
+                written_sources.append((file, path_file))
+                continue
+
+            cmd, staged_file = utils.ffmpeg_command(cache_path, file)
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec(*cmd, **utils.ffmpeg_streams())
+            except OSError as e:
+                raise FfmpegError(self.translate("The ffmpeg command has an error « {error} ».", error=e))
+            returncode = await process.wait()
+
+            if utils.ffmpeg_finished(file, started, returncode, staged_file):
+                await asyncio.to_thread(utils.finalize, staged_file, path_file)
+                written_sources.append((file, path_file))
+        job["file_paths"] = await asyncio.to_thread(utils.end_post_process, cache_path, item, written_sources)
+        job["outcome"] = "downloaded" if job["file_paths"] else "failed"
+        return None
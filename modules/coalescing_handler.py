@@ -0,0 +1,167 @@
+"""
+Console handler that rate-limits and coalesces log lines without blocking the caller.
+
+This module defines the `CoalescingStreamHandler` class, a `logging.StreamHandler` used by the `Logger` class
+behind its `QueueListener`. Because it runs on the listener thread, throttling never costs wall-clock time in the
+code that emits the log call: lines over the configured rate are dropped and summarised, and identical consecutive
+lines are collapsed into a single "repeated" notice. The notice is written when a different line arrives, or at the
+latest `REPEAT_INTERVAL` seconds after the first repeat, so a burst of identical lines at the end of a pass is not
+reported only at the next pass.
+
+The summary lines are records of their own: they carry their message key and values, not those of the line they
+summarise, so the JSON output does not attribute them to an item.
+
+Dependencies:
+    - `logging`: Standard Python logging module.
+    - `threading`: Timer writing the pending "repeated" notice.
+    - `time.monotonic`: Clock used by the token bucket.
+
+Classes:
+    - `CoalescingStreamHandler`:
+        A stream handler with an optional token-bucket rate limit and duplicate-line coalescing.
+
+Usage:
+    The handler is created by `Logger` when `APP_LOG_CONSOLE_RATE` or `APP_LOG_CONSOLE_COALESCE` is set in
+    `config.yaml`. Warnings and more severe records are never dropped by the rate limit.
+"""
+
+import logging
+import threading
+from time import monotonic
+
+
+class CoalescingStreamHandler(logging.StreamHandler):
+    """
+    Stream handler with an optional rate limit and duplicate-line coalescing.
+
+    Attributes:
+        max_rate (float): Maximum number of console lines per second, 0 disables the limit.
+        coalesce (bool): Collapse identical consecutive messages into one line.
+        translate (callable): Function used to translate the summary lines.
+    """
+
+    # Seconds after the first repeat of a line before the "repeated" notice is written anyway
+    REPEAT_INTERVAL = 5.0
+
+    def __init__(self, stream=None, max_rate=0, coalesce=False, translate=None):
+        """
+        Initializes the handler.
+
+        Args:
+            stream (io.TextIOBase, optional): Stream to write to. Defaults to `sys.stderr`.
+            max_rate (float, optional): Maximum number of console lines per second. Defaults to 0 (unlimited).
+            coalesce (bool, optional): Collapse identical consecutive messages. Defaults to False.
+            translate (callable, optional): Translation function for summary lines. Defaults to `str.format`.
+        """
+        super().__init__(stream)
+        self.max_rate = max_rate
+        self.coalesce = coalesce
+        self.translate = translate or (lambda msg_key, **kwargs: msg_key.format(**kwargs))
+        self._tokens = float(max_rate)
+        self._last_refill = monotonic()
+        self._suppressed = 0
+        self._last_record = None
+        self._repeated = 0
+        self._repeat_timer = None
+
+    def _take_token(self) -> bool:
+        """
+        Takes one token from the bucket, refilling it according to the elapsed time.
+
+        Returns:
+            bool: True if the line may be written, False if it must be dropped.
+        """
+        now = monotonic()
+        self._tokens = min(float(self.max_rate), self._tokens + (now - self._last_refill) * self.max_rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _summary(self, template: str, record: logging.LogRecord, **kwargs) -> None:
+        """
+        Writes a summary line, as a new record with the logger and level of `record`.
+
+        Args:
+            template (str): Message key of the summary line.
+            record (logging.LogRecord): Record giving the logger name and level of the summary line.
+            **kwargs: Arguments used to format the summary line.
+        """
+        summary = logging.makeLogRecord(
+            {
+                "name": record.name,
+                "levelno": record.levelno,
+                "levelname": record.levelname,
+                "msg": self.translate(template, **kwargs),
+                "msg_key": template,
+                "msg_values": kwargs,
+            }
+        )
+        super().emit(summary)
+
+    def _flush_repeated(self) -> None:
+        """
+        Writes the pending "repeated" notice for the last coalesced message, if any.
+        """
+        if self._repeat_timer is not None:
+            self._repeat_timer.cancel()
+            self._repeat_timer = None
+        if self._repeated:
+            self._summary("The previous message was repeated « {count} » times.", self._last_record, count=self._repeated)
+            self._repeated = 0
+
+    def _flush_on_timer(self) -> None:
+        """
+        Writes the pending "repeated" notice from the timer thread. Later repeats start a new count.
+        """
+        self.acquire()
+        try:
+            # A timer cancelled while it was waiting for the lock leaves the notice to its successor
+            if threading.current_thread() is self._repeat_timer:
+                self._flush_repeated()
+        finally:
+            self.release()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Writes the record unless it is a duplicate or exceeds the rate limit.
+
+        Args:
+            record (logging.LogRecord): The log record to write.
+        """
+        last = self._last_record
+        if self.coalesce and last is not None and last.levelno == record.levelno and last.getMessage() == record.getMessage():
+            self._repeated += 1
+            if self._repeat_timer is None:
+                self._repeat_timer = threading.Timer(self.REPEAT_INTERVAL, self._flush_on_timer)
+                self._repeat_timer.name = "log-coalesce"
+                self._repeat_timer.daemon = True
+                self._repeat_timer.start()
+            return
+        self._flush_repeated()
+        self._last_record = record
+
+        if self.max_rate and record.levelno < logging.WARNING and not self._take_token():
+            self._suppressed += 1
+            return
+
+        if self._suppressed:
+            self._summary("« {count} » console messages were suppressed by the rate limit.", record, count=self._suppressed)
+            self._suppressed = 0
+
+        super().emit(record)
+
+    def close(self) -> None:
+        """
+        Writes any pending summary before closing the handler.
+        """
+        self.acquire()
+        try:
+            self._flush_repeated()
+            if self._suppressed and self._last_record is not None:
+                self._summary("« {count} » console messages were suppressed by the rate limit.", self._last_record, count=self._suppressed)
+                self._suppressed = 0
+        finally:
+            self.release()
+        super().close()
@@ -0,0 +1,336 @@
+"""
+Module providing a pool of download processes, so yt-dlp uses every CPU core of a large server.
+
+yt-dlp extracts the video metadata and deciphers the YouTube signatures in pure Python: in one process the download
+workers share the GIL, and past a few workers more threads do not make the downloads faster. With
+`APP_DOWNLOAD_PROCESSES` set, the download stage of the pipeline hands every item to one of N worker processes,
+each with its own yt-dlp instances and temporary directory.
+
+Items are assigned to the processes ("shards") by consistent hashing of their TMDB id, so an item retried in a
+later cycle lands on the same shard, and the seasons of a TV show always share one. The worker processes send their
+log records, their metrics and the results of every item back to the parent, which writes the logs, records the
+outcome in the state store and runs the ffmpeg stage as usual.
+
+Every worker process has its own job, result and log queues, replaced when it is restarted: a process killed while
+writing to a queue leaves the queue's lock held, which must only affect the queues of that process.
+
+When a worker process dies, only the items it had already taken fail; the items still waiting in its queue are
+handed to the new process, up to `RESUBMIT_LIMIT` times each.
+
+Dependencies:
+    - atexit: Stops the worker processes at interpreter exit.
+    - bisect: Lookup in the hash ring.
+    - hashlib: Positions of the shards and items on the hash ring.
+    - itertools: Request ids.
+    - logging: Hands the records of the worker processes to the parent's handlers.
+    - multiprocessing: Worker processes and the queues connecting them to the parent.
+    - queue: Empty exception, raised when a result or log queue has nothing to read.
+    - shutil: Removal of the temporary directories.
+    - signal: Worker processes leave Ctrl+C to the parent.
+    - tempfile: Temporary directory of each worker process.
+    - threading: Threads reading the results and log records of the worker processes.
+    - concurrent.futures.Future: Result of an item, waited for by the download worker thread that submitted it.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.log_context: Fields of the item, carried over to the worker process.
+    - modules.metrics.metrics: Registry receiving the metrics recorded by the worker processes.
+    - modules.profiler.profiler: Stage times recorded by the worker processes, enabled by `APP_PROFILE`.
+    - modules.exceptions.DownloadError: Raised when a worker process fails an item.
+    - modules.youtube_dl.YoutubeDL: Downloader run by every worker process.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - DownloadShards(Translator):
+        Pool of download processes with consistent hashing of the items.
+
+Configuration:
+    - APP_DOWNLOAD_PROCESSES (int): Number of download processes, 0 to download in the main process. Defaults to 0.
+"""
+
+import atexit
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import queue
+import shutil
+import signal
+import tempfile
+import threading
+from concurrent.futures import Future, TimeoutError
+from typing import Dict, Iterator, List, Tuple
+from modules import log_context
+from modules.logger import Logger
+from modules.metrics import metrics
+from modules.profiler import profiler
+from modules.exceptions import DownloadError
+from modules.youtube_dl import YoutubeDL
+from modules.translator import Translator
+
+# Item fields set by `YoutubeDL.download_trailers()`, copied back into the parent's item
+RESULT_FIELDS = ("staging_created", "video_keys", "duration_rejections", "downloaded_formats")
+
+
+def _shard_main(index: int, config: dict, directory: str, jobs, results, logs, started) -> None:
+    """
+    Main loop of a worker process: download the items of its queue until it receives None.
+
+    :param index: Shard number
+    :param config: Configuration dictionary
+    :param directory: Temporary directory of the shard
+    :param jobs: Queue of (request id, links, item, log fields) tuples
+    :param results: Queue receiving (request id, cache path, item fields, metrics, stage times, error) tuples
+    :param logs: Queue receiving the log records
+    :param started: Shared integer receiving the request id of the last item taken from the queue
+    """
+    # Ctrl+C reaches the whole process group, the parent stops the shards itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tempfile.tempdir = directory
+    if config.get("APP_PROFILE", False):
+        profiler.enable()
+    logger = Logger(local=config.get("APP_TRANSLATE"), log_level=config.get("APP_LOG_LEVEL") or "INFO", log_queue=logs)
+    downloader = YoutubeDL(logger, {**config, "YT_DLP_CACHE_DIR": config.get("YT_DLP_CACHE_DIR") or f"{directory}/yt-dlp"})
+    while True:
+        request = jobs.get()
+        if request is None:
+            return
+        key, links, item, fields = request
+        started.value = key
+        with log_context.bind(**fields):
+            try:
+                cache_path = downloader.download_trailers(links, item)
+                results.put((key, cache_path, {name: item.get(name) for name in RESULT_FIELDS}, metrics.collect(), profiler.collect(), None))
+            except Exception as err:
+                results.put((key, None, {}, metrics.collect(), profiler.collect(), str(err)))
+
+
+class DownloadShards(Translator):
+    """
+    Pool of download processes with consistent hashing of the items.
+
+    `download_trailers()` has the signature of `YoutubeDL.download_trailers()` and blocks the calling thread until
+    the shard of the item has downloaded it, so the download stage of the pipeline uses it in place of the
+    in-process downloader.
+
+    Attributes:
+        logger (Logger): Logger instance for logging messages.
+        config (dict): Configuration dictionary.
+        processes (int): Number of worker processes.
+    """
+
+    # Points of each shard on the hash ring, enough for an even spread of the items
+    VIRTUAL_NODES = 64
+
+    # Seconds between two checks of the shard of an item being waited for
+    CHECK_INTERVAL = 5
+
+    # Times an item waiting in the queue of a stopped shard is handed to its new process before it fails
+    RESUBMIT_LIMIT = 2
+
+    # Seconds between two checks, by the threads reading a shard's results and logs, that the shard still uses them
+    READ_INTERVAL = 0.5
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Initialize the pool and its hash ring. The processes are started by `start()`.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.processes = max(1, int(config.get("APP_DOWNLOAD_PROCESSES", 1)))
+        ring = sorted((self._hash(f"shard-{index}-{replica}"), index) for index in range(self.processes) for replica in range(self.VIRTUAL_NODES))
+        self._points = [point for point, _ in ring]
+        self._owners = [index for _, index in ring]
+        self._context = multiprocessing.get_context("spawn")
+        self._shards: List[dict] = []
+        # Request id -> (shard, future, request, times resubmitted)
+        self._pending: Dict[int, Tuple[int, Future, tuple, int]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    @staticmethod
+    def _hash(text: str) -> int:
+        """
+        Position of a text on the hash ring.
+
+        :param text: Shard point or item key
+        :return: 64-bit position
+        """
+        return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+
+    def shard(self, tmdb_id) -> int:
+        """
+        Return the shard of an item: the first shard point after the item's position on the ring.
+
+        :param tmdb_id: TMDB id of the item
+        :return: Shard number
+        """
+        position = bisect.bisect(self._points, self._hash(str(tmdb_id))) % len(self._points)
+        return self._owners[position]
+
+    def start(self) -> None:
+        """
+        Start the worker processes and the threads reading their results and log records.
+        """
+        if self._shards:
+            return
+        for index in range(self.processes):
+            self._shards.append({"directory": tempfile.mkdtemp(prefix=f"trailer-finder-shard-{index}-")})
+            self._spawn(index)
+        atexit.register(self.close)
+        self.logger.info("« {count} » download processes started.", count=self.processes)
+
+    def close(self) -> None:
+        """
+        Stop the worker processes once they have finished their current item, and remove their directories.
+
+        The threads reading the results and log records of each process stop once its queues are empty.
+        """
+        shards, self._shards = self._shards, []
+        for shard in shards:
+            shard["jobs"].put(None)
+        for shard in shards:
+            shard["process"].join(timeout=self.CHECK_INTERVAL)
+            if shard["process"].is_alive():
+                shard["process"].terminate()
+            shutil.rmtree(shard["directory"], ignore_errors=True)
+            shard["results"] = shard["logs"] = None
+        for shard in shards:
+            for reader in shard["readers"]:
+                reader.join(timeout=self.CHECK_INTERVAL)
+
+    def download_trailers(self, links: list, item: dict) -> str:
+        """
+        Download the trailers of an item in its shard, see `YoutubeDL.download_trailers()`.
+
+        :param links: List of YouTube trailer links
+        :param item: Metadata of the item (movie or TV show), updated with the results of the download
+        :return: Path to the cache directory where trailers are downloaded
+        :raises DownloadError: If the shard failed the item or stopped while downloading it
+        """
+        index = self.shard(item.get("tmdbId"))
+        future = Future()
+        with self._lock:
+            # Ids are taken under the lock, so every shard receives its items in increasing order
+            key = next(self._ids)
+            request = (key, links, item, dict(log_context.current()))
+            self._pending[key] = (index, future, request, 0)
+            self._shards[index]["jobs"].put(request)
+        while True:
+            try:
+                cache_path, fields, error = future.result(timeout=self.CHECK_INTERVAL)
+                break
+            except TimeoutError:
+                self._check(index)
+        if error is not None:
+            raise DownloadError(error)
+        item.update(fields)
+        return cache_path
+
+    def _spawn(self, index: int) -> None:
+        """
+        Start the worker process of a shard, with new job, result and log queues and the threads reading them.
+
+        The threads reading the queues of the previous process, if any, stop once they are empty.
+
+        :param index: Shard number
+        """
+        shard = self._shards[index]
+        if "jobs" in shard:
+            # Nobody reads the queue of a stopped process any more, exiting must not wait for it to be flushed
+            shard["jobs"].cancel_join_thread()
+        shard["jobs"] = self._context.Queue()
+        shard["results"] = self._context.Queue()
+        shard["logs"] = self._context.Queue()
+        shard["started"] = self._context.RawValue("q", -1)
+        shard["process"] = self._context.Process(
+            target=_shard_main,
+            args=(index, self.config, shard["directory"], shard["jobs"], shard["results"], shard["logs"], shard["started"]),
+            name=f"download-shard-{index}",
+            daemon=True,
+        )
+        shard["process"].start()
+        shard["readers"] = [
+            threading.Thread(target=self._read_results, args=(shard, shard["results"]), name=f"shard-{index}-results", daemon=True),
+            threading.Thread(target=self._read_logs, args=(shard, shard["logs"]), name=f"shard-{index}-logs", daemon=True),
+        ]
+        for reader in shard["readers"]:
+            reader.start()
+
+    def _check(self, index: int) -> None:
+        """
+        Restart a shard whose process stopped.
+
+        The items the process had taken from its queue fail: the one it was downloading, and the finished ones
+        whose result was lost with it. The items still waiting in the queue are handed to the new process, unless
+        they were already resubmitted `RESUBMIT_LIMIT` times.
+
+        :param index: Shard number
+        """
+        with self._lock:
+            if not self._shards or self._shards[index]["process"].is_alive():
+                return
+            self.logger.error("Download process « {shard} » stopped unexpectedly, it is restarted.", shard=index)
+            error = self.translate("Download process « {shard} » stopped unexpectedly, it is restarted.", shard=index)
+            started = self._shards[index]["started"].value
+            self._spawn(index)
+            resubmitted = 0
+            for key, (shard, future, request, attempts) in sorted(self._pending.items()):
+                if shard != index:
+                    continue
+                if key <= started or attempts >= self.RESUBMIT_LIMIT:
+                    del self._pending[key]
+                    future.set_result((None, {}, error))
+                else:
+                    self._pending[key] = (shard, future, request, attempts + 1)
+                    self._shards[index]["jobs"].put(request)
+                    resubmitted += 1
+            if resubmitted:
+                self.logger.info("« {count} » waiting items are handed to the new download process « {shard} ».", count=resubmitted, shard=index)
+
+    def _read(self, shard: dict, name: str, source) -> Iterator:
+        """
+        Iterate over the objects of one of the queues of a shard, until the shard no longer uses it and it is empty.
+
+        :param shard: Shard whose queue is read
+        :param name: Key of the queue in the shard, "results" or "logs"
+        :param source: Queue read
+        :return: Generator of the objects read
+        """
+        while True:
+            try:
+                yield source.get(timeout=self.READ_INTERVAL)
+            except queue.Empty:
+                if shard[name] is not source:
+                    return
+            except (EOFError, OSError):
+                return
+
+    def _read_results(self, shard: dict, results) -> None:
+        """
+        Hand the results of a worker process to the threads waiting for them.
+
+        :param shard: Shard of the worker process
+        :param results: Result queue of the worker process
+        """
+        for result in self._read(shard, "results", results):
+            key, cache_path, fields, collected, times, error = result
+            metrics.merge(collected)
+            profiler.merge(times)
+            with self._lock:
+                pending = self._pending.pop(key, None)
+            if pending is not None:
+                pending[1].set_result((cache_path, fields, error))
+
+    def _read_logs(self, shard: dict, logs) -> None:
+        """
+        Write the log records of a worker process with the handlers of the main process.
+
+        :param shard: Shard of the worker process
+        :param logs: Log queue of the worker process
+        """
+        for record in self._read(shard, "logs", logs):
+            logging.getLogger().handle(record)
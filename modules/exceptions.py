@@ -21,6 +21,8 @@ Exception Classes:
     - **InvalidLogSizeError**: Raised when the size of the log file specified in the configuration is invalid or out of range.
     - **InvalidLogCountError**: Raised when the number of log backup files specified in the configuration is invalid.
     - **InvalidLogLevelError**: Raised when the log level defined in the configuration is not among the recognized levels.
+    - **InvalidLogFormatError**: Raised when the log format defined in the configuration is neither "text" nor "json".
+    - **InvalidScheduleError**: Raised when a job schedule in the configuration is neither a number of hours nor a cron expression.
 
 Usage:
     Import this module to access custom exception classes for handling specific error conditions
@@ -163,3 +165,25 @@ class InvalidLogLevelError(Exception):
     """
 
     pass
+
+
+class InvalidLogFormatError(Exception):
+    """
+    Exception raised when the defined log format is not valid.
+
+    This exception is used to indicate that the log format specified in the configuration
+    is not one of the supported formats, "text" or "json".
+    """
+
+    pass
+
+
+class InvalidScheduleError(Exception):
+    """
+    Exception raised when the schedule of a job is not valid.
+
+    This exception is used to indicate that a schedule defined in `APP_SCHEDULE` is neither
+    a positive number of hours nor a valid five-field cron expression.
+    """
+
+    pass
@@ -0,0 +1,211 @@
+"""
+Module providing a persistent, size-bounded cache of HTTP responses.
+
+Responses are stored in a SQLite database keyed by URL and query parameters (including the language), together
+with their `ETag` and `Last-Modified` validators. Fresh entries are served without any request; stale entries are
+revalidated with a conditional request, so an unchanged resource costs a `304 Not Modified` instead of a full
+response. The cache is bounded in size and evicts the least recently used entries first. Hit, revalidation and
+miss counters are reported in the logs at the end of each cycle.
+
+Dependencies:
+    - os: Operating system interface for file operations.
+    - sqlite3: Embedded database used for the cache.
+    - threading: Serialises access to the shared connection and counters.
+    - time: Timestamps of the entries.
+    - collections.Counter: Hit/miss counters.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.metrics.metrics: Registry receiving the hit/miss counters.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - HttpCache(Translator):
+        On-disk response cache with TTL, conditional revalidation and LRU eviction.
+
+Configuration:
+    - TMDB_CACHE_PATH (str): Path of the SQLite database. The cache is disabled when empty.
+    - TMDB_CACHE_TTL_HOURS (float): Hours during which an entry is served without revalidation. Defaults to 72.
+    - TMDB_CACHE_MAX_MB (float): Maximum size of the cached bodies, in megabytes. Defaults to 50.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from modules.logger import Logger
+from modules.metrics import metrics
+from modules.translator import Translator
+
+
+class HttpCache(Translator):
+    """
+    On-disk HTTP response cache with TTL, ETag/Last-Modified revalidation and LRU eviction.
+
+    Counters:
+        - hits: Fresh entries served without a request.
+        - revalidated: Stale entries confirmed by a `304 Not Modified`.
+        - misses: Requests answered with a full response.
+    """
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Open (and create if needed) the cache database.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.path = config["TMDB_CACHE_PATH"]
+        self.ttl = config.get("TMDB_CACHE_TTL_HOURS", 72) * 3600
+        self.max_size = int(config.get("TMDB_CACHE_MAX_MB", 50) * 1024 * 1024)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        super().__init__(config.get("APP_TRANSLATE"))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(url: str, params: Optional[dict] = None) -> str:
+        """
+        Build the cache key of a request.
+
+        :param url: Request URL
+        :param params: Query parameters, secrets such as `api_key` must be removed by the caller
+        :return: Cache key
+        """
+        query = "&".join(f"{name}={value}" for name, value in sorted((params or {}).items()))
+        return f"{url}?{query}"
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return a cached entry and mark it as recently used.
+
+        :param key: Cache key
+        :return: Dictionary with body, etag, last_modified and fresh, or None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, etag, last_modified, fetched FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET accessed=? WHERE key=?", (now, key))
+            self._db.commit()
+        return {"body": row[0], "etag": row[1], "last_modified": row[2], "fresh": now - row[3] < self.ttl}
+
+    def put(self, key: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        Store a response and evict the least recently used entries when the cache is full.
+
+        :param key: Cache key
+        :param body: Response body
+        :param etag: `ETag` header of the response
+        :param last_modified: `Last-Modified` header of the response
+        """
+        now = time.time()
+        size = len(body.encode("utf-8"))
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, now, now, size),
+            )
+            self._size += size - (previous[0] if previous else 0)
+            if self._size > self.max_size:
+                self._evict()
+            self._db.commit()
+
+    def refresh(self, key: str) -> None:
+        """
+        Mark a stale entry as fresh again after a `304 Not Modified`.
+
+        :param key: Cache key
+        """
+        with self._lock:
+            self._db.execute("UPDATE responses SET fetched=? WHERE key=?", (time.time(), key))
+            self._db.commit()
+
+    def _evict(self) -> None:
+        """
+        Delete the least recently used entries until the cache is at 90% of its maximum size.
+        Must be called with the lock held.
+        """
+        target = self.max_size * 0.9
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if self._size <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key=?", (key,))
+            self._size -= size
+
+    def prune(self) -> int:
+        """
+        Delete the entries that were not used during the last two TTL periods.
+
+        :return: Number of deleted entries
+        """
+        with self._lock:
+            cutoff = time.time() - 2 * self.ttl
+            deleted = self._db.execute("DELETE FROM responses WHERE accessed < ?", (cutoff,)).rowcount
+            self._db.commit()
+            self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return deleted
+
+    def count(self, outcome: str) -> None:
+        """
+        Increment a hit/miss counter.
+
+        :param outcome: "hits", "revalidated" or "misses"
+        """
+        with self._lock:
+            self.stats[outcome] += 1
+        metrics.inc("trailer_finder_tmdb_cache_total", result=outcome)
+
+    def summary(self, reset: bool = True) -> Counter:
+        """
+        Log the hit/miss counters.
+
+        :param reset: Clear the counters afterwards, so the next cycle starts from zero
+        :return: The counters
+        """
+        with self._lock:
+            stats = self.stats
+            if reset:
+                self.stats = Counter()
+        total = sum(stats.values())
+        self.logger.info(
+            "TMDB cache: « {hits} » hits, « {revalidated} » revalidated, « {misses} » misses (« {ratio} »% served from cache).",
+            hits=stats["hits"],
+            revalidated=stats["revalidated"],
+            misses=stats["misses"],
+            ratio=int(100 * (stats["hits"] + stats["revalidated"]) / total) if total else 0,
+        )
+        return stats
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._db.close()
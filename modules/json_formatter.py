@@ -0,0 +1,64 @@
+"""
+Formatter writing every log record as one JSON object per line, for log shippers.
+
+Each line carries the translated message, the untranslated message key (stable across languages) and the values
+it was formatted with, plus the fields of the item being processed when the record was emitted (see
+`modules.log_context`): library, arr_id, tmdb_id, season, stage, duration_ms, outcome and correlation_id.
+
+Attributes:
+    FIELDS (tuple): Item fields written as top-level keys, in this order.
+
+Methods:
+    format(record: logging.LogRecord) -> str:
+        Format the log record as a JSON object.
+
+        Args:
+            record (logging.LogRecord): The log record to format.
+
+        Returns:
+            str: One line of JSON.
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter writing every log record as one JSON object per line.
+
+    Attributes:
+        FIELDS (tuple): Item fields written as top-level keys, in this order.
+    """
+
+    FIELDS = ("library", "arr_id", "tmdb_id", "season", "stage", "duration_ms", "outcome", "correlation_id")
+
+    def format(self, record):
+        """
+        Format the log record as a JSON object.
+
+        Args:
+            record (logging.LogRecord): The log record to format.
+
+        Returns:
+            str: One line of JSON.
+        """
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "event": getattr(record, "msg_key", None) or record.getMessage(),
+            "thread": record.threadName,
+        }
+        fields = getattr(record, "log_fields", {})
+        for name in self.FIELDS:
+            if name in fields:
+                entry[name] = fields[name]
+        values = getattr(record, "msg_values", None)
+        if values:
+            entry["values"] = values
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        # Values such as exceptions or paths are written as their text
+        return json.dumps(entry, ensure_ascii=False, default=str)
@@ -0,0 +1,65 @@
+"""
+Module providing the structured fields attached to every log record of the current item.
+
+The fields (library, *arr id, TMDB id, season, pipeline stage, correlation id...) live in a `contextvars.ContextVar`,
+so each worker thread carries the fields of the item it is working on and concurrent items never mix. `Logger`
+copies the current fields into every record it emits, and `JsonFormatter` writes them as top-level keys.
+
+Dependencies:
+    - contextlib: Context manager helper.
+    - contextvars: Per-thread (and per-task) storage of the fields.
+    - uuid: Generation of the correlation ids.
+
+Functions:
+    - current() -> dict:
+        Return the fields of the current context.
+    - bind(**fields):
+        Context manager adding fields to the current context.
+    - new_correlation_id() -> str:
+        Generate a correlation id for a new item.
+
+Usage:
+    .. code-block:: python
+
+        with log_context.bind(library="radarr", arr_id=1, tmdb_id=603, correlation_id=log_context.new_correlation_id()):
+            logger.info("Search trailers for « {title} ».", title="The Matrix")
+"""
+
+import contextlib
+import contextvars
+import uuid
+
+# Fields of the current item, empty outside of any item
+_fields: contextvars.ContextVar = contextvars.ContextVar("log_fields", default={})
+
+
+def current() -> dict:
+    """
+    Return the fields of the current context.
+
+    :return: Dictionary of the fields, must not be modified
+    """
+    return _fields.get()
+
+
+@contextlib.contextmanager
+def bind(**fields):
+    """
+    Add fields to the current context for the duration of the block. Fields set to None are ignored.
+
+    :param fields: Field names and values
+    """
+    token = _fields.set({**_fields.get(), **{name: value for name, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def new_correlation_id() -> str:
+    """
+    Generate a correlation id shared by every record of one item.
+
+    :return: 16 hexadecimal characters
+    """
+    return uuid.uuid4().hex[:16]
@@ -6,14 +6,26 @@ customizable date formats and color-coded console messages. The `Logger` class s
 different levels of severity and can write logs to both the console and a file. It also includes support for log
 rotation based on file size and backup count.
 
+Log calls are handed to a `QueueHandler` and return immediately: formatting, console output and file writes are
+performed by a background `QueueListener`, so a pass over a large library never waits on terminal or disk I/O.
+The console can optionally be rate-limited and coalesced (see `CoalescingStreamHandler`) without blocking callers.
+
+With `log_format="json"`, records are written by `JsonFormatter` as one JSON object per line. Every record carries
+the untranslated message key, its values and the fields of the item being processed (see `modules.log_context`),
+captured when the log call is made so they survive the hand-over to the listener thread.
+
 Dependencies:
     - `logging`: Standard Python logging module for logging messages.
     - `logging.handlers`: Provides handlers for logging, including rotating file handlers.
     - `sys`: Provides access to system-specific parameters and functions.
     - `os`: Provides a portable way of using operating system-dependent functionality.
-    - `time`: Provides time-related functions.
+    - `atexit`: Stops the background listener and flushes pending records at interpreter exit.
+    - `queue`: Provides the queue shared by the `QueueHandler` and the `QueueListener`.
     - `modules.translator`: Custom module for handling message translations.
     - `modules.colored_formatter`: Custom module defining the `ColoredFormatter` class for color-coded logging.
+    - `modules.json_formatter`: Custom module defining the `JsonFormatter` class for structured logging.
+    - `modules.log_context`: Custom module holding the fields of the item being processed.
+    - `modules.coalescing_handler`: Custom module defining the rate-limited `CoalescingStreamHandler` console handler.
 
 Classes:
     - `Logger`:
@@ -26,6 +38,11 @@ Attributes:
     - `log_level` (str): Logging level (`DEBUG`, `INFO`, `WARNING`, `ERROR`, `CRITICAL`) to control which messages are logged.
     - `log_max_size` (int): Maximum size of the log file before rotation occurs, specified in megabytes.
     - `log_backup_count` (int): Number of backup files to keep when rotating logs.
+    - `console_rate` (float): Maximum number of console lines per second, 0 disables the limit.
+    - `console_coalesce` (bool): Collapse identical consecutive console lines into a single "repeated" notice.
+    - `log_format` (str): "text" for colored lines, "json" for one JSON object per line.
+    - `log_queue` (multiprocessing.Queue): Queue receiving the records instead of the console and file, used by the
+      worker processes of `modules.download_shards` to log through their parent.
 
 Usage:
     Initialize the `Logger` class with parameters to set up logging configurations such as file path, log level,
@@ -42,7 +59,10 @@ Usage:
             log_path="path/to/logfile.log",
             log_level="INFO",
             log_max_size=10,  # in megabytes
-            log_backup_count=5
+            log_backup_count=5,
+            console_rate=20,  # console lines per second, 0 = unlimited
+            console_coalesce=True,
+            log_format="text"
         )
 
     Log methods:
@@ -52,22 +72,43 @@ Usage:
         - `error(msg_key="", **kwargs)`: Logs an error message.
         - `debug(msg_key="", **kwargs)`: Logs a debug message.
         - `critical(msg_key="", **kwargs)`: Logs a critical message.
+        - `stop()`: Flushes pending records and stops the background listener.
 
     Error Handling:
         The `Logger` class raises specific exceptions with translated messages when invalid parameters are provided:
         - `InvalidLogSizeError`: Raised if `log_max_size` is not a positive integer.
         - `InvalidLogCountError`: Raised if `log_backup_count` is not a non-negative integer.
         - `InvalidLogLevelError`: Raised if `log_level` is not one of the valid logging levels (`DEBUG`, `INFO`, `WARNING`, `ERROR`, `CRITICAL`).
+        - `InvalidLogFormatError`: Raised if `log_format` is neither `text` nor `json`.
 """
 
 import sys
 import os
+import atexit
+import queue
 import logging
 import logging.handlers
-from time import sleep
 from modules.translator import Translator
+from modules import log_context
 from modules.colored_formatter import ColoredFormatter
-from modules.exceptions import InvalidLogLevelError, InvalidLogCountError, InvalidLogSizeError
+from modules.json_formatter import JsonFormatter
+from modules.coalescing_handler import CoalescingStreamHandler
+from modules.exceptions import InvalidLogLevelError, InvalidLogCountError, InvalidLogSizeError, InvalidLogFormatError
+
+
+class _ForwardingHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler sending the records of a worker process to its parent.
+
+    The message values are turned into text, the records must be picklable to cross the process boundary.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        values = getattr(record, "msg_values", None)
+        if values:
+            record.msg_values = {name: value if isinstance(value, (str, int, float, bool, type(None))) else str(value) for name, value in values.items()}
+        return record
 
 
 class Logger(Translator):
@@ -81,9 +122,27 @@ class Logger(Translator):
         log_level (str): Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL) to control which messages are logged.
         log_max_size (int): Maximum size of the log file before rotation occurs, specified in bytes.
         log_backup_count (int): Number of backup files to keep when rotating logs.
+        console_rate (float): Maximum number of console lines per second, 0 disables the limit.
+        console_coalesce (bool): Collapse identical consecutive console lines.
+        log_format (str): "text" or "json".
+        log_queue (multiprocessing.Queue): Queue receiving the records of a worker process, None in the main process.
     """
 
-    def __init__(self, local="en", date_format="%Y-%m-%d %H:%M:%S", log_path=None, log_level="INFO", log_max_size=10, log_backup_count=5):
+    LOG_FORMATS = ("text", "json")
+
+    def __init__(
+        self,
+        local="en",
+        date_format="%Y-%m-%d %H:%M:%S",
+        log_path=None,
+        log_level="INFO",
+        log_max_size=10,
+        log_backup_count=5,
+        console_rate=0,
+        console_coalesce=False,
+        log_format="text",
+        log_queue=None,
+    ):
         """
         Initializes the Logger with a default locale, date format, and logging configuration.
 
@@ -94,6 +153,11 @@ class Logger(Translator):
             log_level (str, optional): The logging level. Defaults to "INFO". Valid values are DEBUG, INFO, WARNING, ERROR, CRITICAL.
             log_max_size (int, optional): Maximum log file size before rotation in megabytes. Defaults to 10.
             log_backup_count (int, optional): Number of backup files to keep. Defaults to 5.
+            console_rate (float, optional): Maximum number of console lines per second. Defaults to 0 (unlimited).
+            console_coalesce (bool, optional): Collapse identical consecutive console lines. Defaults to False.
+            log_format (str, optional): "text" for colored lines, "json" for one JSON object per line. Defaults to "text".
+            log_queue (multiprocessing.Queue, optional): Send the records to this queue, to be written by the parent
+                process, instead of the console and file. Defaults to None.
         """
         super().__init__(local)
 
@@ -122,19 +186,40 @@ class Logger(Translator):
                 )
             )
 
+        log_format = (log_format or "text").lower()
+        if log_format not in self.LOG_FORMATS:
+            raise InvalidLogFormatError(
+                self.translate(
+                    "The defined log format « {format} » is not valid. The valid formats are « {formats} ».",
+                    format=log_format,
+                    formats=", ".join(self.LOG_FORMATS),
+                )
+            )
+
         self.date_format = date_format
         self.log_path = log_path
         self.log_level = log_level.upper()
         self.log_max_size = log_max_size * 1024 * 1024  # Convert MB to bytes
         self.log_backup_count = log_backup_count
+        self.console_rate = console_rate or 0
+        self.console_coalesce = bool(console_coalesce)
+        self.log_format = log_format
+        self.log_queue = log_queue
+        self._listener = None
         self._setup_logging()
 
     def _setup_logging(self) -> None:
         """
         Sets up logging configuration based on provided log_path, log_level, log_max_size, and log_backup_count.
+
+        The root logger only receives a `QueueHandler`; the console and file handlers are attached to a
+        `QueueListener` that formats and writes records on its own thread.
         """
         log_level = getattr(logging, self.log_level, logging.INFO)
-        formatter = ColoredFormatter("%(asctime)s - %(levelname)s - %(message)s", datefmt=self.date_format)
+        if self.log_format == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = ColoredFormatter("%(asctime)s - %(levelname)s - %(message)s", datefmt=self.date_format)
 
         logger = logging.getLogger()
         logger.setLevel(log_level)
@@ -142,12 +227,23 @@ class Logger(Translator):
         # Remove all existing handlers
         if logger.hasHandlers():
             logger.handlers.clear()
+        self.stop()
+
+        if self.log_queue is not None:
+            # Worker process: the parent formats and writes the records with its own handlers
+            logger.addHandler(_ForwardingHandler(self.log_queue))
+            return
+
+        handlers = []
 
         # Console handler
-        console_handler = logging.StreamHandler(sys.stdout)
+        if self.console_rate or self.console_coalesce:
+            console_handler = CoalescingStreamHandler(sys.stdout, max_rate=self.console_rate, coalesce=self.console_coalesce, translate=self.translate)
+        else:
+            console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setFormatter(formatter)
         console_handler.setLevel(log_level)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
 
         # File handler
         if self.log_path:
@@ -156,21 +252,45 @@ class Logger(Translator):
                 file_handler = logging.handlers.RotatingFileHandler(self.log_path, maxBytes=self.log_max_size, backupCount=self.log_backup_count)
                 file_handler.setFormatter(formatter)
                 file_handler.setLevel(log_level)
-                logger.addHandler(file_handler)
+                handlers.append(file_handler)
             except Exception as e:
                 print(f"Failed to set up file logging: {e}", file=sys.stderr)
 
-    def _log(self, level: str, msg: str) -> None:
+        # Hand records over to the listener thread so log calls never wait on I/O
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Flushes pending records and stops the background listener.
+
+        Safe to call several times; it is registered with `atexit` so queued records are written on shutdown.
+        """
+        listener, self._listener = self._listener, None
+        if listener is None:
+            return
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+    def _log(self, level: str, msg: str, msg_key: str = "", values: dict = None) -> None:
         """
         Logs a message to the console and/or file with the specified level and color.
 
+        The record is only queued here; formatting and output happen on the listener thread. The message key, its
+        values and the fields of the current item are attached to the record for `JsonFormatter`.
+
         Args:
             level (str): The logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL).
             msg (str): The message to log.
+            msg_key (str, optional): The untranslated message key.
+            values (dict, optional): The values the message was formatted with.
         """
         log_func = getattr(logging, level.lower())
-        log_func(msg)
-        sleep(1)  # Wait 1s to avoid excessive CPU load
+        log_func(msg, extra={"msg_key": msg_key, "msg_values": values, "log_fields": log_context.current()})
 
     def info(self, msg_key: str = "", **kwargs) -> None:
         """
@@ -181,7 +301,7 @@ class Logger(Translator):
             **kwargs: Additional keyword arguments to format the translated message.
         """
         msg = self.translate(msg_key, **kwargs)
-        self._log("INFO", msg)
+        self._log("INFO", msg, msg_key, kwargs)
 
     def success(self, msg_key: str = "", **kwargs) -> None:
         """
@@ -192,7 +312,7 @@ class Logger(Translator):
             **kwargs: Additional keyword arguments to format the translated message.
         """
         msg = self.translate(msg_key, **kwargs)
-        self._log("INFO", msg)
+        self._log("INFO", msg, msg_key, kwargs)
 
     def warning(self, msg_key: str = "", **kwargs) -> None:
         """
@@ -203,7 +323,7 @@ class Logger(Translator):
             **kwargs: Additional keyword arguments to format the translated message.
         """
         msg = self.translate(msg_key, **kwargs)
-        self._log("WARNING", msg)
+        self._log("WARNING", msg, msg_key, kwargs)
 
     def error(self, msg_key: str = "", **kwargs) -> None:
         """
@@ -214,7 +334,7 @@ class Logger(Translator):
             **kwargs: Additional keyword arguments to format the translated message.
         """
         msg = self.translate(msg_key, **kwargs)
-        self._log("ERROR", msg)
+        self._log("ERROR", msg, msg_key, kwargs)
 
     def debug(self, msg_key: str = "", **kwargs) -> None:
         """
@@ -225,7 +345,7 @@ class Logger(Translator):
             **kwargs: Additional keyword arguments to format the translated message.
         """
         msg = self.translate(msg_key, **kwargs)
-        self._log("DEBUG", msg)
+        self._log("DEBUG", msg, msg_key, kwargs)
 
     def critical(self, msg_key: str = "", **kwargs) -> None:
         """
@@ -236,4 +356,4 @@ class Logger(Translator):
             **kwargs: Additional keyword arguments to format the translated message.
         """
         msg = self.translate(msg_key, **kwargs)
-        self._log("CRITICAL", msg)
+        self._log("CRITICAL", msg, msg_key, kwargs)
@@ -0,0 +1,317 @@
+"""
+Module providing in-process metrics and an optional HTTP endpoint exposing them in the Prometheus text format.
+
+The pipeline stages, the TMDB client, the response cache, yt-dlp and ffmpeg record their counters and durations in
+the process-wide `metrics` registry. With `APP_METRICS_ENABLED`, `MetricsServer` serves the registry on
+`/metrics`, so the stage limiting the throughput can be read from a dashboard under real load: compare the stage
+durations, and look for the queue whose depth stays at its bound.
+
+Metrics:
+    - trailer_finder_items_total{library, outcome}: Items handled per library and outcome (skipped, downloaded,
+      not_found, failed); their sum is the number of items scanned.
+    - trailer_finder_stage_duration_seconds{stage}: Duration of the TMDB, download and ffmpeg pipeline stages.
+    - trailer_finder_queue_depth{stage}: Jobs waiting in front of each stage.
+    - trailer_finder_pending_jobs{library}: Jobs submitted and not finished yet.
+    - trailer_finder_tmdb_requests_total{status}: TMDB HTTP requests by status code ("error" when none).
+    - trailer_finder_tmdb_request_duration_seconds: Duration of the TMDB HTTP requests, retries included.
+    - trailer_finder_tmdb_cache_total{result}: Response cache lookups (hits, revalidated, misses).
+    - trailer_finder_ytdlp_downloaded_bytes_total: Bytes written by yt-dlp.
+    - trailer_finder_ytdlp_download_duration_seconds{result}: Duration of the yt-dlp downloads.
+    - trailer_finder_ffmpeg_duration_seconds{result}: Duration of the ffmpeg jobs.
+    - trailer_finder_next_run_timestamp_seconds{job}: Time of the next run of each scheduled job.
+    - trailer_finder_work_queue_items{status}: Items of the shared work queue by status, see `modules.work_queue`.
+
+Dependencies:
+    - threading: Protects the registry shared by every worker thread.
+    - http.server: Built-in HTTP server.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - Metrics:
+        Thread-safe registry of counters, histograms and gauges.
+    - MetricsServer(Translator):
+        HTTP server exposing a registry on `/metrics`.
+
+Configuration:
+    - APP_METRICS_ENABLED (bool): Start the metrics endpoint. Defaults to False.
+    - APP_METRICS_HOST (str): Address to listen on. Defaults to "0.0.0.0".
+    - APP_METRICS_PORT (int): Port to listen on. Defaults to 9686.
+
+Usage:
+    .. code-block:: python
+
+        from modules.metrics import metrics
+
+        metrics.inc("trailer_finder_tmdb_requests_total", status=200)
+        metrics.observe("trailer_finder_tmdb_request_duration_seconds", 0.12)
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from modules.logger import Logger
+from modules.translator import Translator
+
+# Buckets for the requests and lookups, in seconds
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Buckets for the downloads and ffmpeg jobs, in seconds
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Name: (type, help, buckets)
+DEFINITIONS = {
+    "trailer_finder_items_total": ("counter", "Items handled per library and outcome.", None),
+    "trailer_finder_stage_duration_seconds": ("histogram", "Duration of the pipeline stages.", SLOW_BUCKETS),
+    "trailer_finder_queue_depth": ("gauge", "Jobs waiting in front of each pipeline stage.", None),
+    "trailer_finder_pending_jobs": ("gauge", "Jobs submitted to the pipeline and not finished yet.", None),
+    "trailer_finder_tmdb_requests_total": ("counter", "TMDB HTTP requests by status code.", None),
+    "trailer_finder_tmdb_request_duration_seconds": ("histogram", "Duration of the TMDB HTTP requests.", FAST_BUCKETS),
+    "trailer_finder_tmdb_cache_total": ("counter", "TMDB response cache lookups by result.", None),
+    "trailer_finder_ytdlp_downloaded_bytes_total": ("counter", "Bytes downloaded by yt-dlp.", None),
+    "trailer_finder_ytdlp_download_duration_seconds": ("histogram", "Duration of the yt-dlp downloads.", SLOW_BUCKETS),
+    "trailer_finder_ffmpeg_duration_seconds": ("histogram", "Duration of the ffmpeg jobs.", SLOW_BUCKETS),
+    "trailer_finder_next_run_timestamp_seconds": ("gauge", "Time of the next run of each scheduled job.", None),
+    "trailer_finder_work_queue_items": ("gauge", "Items of the shared work queue by status.", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    """
+    Turn keyword labels into a hashable, sorted key.
+
+    :param labels: Label names and values
+    :return: Tuple of (name, value) pairs
+    """
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format(name: str, labels: Labels, value: float) -> str:
+    """
+    Format one sample of the text exposition format.
+
+    :param name: Sample name
+    :param labels: Label pairs
+    :param value: Sample value
+    :return: Sample line
+    """
+    if labels:
+        pairs = ((label, text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for label, text in labels)
+        name += "{" + ",".join(f'{label}="{text}"' for label, text in pairs) + "}"
+    return f"{name} {value:g}" if isinstance(value, float) else f"{name} {value}"
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, histograms and gauges.
+
+    Metrics must be declared in `DEFINITIONS`. Gauges are read from callbacks when the registry is rendered,
+    so the instrumented code does not have to keep them up to date.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty registry.
+        """
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, list]] = {}
+        self._gauges: Dict[str, Callable[[], Iterable[Tuple[dict, float]]]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increment a counter.
+
+        :param name: Counter name
+        :param value: Amount to add
+        :param labels: Label values
+        """
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Record a value, usually a duration in seconds, in a histogram.
+
+        :param name: Histogram name
+        :param value: Observed value
+        :param labels: Label values
+        """
+        buckets = DEFINITIONS[name][2]
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts, then the sum and the count
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(buckets) + [0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def gauge(self, name: str, callback: Callable[[], Iterable[Tuple[dict, float]]]) -> None:
+        """
+        Register the callback reading a gauge, replacing the previous one.
+
+        :param name: Gauge name
+        :param callback: Function returning (labels, value) pairs
+        """
+        with self._lock:
+            self._gauges[name] = callback
+
+    def reset(self) -> None:
+        """
+        Drop every recorded value and gauge.
+        """
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self._gauges = {}
+
+    def collect(self) -> dict:
+        """
+        Return the counters and histograms recorded so far and clear them, e.g. to send them to another process.
+
+        :return: Recorded values, to be passed to `merge()`
+        """
+        with self._lock:
+            collected = {"counters": self._counters, "histograms": self._histograms}
+            self._counters = {}
+            self._histograms = {}
+        return collected
+
+    def merge(self, collected: dict) -> None:
+        """
+        Add the values returned by `collect()` on another registry to this one.
+
+        :param collected: Recorded values
+        """
+        with self._lock:
+            for name, series in collected["counters"].items():
+                target = self._counters.setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = target.get(key, 0) + value
+            for name, series in collected["histograms"].items():
+                target = self._histograms.setdefault(name, {})
+                for key, state in series.items():
+                    current = target.get(key)
+                    target[key] = list(state) if current is None else [total + value for total, value in zip(current, state)]
+
+    def render(self) -> str:
+        """
+        Render the registry in the Prometheus text exposition format.
+
+        :return: Exposition text
+        """
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {key: list(state) for key, state in series.items()} for name, series in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        lines = []
+        for name, (kind, help_text, buckets) in DEFINITIONS.items():
+            if kind == "counter":
+                samples = sorted(counters.get(name, {}).items())
+            elif kind == "gauge":
+                samples = sorted((_labels(labels), value) for labels, value in gauges[name]()) if name in gauges else []
+            else:
+                samples = sorted(histograms.get(name, {}).items())
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in samples:
+                if kind != "histogram":
+                    lines.append(_format(name, key, value))
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(_format(f"{name}_bucket", key + (("le", f"{bound:g}"),), cumulative))
+                lines.append(_format(f"{name}_bucket", key + (("le", "+Inf"),), value[-1]))
+                lines.append(_format(f"{name}_sum", key, float(value[-2])))
+                lines.append(_format(f"{name}_count", key, value[-1]))
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by the whole process
+metrics = Metrics()
+
+
+class MetricsServer(Translator):
+    """
+    HTTP server exposing a metrics registry on `/metrics`.
+
+    Attributes:
+        logger (Logger): Logger instance for logging messages.
+        config (dict): Configuration dictionary.
+        registry (Metrics): Registry served by the endpoint.
+    """
+
+    def __init__(self, logger: Logger, config: dict, registry: Optional[Metrics] = None) -> None:
+        """
+        Initialize the metrics server.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        :param registry: Registry to serve, the process-wide `metrics` when omitted
+        """
+        self.logger = logger
+        self.config = config
+        self.registry = registry or metrics
+        self._server = None
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    def start(self) -> None:
+        """
+        Start the HTTP server in a background thread.
+        """
+        host = self.config.get("APP_METRICS_HOST", "0.0.0.0")
+        port = self.config.get("APP_METRICS_PORT", 9686)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        self.logger.info("Metrics endpoint started on « {address} ».", address=f"{host}:{port}")
+
+    def stop(self) -> None:
+        """
+        Stop the HTTP server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handler_class(self):
+        """
+        Build the request handler class bound to this server.
+
+        :return: Subclass of `BaseHTTPRequestHandler`
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are frequent, they are not worth a log line
+                pass
+
+        return Handler
@@ -0,0 +1,421 @@
+"""
+Module providing a staged, concurrent trailer pipeline shared by the Radarr and Sonarr passes.
+
+Each library item goes through three stages: a TMDB lookup (`Utils.trailer_pull`), a yt-dlp download
+(`YoutubeDL.download_trailers`) and an ffmpeg post-processing step (`Utils.post_process`). Every stage has its
+own bounded pool of worker threads and items flow between stages through bounded queues, so a slow download
+never stops the next TMDB lookup and an ffmpeg job never stops the next download, while each stage still
+respects its own concurrency limit.
+
+Dependencies:
+    - os: Operating system interface for file operations.
+    - queue: Thread-safe queues connecting the stages.
+    - threading: Worker threads and completion tracking.
+    - time: Measurement of the stage durations.
+    - collections.Counter: Per-library outcome counters used for the end-of-cycle summary.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.log_context: Fields of the item attached to the log records of its job.
+    - modules.metrics.metrics: Registry receiving the outcomes, stage durations and queue depths.
+    - modules.profiler.profiler: Stage times logged with the end-of-cycle summary, enabled by `APP_PROFILE`.
+    - modules.exceptions.FfmpegCommandMissing: Configuration error that stops the pipeline.
+    - modules.state_store.StateStore: Optional persistent record of the job outcomes.
+    - modules.download_shards.DownloadShards: Download processes, enabled by `APP_DOWNLOAD_PROCESSES`.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - TrailerPipeline(Translator):
+        Bounded worker pools for the TMDB, download and ffmpeg stages.
+
+Configuration:
+    - APP_TMDB_WORKERS (int): Number of concurrent TMDB lookups. Defaults to 1.
+    - APP_DOWNLOAD_WORKERS (int): Number of concurrent yt-dlp downloads. Defaults to 1.
+    - APP_DOWNLOAD_PROCESSES (int): Run the downloads in this many worker processes instead of the download threads,
+      see `modules.download_shards`. The download stage then has at least two threads per process. Defaults to 0.
+    - APP_FFMPEG_WORKERS (int | "auto"): Number of concurrent ffmpeg jobs. "auto" uses as many jobs as fit in the CPU
+      cores given `FFMPEG_THREAD_COUNT` threads per job. Defaults to 1.
+    - TMDB_BATCH_SEASONS (bool): Retrieve the seasons of a TV show with batched TMDB requests. Defaults to True.
+
+Usage:
+    .. code-block:: python
+
+        pipeline = TrailerPipeline(logger, config, utils)
+        pipeline.start()
+        pipeline.submit({"library": "radarr", "item": movie, "tmdb_id": movie["tmdbId"], "item_type": "movie"})
+        pipeline.wait("radarr")
+        pipeline.close()
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from modules import log_context
+from modules.logger import Logger
+from modules.exceptions import FfmpegCommandMissing
+from modules.metrics import metrics
+from modules.profiler import profiler
+from modules.state_store import StateStore
+from modules.download_shards import DownloadShards
+from modules.translator import Translator
+
+
+class TrailerPipeline(Translator):
+    """
+    Staged pipeline running TMDB lookups, downloads and ffmpeg post-processing in separate bounded pools.
+
+    Jobs are dictionaries with the following keys:
+        - library (str): Name of the library the item belongs to ("radarr" or "sonarr").
+        - item (dict): Metadata of the item, as prepared by `radarr()` or `sonarr()`.
+        - tmdb_id (int): TMDB ID of the movie or TV show.
+        - item_type (str): Type of item ('movie' or 'tv').
+        - season_number (int, optional): Season number for TV shows.
+        - existing (list, optional): Files already present in the item's trailer folder.
+        - batch (dict, optional): Season lookup shared by the jobs of one TV show, see `submit_batch()`.
+        - log_fields (dict, optional): Log fields of the item, captured by `submit()` from the producer's context.
+
+    Every finished job is counted under its library with one of the `OUTCOMES`; producers count the items they
+    skip themselves with `record()`. When a `StateStore` is attached, the outcome of every finished job is also
+    persisted so later cycles can skip it (see `should_skip()`).
+    """
+
+    STAGES = ("tmdb", "download", "ffmpeg")
+    OUTCOMES = ("skipped", "downloaded", "not_found", "failed")
+
+    def __init__(self, logger: Logger, config: dict, utils, state: Optional[StateStore] = None) -> None:
+        """
+        Initialize the pipeline with a logger, configuration and utility instance.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        :param utils: Utils instance providing the stage operations
+        :param state: Optional state store recording the job outcomes
+        """
+        self.logger = logger
+        self.config = config
+        self.utils = utils
+        self.state = state
+        self.workers = {
+            "tmdb": max(1, int(config.get("APP_TMDB_WORKERS", 1))),
+            "download": max(1, int(config.get("APP_DOWNLOAD_WORKERS", 1))),
+            "ffmpeg": self.ffmpeg_workers(config),
+        }
+        # Download processes: each download thread waits for an item of one shard, two per shard keep them all busy
+        self.shards = DownloadShards(logger, config) if int(config.get("APP_DOWNLOAD_PROCESSES", 0)) > 0 else None
+        if self.shards is not None:
+            self.workers["download"] = max(self.workers["download"], 2 * self.shards.processes)
+        # Bounded queues give back-pressure: a producer waits instead of listing the whole library in memory
+        self._queues = {stage: queue.Queue(maxsize=self.workers[stage] * 2) for stage in self.STAGES}
+        self._threads: Dict[str, list] = {}
+        self._pending: Dict[str, int] = {}
+        self._done = threading.Condition()
+        self._fatal: Optional[Exception] = None
+        self._stats: Dict[str, Counter] = {}
+        metrics.gauge("trailer_finder_queue_depth", lambda: [({"stage": stage}, jobs.qsize()) for stage, jobs in self._queues.items()])
+        metrics.gauge("trailer_finder_pending_jobs", lambda: [({"library": library}, count) for library, count in list(self._pending.items())])
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    @staticmethod
+    def ffmpeg_workers(config: dict) -> int:
+        """
+        Compute the number of concurrent ffmpeg jobs.
+
+        With `APP_FFMPEG_WORKERS: auto`, the pool is sized so that jobs of `FFMPEG_THREAD_COUNT` threads each
+        use every core without oversubscribing them.
+
+        :param config: Configuration dictionary
+        :return: Number of ffmpeg workers
+        """
+        workers = config.get("APP_FFMPEG_WORKERS", 1)
+        if str(workers).lower() == "auto":
+            threads = max(1, int(config.get("FFMPEG_THREAD_COUNT", 4)))
+            return max(1, (os.cpu_count() or 1) // threads)
+        return max(1, int(workers))
+
+    def start(self) -> None:
+        """
+        Start the worker threads of every stage.
+        """
+        if self._threads:
+            return
+        if self.shards is not None:
+            self.shards.start()
+        for stage in self.STAGES:
+            self._threads[stage] = []
+            for index in range(self.workers[stage]):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"{stage}-{index}", daemon=True)
+                thread.start()
+                self._threads[stage].append(thread)
+        self.logger.debug(
+            "Trailer pipeline started with « {tmdb} » TMDB, « {download} » download and « {ffmpeg} » ffmpeg workers.",
+            **self.workers,
+        )
+
+    def close(self) -> None:
+        """
+        Stop the worker threads once the queued jobs are finished.
+
+        Stages are drained in order so that jobs still flowing downstream are not stranded.
+        """
+        for stage in self.STAGES:
+            for _ in self._threads.get(stage, []):
+                self._queues[stage].put(None)
+            for thread in self._threads.get(stage, []):
+                thread.join()
+        self._threads = {}
+        if self.shards is not None:
+            self.shards.close()
+
+    def submit(self, job: dict) -> None:
+        """
+        Queue a job for the TMDB stage. Blocks while the stage is saturated.
+
+        :param job: Job dictionary (see class documentation)
+        :raises FfmpegCommandMissing: If a previous job hit a configuration error
+        """
+        self._raise_fatal()
+        self._admit(job)
+        self._queues["tmdb"].put(job)
+
+    def submit_batch(self, jobs: List[dict]) -> None:
+        """
+        Queue the season jobs of one TV show so their TMDB lookups are made together.
+
+        The jobs share a batch: the first one reaching the TMDB stage retrieves every season with
+        `Utils.trailer_pull_seasons()` and the others reuse its result.
+
+        :param jobs: Season jobs of the same TV show
+        :raises FfmpegCommandMissing: If a previous job hit a configuration error
+        """
+        if len(jobs) > 1 and self.config.get("TMDB_BATCH_SEASONS", True):
+            batch = {"seasons": [job["season_number"] for job in jobs], "lock": threading.Lock(), "trailers": None}
+            for job in jobs:
+                job["batch"] = batch
+        for job in jobs:
+            self.submit(job)
+
+    def wait(self, library: Optional[str] = None) -> None:
+        """
+        Block until every job of `library` (or of every library) has left the pipeline.
+
+        :param library: Library name, or None to wait for all jobs
+        :raises FfmpegCommandMissing: If a job hit a configuration error
+        """
+        with self._done:
+            self._done.wait_for(lambda: self._fatal is not None or self._idle(library))
+        self._raise_fatal()
+
+    def should_skip(self, job: dict) -> bool:
+        """
+        Check the state store for a recent outcome of `job`, counting it as skipped if so.
+
+        Producers call this before touching the file system, so settled items cost a single database lookup.
+
+        :param job: Job dictionary
+        :return: True if the job does not need to be submitted
+        """
+        if self.state is None or not self.state.should_skip(job):
+            return False
+        self.record(job["library"], "skipped")
+        return True
+
+    def skip_existing(self, job: dict, existing: list) -> None:
+        """
+        Count a job whose item already has trailers as skipped and remember it in the state store.
+
+        :param job: Job dictionary
+        :param existing: Trailer files already present in the item's trailer folder
+        """
+        self.record(job["library"], "skipped")
+        if self.state is not None:
+            job["file_paths"] = [os.path.join(job["item"]["trailers_dest"], name) for name in existing]
+            self.state.record(job, "downloaded")
+
+    def record(self, library: str, outcome: str) -> None:
+        """
+        Count an outcome for `library`, e.g. an item skipped by the producer before reaching the pipeline.
+
+        :param library: Library name
+        :param outcome: One of `OUTCOMES`
+        """
+        with self._done:
+            self._stats.setdefault(library, Counter())[outcome] += 1
+        metrics.inc("trailer_finder_items_total", library=library, outcome=outcome)
+
+    def summary(self, reset: bool = True, library: Optional[str] = None) -> Dict[str, Counter]:
+        """
+        Log one summary line per library and return the counters. With `APP_PROFILE`, the table of the stage times
+        follows.
+
+        :param reset: Clear the counters afterwards, so the next cycle starts from zero
+        :param library: Only report (and reset) this library, e.g. at the end of its pass
+        :return: Outcome counters per library
+        """
+        with self._done:
+            if library is None:
+                stats = self._stats
+                if reset:
+                    self._stats = {}
+            else:
+                stats = {library: self._stats[library]} if library in self._stats else {}
+                if reset:
+                    self._stats.pop(library, None)
+        for name, counter in sorted(stats.items()):
+            self.logger.info(
+                "« {library} »: « {scanned} » scanned, « {skipped} » skipped, « {downloaded} » downloaded, « {not_found} » without trailer, « {failed} » failed.",
+                library=name.capitalize(),
+                scanned=sum(counter[outcome] for outcome in self.OUTCOMES),
+                **{outcome: counter[outcome] for outcome in self.OUTCOMES},
+            )
+        profiler.report(self.logger, library, reset)
+        return stats
+
+    def _idle(self, library: Optional[str]) -> bool:
+        """
+        Check whether no job of `library` is left in the pipeline. Must be called with `_done` held.
+
+        :param library: Library name, or None for all libraries
+        :return: True if there is no pending job
+        """
+        if library is None:
+            return not any(self._pending.values())
+        return not self._pending.get(library, 0)
+
+    def _admit(self, job: dict) -> None:
+        """
+        Count a new job as pending and capture the producer's log fields.
+
+        :param job: Job dictionary
+        """
+        # The workers log on behalf of the producer: keep its fields and correlation id with the job
+        if "log_fields" not in job:
+            job["log_fields"] = dict(log_context.current())
+            if job.get("season_number") is not None:
+                job["log_fields"]["season"] = job["season_number"]
+        job["submitted"] = time.monotonic()
+        with self._done:
+            self._pending[job["library"]] = self._pending.get(job["library"], 0) + 1
+
+    def _raise_fatal(self) -> None:
+        """
+        Re-raise a configuration error hit by a worker in the calling thread.
+        """
+        if self._fatal is not None:
+            raise self._fatal
+
+    def _finish(self, job: dict) -> None:
+        """
+        Mark a job as done and wake up waiting producers.
+
+        :param job: Job dictionary
+        """
+        outcome = job.get("outcome", "failed")
+        duration = time.monotonic() - job.get("submitted", time.monotonic())
+        with log_context.bind(outcome=outcome, duration_ms=int(duration * 1000)):
+            self.logger.info("« {title} » finished with outcome « {outcome} » in « {duration} » seconds.", title=job["item"].get("use_title"), outcome=outcome, duration=round(duration, 1))
+        if outcome == "failed" and job.get("cache_path"):
+            # Files of a failed ffmpeg stage would otherwise stay staged until the next run
+            self.utils.discard_staging(job["cache_path"], job["item"])
+        if self.state is not None and self._fatal is None:
+            stored = outcome
+            if outcome == "not_found":
+                stored = "too_long" if job["item"].get("duration_rejections") else "no_candidates"
+            job["video_keys"] = job["item"].get("video_keys", [])
+            try:
+                self.state.record(job, stored)
+            except Exception as err:
+                self.logger.error("An error has occurred « {error} ».", error=err)
+        with self._done:
+            self._pending[job["library"]] -= 1
+            self._stats.setdefault(job["library"], Counter())[outcome] += 1
+            self._done.notify_all()
+        metrics.inc("trailer_finder_items_total", library=job["library"], outcome=outcome)
+
+    def _worker(self, stage: str) -> None:
+        """
+        Worker loop for one stage: take a job, run the stage, then forward or finish the job.
+
+        :param stage: Stage name
+        """
+        handlers = {"tmdb": self._lookup, "download": self._download, "ffmpeg": self._post_process}
+        jobs = self._queues[stage]
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            with log_context.bind(**job.get("log_fields", {}), stage=stage):
+                next_stage = None
+                started = time.perf_counter()
+                try:
+                    if self._fatal is None:
+                        next_stage = handlers[stage](job)
+                except FfmpegCommandMissing as err:
+                    with self._done:
+                        self._fatal = err
+                        self._done.notify_all()
+                except Exception as err:
+                    self.logger.error("An error has occurred « {error} ».", error={"error": err, "title": job["item"].get("use_title")})
+                duration = time.perf_counter() - started
+                metrics.observe("trailer_finder_stage_duration_seconds", duration, stage=stage)
+                with log_context.bind(duration_ms=int(duration * 1000)):
+                    self.logger.debug("Stage « {stage} » of « {title} » finished in « {duration} » ms.", stage=stage, title=job["item"].get("use_title"), duration=int(duration * 1000))
+                if next_stage is None:
+                    self._finish(job)
+                else:
+                    self._queues[next_stage].put(job)
+
+    def _lookup(self, job: dict) -> Optional[str]:
+        """
+        TMDB stage: fetch the trailer candidates and add the fallback links.
+
+        :param job: Job dictionary
+        :return: Name of the next stage
+        """
+        item = job["item"]
+        batch = job.get("batch")
+        if batch is not None:
+            with batch["lock"]:
+                if batch["trailers"] is None:
+                    batch["trailers"] = self.utils.trailer_pull_seasons(job["tmdb_id"], batch["seasons"], item)
+            trailers = batch["trailers"].get(job["season_number"], [])
+        else:
+            trailers = self.utils.trailer_pull(job["tmdb_id"], job["item_type"], item, seasonNumber=job.get("season_number"))
+        existing = job.get("existing", [])
+        # YouTube ids of the trailers already in the folder: they are neither looked up nor downloaded again
+        item["existing_video_ids"] = self.utils.existing_video_ids(item["trailers_dest"], existing)
+        trailers = self.utils.get_new_trailers(trailers, existing, item["existing_video_ids"])
+        job["links"] = self.utils.build_links(trailers, item)
+        return "download"
+
+    def _download(self, job: dict) -> Optional[str]:
+        """
+        Download stage: download the candidates with yt-dlp into the item's cache folder.
+
+        :param job: Job dictionary
+        :return: Name of the next stage, or None when nothing was downloaded
+        """
+        downloader = self.shards if self.shards is not None else self.utils.yt_downloader
+        cache_path = downloader.download_trailers(job["links"], job["item"])
+        if not os.path.exists(cache_path):
+            job["outcome"] = "not_found"
+            return None
+        files = os.listdir(cache_path)
+        if len(files) == 0:
+            job["outcome"] = "not_found"
+            self.utils.discard_staging(cache_path, job["item"])
+            return None
+        job["cache_path"] = cache_path
+        job["files"] = files
+        return "ffmpeg"
+
+    def _post_process(self, job: dict) -> Optional[str]:
+        """
+        Ffmpeg stage: convert the downloaded files into the trailer folder.
+
+        :param job: Job dictionary
+        :return: None, the job is finished
+        """
+        job["file_paths"] = self.utils.post_process(job["cache_path"], job["files"], job["item"])
+        job["outcome"] = "downloaded" if job["file_paths"] else "failed"
+        return None
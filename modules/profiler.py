@@ -0,0 +1,405 @@
+"""
+Module providing per-stage timers and the one-cycle profile capture of `python main.py --profile`.
+
+When a cycle is slow, the stage timers tell where the time goes: the TMDB lookups (`Utils.trailer_pull`), the yt-dlp
+searches (`YoutubeDL.probe`), the duration filter (`YoutubeDL.rank` and the yt-dlp `match_filter`), the downloads
+and `Utils.post_process`. Each stage adds its wall-clock time to the process-wide `profiler`, per library, and the
+pipeline logs a table of the cumulative times with its end-of-cycle summary. The times of concurrent workers add
+up, and a stage nested in another (the `match_filter` of a download) is also counted in its parent.
+
+The timers cost nothing when profiling is disabled: `Profiler.hook()` leaves the decorated methods untouched, and
+only `enable()` swaps in timed wrappers.
+
+`ProfileCapture` additionally records one cycle with cProfile, in every thread, and tracemalloc. It writes the
+cProfile statistics, the tracemalloc snapshot and a text report (stage times, self time per Python package, slowest
+functions and largest allocations) to `APP_PROFILE_PATH`.
+
+Dependencies:
+    - cProfile: Function-level profile of the cycle.
+    - functools: Metadata of the timed wrappers.
+    - inspect: Detection of the coroutine methods.
+    - io: Text of the pstats report.
+    - os: Operating system interface for file operations.
+    - pstats: Statistics of the cycle profile.
+    - sys: Python version, and the profile function of the new threads.
+    - sysconfig: Location of the standard library and of the installed packages.
+    - threading: Profile of every thread started during the capture.
+    - time: Clock of the timers and names of the capture files.
+    - tracemalloc: Memory allocations of the cycle.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.log_context: Library of the item being timed.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - Profiler:
+        Thread-safe registry of the cumulative time of each stage, per library.
+    - ProfileCapture(Translator):
+        cProfile and tracemalloc capture of one cycle, written to disk.
+
+Configuration:
+    - APP_PROFILE (bool): Time the stages and log their table at the end of every cycle. Defaults to False.
+    - APP_PROFILE_PATH (str): Directory receiving the files of `--profile`. Defaults to "data/profile".
+
+Usage:
+    .. code-block:: python
+
+        from modules.profiler import profiler
+
+        class Utils:
+            @profiler.hook("trailer_pull")
+            def trailer_pull(self, tmdb_id, item_type, item, seasonNumber=None):
+                ...
+
+        with profiler.stage("ytdlp_download"):
+            ydl.extract_info(url, download=True)
+"""
+
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+from modules import log_context
+from modules.logger import Logger
+from modules.translator import Translator
+
+# Context manager returned by `Profiler.stage()` while profiling is disabled
+_DISABLED = nullcontext()
+
+
+class _Hook:
+    """
+    Decorated method waiting for its class, which registers it with the profiler.
+    """
+
+    def __init__(self, profiler: "Profiler", stage: str, func: Callable) -> None:
+        self.profiler = profiler
+        self.stage = stage
+        self.func = func
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.profiler._register(owner, name, self.func, self.stage)
+
+
+class _Timer:
+    """
+    Context manager adding the duration of its block to a stage.
+    """
+
+    def __init__(self, profiler: "Profiler", stage: str) -> None:
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.profiler.record(self.stage, time.perf_counter() - self.started)
+
+
+class Profiler:
+    """
+    Thread-safe registry of the cumulative time of each stage, per library.
+
+    The library is read from the log fields of the item being processed (see `modules.log_context`); time spent
+    outside of any item is counted under "-".
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize a disabled profiler.
+        """
+        self.enabled = False
+        self._hooks: List[Tuple[type, str, Callable, str]] = []
+        self._totals: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def hook(self, stage: str) -> Callable[[Callable], Callable]:
+        """
+        Decorator timing a method as a stage once profiling is enabled. Coroutine methods are supported.
+
+        :param stage: Stage name
+        :return: Decorator
+        """
+        return lambda func: _Hook(self, stage, func)
+
+    def stage(self, stage: str):
+        """
+        Return a context manager timing its block as a stage.
+
+        :param stage: Stage name
+        :return: Context manager, a shared no-op one while profiling is disabled
+        """
+        return _Timer(self, stage) if self.enabled else _DISABLED
+
+    def enable(self) -> None:
+        """
+        Start timing the stages: the hooked methods are replaced by timed wrappers.
+        """
+        with self._lock:
+            if self.enabled:
+                return
+            self.enabled = True
+            for owner, name, func, stage in self._hooks:
+                setattr(owner, name, self._wrap(func, stage))
+
+    def disable(self) -> None:
+        """
+        Stop timing the stages and restore the hooked methods.
+        """
+        with self._lock:
+            self.enabled = False
+            for owner, name, func, _ in self._hooks:
+                setattr(owner, name, func)
+
+    def record(self, stage: str, seconds: float) -> None:
+        """
+        Add a duration to a stage of the current item's library.
+
+        :param stage: Stage name
+        :param seconds: Duration in seconds
+        """
+        key = (log_context.current().get("library", "-"), stage)
+        with self._lock:
+            total = self._totals.get(key)
+            if total is None:
+                total = self._totals[key] = [0.0, 0]
+            total[0] += seconds
+            total[1] += 1
+
+    def collect(self) -> dict:
+        """
+        Return the times recorded so far and clear them, e.g. to send them to another process.
+
+        :return: Recorded times, to be passed to `merge()`
+        """
+        with self._lock:
+            collected, self._totals = self._totals, {}
+        return collected
+
+    def merge(self, collected: dict) -> None:
+        """
+        Add the times returned by `collect()` on another profiler to this one.
+
+        :param collected: Recorded times
+        """
+        with self._lock:
+            for key, (seconds, calls) in collected.items():
+                total = self._totals.setdefault(key, [0.0, 0])
+                total[0] += seconds
+                total[1] += calls
+
+    def table(self, library: Optional[str] = None, reset: bool = True) -> str:
+        """
+        Format the cumulative time of each stage as a text table, the slowest stages first.
+
+        :param library: Only include (and reset) this library
+        :param reset: Clear the reported times afterwards, so the next cycle starts from zero
+        :return: Table, empty when nothing was recorded
+        """
+        with self._lock:
+            rows = {key: list(total) for key, total in self._totals.items() if library is None or key[0] == library}
+            if reset:
+                for key in rows:
+                    del self._totals[key]
+        if not rows:
+            return ""
+        lines = [f"{'Library':<10} {'Stage':<22} {'Calls':>8} {'Total (s)':>11} {'Mean (ms)':>11}"]
+        for (name, stage), (seconds, calls) in sorted(rows.items(), key=lambda row: (row[0][0], -row[1][0])):
+            lines.append(f"{name:<10} {stage:<22} {calls:>8} {seconds:>11.2f} {seconds * 1000 / calls:>11.1f}")
+        return "\n".join(lines)
+
+    def report(self, logger: Logger, library: Optional[str] = None, reset: bool = True) -> None:
+        """
+        Log the table of the stage times, if profiling is enabled.
+
+        :param logger: Logger instance for logging messages
+        :param library: Only report (and reset) this library, e.g. at the end of its pass
+        :param reset: Clear the reported times afterwards
+        """
+        if not self.enabled:
+            return
+        table = self.table(library, reset)
+        if table:
+            logger.info("Time spent per stage:\n{table}", table=table)
+
+    def _register(self, owner: type, name: str, func: Callable, stage: str) -> None:
+        """
+        Record a hooked method and put it in its class, timed if profiling is already enabled.
+
+        :param owner: Class defining the method
+        :param name: Method name
+        :param func: Undecorated method
+        :param stage: Stage name
+        """
+        with self._lock:
+            self._hooks.append((owner, name, func, stage))
+            setattr(owner, name, self._wrap(func, stage) if self.enabled else func)
+
+    def _wrap(self, func: Callable, stage: str) -> Callable:
+        """
+        Build the timed wrapper of a method.
+
+        :param func: Method
+        :param stage: Stage name
+        :return: Wrapper recording the duration of every call
+        """
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - started)
+
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        return timed
+
+
+# Profiler shared by the whole process
+profiler = Profiler()
+
+
+class ProfileCapture(Translator):
+    """
+    cProfile and tracemalloc capture of one cycle, written to disk.
+
+    cProfile only sees the thread that enables it, so the capture installs a profile on every thread started while
+    it runs: start it before the pipeline so the worker threads are included. The download processes of
+    `APP_DOWNLOAD_PROCESSES` are not profiled, only their stage times are reported.
+
+    Attributes:
+        logger (Logger): Logger instance for logging messages.
+        config (dict): Configuration dictionary.
+        path (str): Directory receiving the capture files.
+    """
+
+    # Rows of the function and allocation listings of the report
+    TOP = 30
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Initialize the capture.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.path = config.get("APP_PROFILE_PATH") or "data/profile"
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    def start(self) -> None:
+        """
+        Start profiling the calling thread and every thread started from now on, and tracing the allocations.
+        """
+        tracemalloc.start(25)
+        # From Python 3.12 on, one cProfile profile sees every thread of the interpreter
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._thread_started)
+        self._profile_thread()
+
+    def stop(self) -> str:
+        """
+        Stop the capture and write its files.
+
+        :return: Path of the text report
+        """
+        threading.setprofile(None)
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        for profile in profiles:
+            profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        os.makedirs(self.path, exist_ok=True)
+        base = os.path.join(self.path, time.strftime("cycle-%Y%m%d-%H%M%S"))
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(f"{base}.prof")
+        snapshot.dump(f"{base}.tracemalloc")
+
+        text = io.StringIO()
+        text.write(f"Stage times\n\n{profiler.table(reset=False) or '-'}\n\n")
+        text.write("Self time per package (waits included, built-in calls counted under their caller)\n\n")
+        for package, seconds in sorted(self.package_times(stats).items(), key=lambda row: -row[1]):
+            text.write(f"{package:<40} {seconds:>11.2f}\n")
+        text.write("\nSlowest functions (cumulative time, all threads)\n")
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(self.TOP)
+        text.write("Largest allocations still alive at the end of the cycle\n\n")
+        for stat in snapshot.statistics("lineno")[: self.TOP]:
+            text.write(f"{stat}\n")
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        self.logger.info("Profile of the cycle written to « {path} ».", path=f"{base}.txt")
+        return f"{base}.txt"
+
+    @staticmethod
+    def package_times(stats: pstats.Stats) -> Dict[str, float]:
+        """
+        Sum the self time of the profiled functions per Python package.
+
+        The time of a built-in function (a socket read, a lock wait) is given to the package of its caller, so the
+        time yt-dlp spends waiting for the network is counted under yt_dlp.
+
+        :param stats: Statistics of the capture
+        :return: Seconds per package
+        """
+        roots = sorted({sysconfig.get_path("purelib"), sysconfig.get_path("platlib"), sysconfig.get_path("stdlib"), os.getcwd()}, key=len, reverse=True)
+
+        def package(key: tuple) -> str:
+            filename = key[0]
+            if filename == "~":
+                return "(built-in)"
+            for root in roots:
+                if filename.startswith(root + os.sep):
+                    name = os.path.relpath(filename, root).split(os.sep)[0]
+                    return name[:-3] if name.endswith(".py") else name
+            return filename
+
+        times: Dict[str, float] = {}
+        for key, (_, _, self_time, _, callers) in stats.stats.items():
+            if key[0] != "~" or not callers:
+                times[package(key)] = times.get(package(key), 0.0) + self_time
+                continue
+            for caller, (_, _, caller_time, _) in callers.items():
+                times[package(caller)] = times.get(package(caller), 0.0) + caller_time
+        return times
+
+    def _thread_started(self, frame, event, arg) -> None:
+        """
+        Profile function installed in every new thread: replaces itself with a cProfile profile of the thread.
+        """
+        sys.setprofile(None)
+        self._profile_thread()
+
+    def _profile_thread(self) -> None:
+        """
+        Start a cProfile profile of the calling thread.
+        """
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
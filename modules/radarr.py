@@ -7,100 +7,160 @@ Classes:
     None
 
 Functions:
-    - radarr(logger: Logger, config: dict, utils: Utils) -> None:
+    - process_movie(logger, config, utils, pipeline, movie, force=False) -> None:
+        Prepare one movie and submit it to the trailer pipeline.
+
+    - radarr(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline = None, sync: IncrementalSync = None, queue: WorkQueue = None) -> None:
         Main function to find and download trailers for movies using the Radarr API.
 
     - Args:
         logger (Logger): Logger instance for logging messages.
         config (dict): Configuration dictionary containing settings from `config.yaml`.
         utils (Utils): Utility functions instance for handling trailer downloads and processing.
+        pipeline (TrailerPipeline, optional): Shared trailer pipeline. A private one is used when omitted.
+        sync (IncrementalSync, optional): Incremental sync selecting the changed items.
+        queue (WorkQueue, optional): Shared work queue receiving the movies in distributed mode.
 
 """
 
 import os
 from pyarr import RadarrAPI
 from modules.logger import Logger
+from modules import log_context
 from modules.utils import Utils
+from modules.pipeline import TrailerPipeline
+from modules.incremental_sync import IncrementalSync
+from modules.work_queue import WorkQueue
 from modules.exceptions import InsufficientDiskSpaceError
 
 
-def radarr(logger: Logger, config: dict, utils: Utils) -> None:
+def process_movie(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline, movie: dict, force: bool = False) -> None:
     """
-    Main function to find and download trailers for movies using the Radarr API.
+    Prepare one Radarr movie and submit it to the trailer pipeline.
 
     :param logger: Logger instance for logging messages
-    :param config: Configuration dictionary containing Radarr API host and other settings
+    :param config: Configuration dictionary
     :param utils: Utility functions instance for various helper functions
+    :param pipeline: Trailer pipeline the movie is submitted to
+    :param movie: Radarr movie resource
+    :param force: Ignore the state store and check the movie even if it was checked recently
     """
-    host = config.get("RADARR_HOST", None)
-    api = config.get("RADARR_API", None)
+    # Every record about this movie carries its ids and the same correlation id
+    with log_context.bind(library="radarr", arr_id=movie.get("id"), tmdb_id=movie.get("tmdbId"), correlation_id=log_context.new_correlation_id()):
+        path = movie.get("path", None)
+        title = utils.get_title(movie)
+        # defined title to use for all process
+        movie["use_title"] = title
+        year = movie.get("year", None)
+        movie["tmp"] = f"{title} ({year})"
 
-    if host is None or api is None:
-        logger.warning("{app} not configured.", app="Radarr")
-        return
+        if path is None or title is None:
+            # radarr item dont have path or title
+            logger.error("Warning « {warning} ».", warning=f"Path or Title not exist in: {movie}")
+            return
 
-    try:
-        # Initialize Radarr API
-        radarr_api = RadarrAPI(host, api)
+        job = {"library": "radarr", "item": movie, "tmdb_id": movie.get("tmdbId"), "item_type": "movie"}
 
-        print("--------------------------------")
-        logger.info("Movie trailers finder started.")
+        # Skip movies with a recent outcome before touching the file system
+        if not force and pipeline.should_skip(job):
+            return
 
-        # Iterate through all movies in Radarr
-        for movie in radarr_api.get_movie():
-            assert isinstance(movie, dict)
+        movie["trailers_dest"] = os.path.join(movie["path"], config["APP_DEFAULT_DIR"])
+        # Radarr root folder, the free space is measured once for all its movies
+        root = os.path.dirname(os.path.normpath(movie["path"]))
 
-            path = movie.get("path", None)
-            title = utils.get_title(movie)
-            # defined title to use for all process
-            movie["use_title"] = title
-            year = movie.get("year", None)
-            movie["tmp"] = f"{title} ({year})"
+        custom_path = config.get("APP_CUSTOM_PATH", None)
+        custom_name = config.get("APP_CUSTOM_NAME_MOVIE", None)
 
-            if path is None or title is None:
-                # radarr item dont have path or title
-                logger.error("Warning « {warning} ».", warning=f"Path or Title not exist in: {movie}")
-                continue
+        if custom_path and custom_name:
+            movie["trailers_dest"] = os.path.join(custom_path, custom_name, title)
+            root = custom_path
 
-            movie["trailers_dest"] = os.path.join(movie["path"], config["APP_DEFAULT_DIR"])
+        # Remove the half-finished downloads of an interrupted run
+        utils.clean_partials(movie)
 
-            custom_path = config.get("APP_CUSTOM_PATH", None)
-            custom_name = config.get("APP_CUSTOM_NAME_MOVIE", None)
+        # The trailer folder is only created when a trailer is written
+        try:
+            # Skip if not enough space
+            utils.check_space(movie["trailers_dest"], root)
+        except InsufficientDiskSpaceError as err:
+            logger.error("An error has occurred « {error} ».", error=err)
+            return
 
-            if custom_path and custom_name:
-                movie["trailers_dest"] = os.path.join(custom_path, custom_name, title)
+        # outputs list dir
+        trailers_in_outputs_folder = utils.scan.listdir(movie["trailers_dest"])
 
-            # create ooutputs folder if not exist
-            os.makedirs(movie["trailers_dest"], exist_ok=True)
+        # count trailers in ouputs
+        count = len(trailers_in_outputs_folder)
 
-            try:
-                # Skip if not enough space
-                utils.check_space(movie["trailers_dest"])
-            except InsufficientDiskSpaceError as err:
-                logger.error("An error has occurred « {error} ».", error=err)
-                continue
+        # Skip if trailer already exists
+        if config["APP_ONLY_ONE_TRAILER"] and count >= 1:
+            logger.success("« {title} » already has « {count} » trailers.", title=title, year=year, count=count)
+            pipeline.skip_existing(job, trailers_in_outputs_folder)
+            return
 
-            print("--------------------------------")
+        logger.info("Search trailers for « {title} ».", title=title, year=year)
 
-            # outputs list dir
-            trailers_in_outputs_folder = os.listdir(movie["trailers_dest"])
+        # Hand the movie over to the pipeline: TMDB lookup, download and ffmpeg run in their own pools
+        job["existing"] = trailers_in_outputs_folder
+        pipeline.submit(job)
 
-            # count trailers in ouputs
-            count = len(trailers_in_outputs_folder)
 
-            # Skip if trailer already exists
-            if config["APP_ONLY_ONE_TRAILER"] and count >= 1:
-                logger.success("« {title} » already has « {count} » trailers.", title=title, year=year, count=count)
-                continue
+def radarr(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline = None, sync: IncrementalSync = None, queue: WorkQueue = None) -> None:
+    """
+    Main function to find and download trailers for movies using the Radarr API.
 
-            logger.info("Search trailers for « {title} ».", title=title, year=year)
+    Movies are submitted to the trailer pipeline, which looks them up, downloads and post-processes them
+    concurrently; the function returns once every submitted movie has been handled.
 
-            # Fetch trailers using TMDB ID
-            trailers = utils.trailer_pull(movie["tmdbId"], "movie", movie)
-            list_of_trailers = utils.get_new_trailers(trailers, trailers_in_outputs_folder)
-            utils.download_trailers(list_of_trailers, movie)
+    :param logger: Logger instance for logging messages
+    :param config: Configuration dictionary containing Radarr API host and other settings
+    :param utils: Utility functions instance for various helper functions
+    :param pipeline: Shared trailer pipeline, a private one is started when omitted
+    :param sync: Incremental sync, when given only the items changed since the last successful pass are processed
+    :param queue: Shared work queue, when given the movies are queued for the nodes instead of processed here
+    """
+    host = config.get("RADARR_HOST", None)
+    api = config.get("RADARR_API", None)
+
+    if host is None or api is None:
+        logger.warning("{app} not configured.", app="Radarr")
+        return
+
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = TrailerPipeline(logger, config, utils)
+        pipeline.start()
 
+    try:
+        # Initialize Radarr API
+        radarr_api = RadarrAPI(host, api)
+
+        logger.info("Movie trailers finder started.")
+
+        # Iterate through all movies in Radarr
+        movies = radarr_api.get_movie()
+        if sync is not None:
+            # In distributed mode the watermark advances once the items are queued: the items the nodes have not
+            # finished, or failed, are selected again until they are done
+            retry = queue.unfinished("radarr") if queue is not None else None
+            movies = sync.select("radarr", radarr_api, movies, id_field="movieId", retry=retry)
+
+        for movie in movies:
+            assert isinstance(movie, dict)
+            if queue is None:
+                process_movie(logger, config, utils, pipeline, movie)
+
+        if queue is not None:
+            # Distributed mode: the nodes sharing the queue claim and process the movies
+            queue.enqueue("radarr", movies)
+        else:
+            pipeline.wait("radarr")
+        if sync is not None:
+            sync.commit("radarr")
         logger.info("Movie trailers finder ended.")
-        print("--------------------------------")
     except AssertionError as err:
         logger.error("An error has occurred « {error} ».", error={"error": err, "host": host})
+    finally:
+        if own_pipeline:
+            pipeline.close()
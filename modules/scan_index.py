@@ -0,0 +1,147 @@
+"""
+Module providing an in-memory index of the trailer folders, so a library pass costs few file system calls.
+
+A pass used to call `os.makedirs`, `shutil.disk_usage` and `os.listdir` on the trailer folder of every item, which
+adds up to tens of thousands of metadata calls against a network share. The index scans every directory at most
+once per cycle with `os.scandir`: the item folder is scanned first, and its trailer folder is only listed when the
+folder actually exists. Free space is cached per library root for `APP_SPACE_CACHE_SECONDS`, and directories are
+only created when a trailer is written.
+
+Dependencies:
+    - os: Operating system interface for file operations.
+    - shutil: Disk usage of the library roots.
+    - threading: Protects the index shared by the producers and the pipeline workers.
+    - time: Expiry of the cached free space.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - ScanIndex(Translator):
+        Cached directory listings and free space of the trailer folders.
+
+Configuration:
+    - APP_SPACE_CACHE_SECONDS (int): Seconds during which the free space of a library root is reused. Defaults to 60.
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+from modules.logger import Logger
+from modules.translator import Translator
+
+
+class ScanIndex(Translator):
+    """
+    Cached directory listings and free space of the trailer folders.
+
+    Listings are kept until `reset()`, which `main()` calls at the start of every cycle; files written by the
+    pipeline are added with `add()` so the index stays accurate in between.
+    """
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Initialize an empty index.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.space_ttl = config.get("APP_SPACE_CACHE_SECONDS", 60)
+        self._entries: Dict[str, Optional[set]] = {}
+        self._space: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    def reset(self) -> None:
+        """
+        Forget every listing, so the next cycle sees the changes made outside the application.
+        """
+        with self._lock:
+            self._entries = {}
+
+    def _scan(self, path: str) -> Optional[set]:
+        """
+        Return the names in a directory, scanning it on first use.
+
+        :param path: Normalised directory path
+        :return: Set of names, or None if the directory does not exist
+        """
+        with self._lock:
+            if path in self._entries:
+                return self._entries[path]
+        try:
+            with os.scandir(path) as entries:
+                names = {entry.name for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            names = None
+        with self._lock:
+            return self._entries.setdefault(path, names)
+
+    def exists(self, path: str) -> bool:
+        """
+        Check whether a path exists, using the listing of its parent.
+
+        :param path: File or directory path
+        :return: True if the path exists
+        """
+        path = os.path.normpath(path)
+        names = self._scan(os.path.dirname(path))
+        return names is not None and os.path.basename(path) in names
+
+    def listdir(self, path: str) -> List[str]:
+        """
+        List the visible entries of a directory, like `os.listdir` without hidden names.
+
+        The parent directory is scanned first, so a missing trailer folder costs no call of its own.
+
+        :param path: Directory path
+        :return: Sorted names, empty when the directory does not exist
+        """
+        path = os.path.normpath(path)
+        if not self.exists(path):
+            return []
+        return sorted(name for name in self._scan(path) or () if not name.startswith("."))
+
+    def add(self, path: str) -> None:
+        """
+        Record a file written by the application, and the directories created for it.
+
+        :param path: Path of the new file
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            while True:
+                parent, name = os.path.split(path)
+                names = self._entries.get(parent)
+                if names is not None:
+                    names.add(name)
+                elif parent in self._entries:
+                    # The parent was missing when it was scanned, it exists now
+                    self._entries[parent] = {name}
+                if names is not None or parent == path:
+                    return
+                path = parent
+
+    def disk_free(self, path: str, root: Optional[str] = None) -> int:
+        """
+        Return the free space of the file system holding `path`.
+
+        :param path: Path on the file system, the nearest existing parent is used if it does not exist
+        :param root: Library root sharing the file system, used as cache key so items of a root share one call
+        :return: Free space in bytes
+        """
+        key = os.path.normpath(root or path)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._space.get(key)
+            if cached is not None and now - cached[0] < self.space_ttl:
+                return cached[1]
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        free = shutil.disk_usage(path).free
+        with self._lock:
+            self._space[key] = (now, free)
+        return free
@@ -0,0 +1,381 @@
+"""
+Module providing the scheduler running the library passes and maintenance jobs.
+
+Each job has its own schedule, either an interval in hours or a cron expression, so cheap incremental passes can
+run every hour while a full reconciliation runs once a week. Interval jobs keep their phase: the next run is
+computed from the previous scheduled time, not from the end of the run, so a long pass does not make the cycle
+drift. A random jitter of up to `APP_SCHEDULE_JITTER` seconds is added to every run to spread the load on the
+Radarr, Sonarr and TMDB APIs.
+
+Jobs never overlap themselves: a run falling due while the previous one is still going is skipped. Jobs sharing
+a lock (e.g. the Radarr pass and the full reconciliation, which both process the Radarr library) wait for each
+other. `SIGUSR1` runs the library jobs immediately, and the next run of every job is logged and exposed on the
+metrics endpoint.
+
+Dependencies:
+    - random: Jitter of the runs.
+    - signal: "Run now" trigger.
+    - threading: Job threads, locks and the scheduler wake-up.
+    - time: Clock of the schedule.
+    - datetime: Evaluation of the cron expressions and display of the next runs.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.metrics.metrics: Registry receiving the next run of every job.
+    - modules.exceptions.InvalidScheduleError: Raised for an invalid schedule in the configuration.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - CronExpression:
+        Five-field cron expression ("minute hour day month weekday").
+    - Scheduler(Translator):
+        Runs the registered jobs on their schedule.
+
+Configuration:
+    - APP_SCHEDULE (dict): Schedule of each job, a number of hours or a cron expression. An empty value disables the
+      job. Defaults to `APP_SLEEP_TIME` hours for the Radarr and Sonarr passes.
+    - APP_SCHEDULE_JITTER (int): Maximum random delay added to every run, in seconds. Defaults to 0.
+"""
+
+import random
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Union
+from modules.logger import Logger
+from modules.metrics import metrics
+from modules.exceptions import InvalidScheduleError
+from modules.translator import Translator
+
+
+class CronExpression:
+    """
+    Five-field cron expression: minute, hour, day of month, month and day of week (0 or 7 is Sunday).
+
+    Fields accept `*`, values, ranges (`1-5`), steps (`*/15`, `0-30/10`) and lists (`1,15`). As in cron, when both
+    the day of month and the day of week are restricted, a day matching either of them matches.
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str) -> None:
+        """
+        Parse a cron expression.
+
+        :param expression: Cron expression
+        :raises ValueError: If the expression is not valid
+        """
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(expression)
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (self._parse(field, *bounds) for field, bounds in zip(fields, self.RANGES))
+        # Sunday is both 0 and 7
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        """
+        Parse one field into the set of values it matches.
+
+        :param field: Field of the expression
+        :param low: Lowest allowed value
+        :param high: Highest allowed value
+        :return: Matching values
+        :raises ValueError: If the field is not valid
+        """
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/", 1)
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = end = int(part)
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(field)
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        """
+        Check the day of month and day of week fields.
+
+        :param day: Date to check
+        :return: True if the day matches
+        """
+        in_days = day.day in self.days
+        # datetime counts from Monday = 0, cron from Sunday = 0
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, after: datetime) -> datetime:
+        """
+        Return the first matching minute strictly after `after`.
+
+        :param after: Reference time
+        :return: Next matching time
+        :raises ValueError: If no time matches in the next five years (e.g. February 30)
+        """
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(self.expression)
+
+
+class Scheduler(Translator):
+    """
+    Runs the registered jobs on their schedule, each in its own thread.
+
+    Usage:
+        .. code-block:: python
+
+            scheduler = Scheduler(logger, config, fatal=(FfmpegCommandMissing,))
+            scheduler.add("radarr", run_radarr, 6, locks=("radarr",))
+            scheduler.add("cache_prune", prune, "30 4 * * *")
+            scheduler.install_signals()
+            scheduler.run_forever()
+    """
+
+    def __init__(self, logger: Logger, config: dict, fatal: tuple = ()) -> None:
+        """
+        Initialize a scheduler without jobs.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        :param fatal: Exception types that stop the scheduler; other errors of a job are logged and the job keeps
+            its schedule
+        """
+        self.logger = logger
+        self.config = config
+        self.jitter = max(0, config.get("APP_SCHEDULE_JITTER", 0) or 0)
+        self.date_format = config.get("APP_LOG_DATE_FORMAT") or "%Y-%m-%d %H:%M:%S"
+        self.fatal = fatal
+        self._jobs: Dict[str, dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._cond = threading.Condition()
+        self._error: Optional[Exception] = None
+        self._stopped = False
+        metrics.gauge("trailer_finder_next_run_timestamp_seconds", lambda: [({"job": name}, job["next"]) for name, job in list(self._jobs.items())])
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    def add(self, name: str, func: Callable[[], None], schedule: Union[int, float, str], locks: Iterable[str] = (), run_now: Optional[bool] = None) -> None:
+        """
+        Register a job.
+
+        :param name: Job name, as used in `APP_SCHEDULE`
+        :param func: Function running the job
+        :param schedule: Interval in hours, or cron expression
+        :param locks: Names of the locks held while the job runs; jobs sharing a lock wait for each other
+        :param run_now: Run the job at start-up. Defaults to True for intervals and False for cron expressions
+        :raises InvalidScheduleError: If the schedule is not valid
+        """
+        now = time.time()
+        try:
+            if isinstance(schedule, (int, float)) and not isinstance(schedule, bool) and schedule > 0:
+                cron, interval = None, float(schedule) * 3600
+            elif isinstance(schedule, str):
+                cron, interval = CronExpression(schedule), None
+            else:
+                raise ValueError(schedule)
+        except ValueError:
+            raise InvalidScheduleError(self.translate("The schedule « {schedule} » of « {job} » is not valid.", schedule=schedule, job=name))
+
+        if run_now is None:
+            run_now = cron is None
+        job = {"func": func, "cron": cron, "interval": interval, "locks": sorted(set(locks)), "running": False}
+        # `base` is the run time without jitter, intervals are counted from it
+        if run_now:
+            job["base"] = job["next"] = now
+        else:
+            job["base"] = cron.next_after(datetime.fromtimestamp(now)).timestamp() if cron is not None else now + interval
+            job["next"] = job["base"] + random.uniform(0, self.jitter)
+        for lock in job["locks"]:
+            self._locks.setdefault(lock, threading.Lock())
+        with self._cond:
+            self._jobs[name] = job
+            self._cond.notify()
+
+    def jobs(self) -> List[str]:
+        """
+        Return the names of the registered jobs.
+
+        :return: Job names
+        """
+        return list(self._jobs)
+
+    def next_runs(self) -> Dict[str, float]:
+        """
+        Return the time of the next run of every job.
+
+        :return: Dictionary of job name to timestamp
+        """
+        with self._cond:
+            return {name: job["next"] for name, job in self._jobs.items()}
+
+    def run_now(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Run jobs immediately, without changing their schedule.
+
+        :param names: Names of the jobs, all jobs when omitted
+        """
+        now = time.time()
+        with self._cond:
+            for name in names if names is not None else list(self._jobs):
+                if name in self._jobs:
+                    self._jobs[name]["next"] = now
+                    self._jobs[name]["manual"] = True
+            self._cond.notify()
+
+    def install_signals(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Run jobs immediately when the process receives `SIGUSR1`. Must be called from the main thread.
+
+        :param names: Names of the jobs to run, all jobs when omitted
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        names = list(names) if names is not None else None
+
+        def handler(signum, frame):
+            # Signal handlers run between two instructions of the main thread, which may hold the scheduler lock
+            threading.Thread(target=self._triggered, args=(names,), name="scheduler-signal", daemon=True).start()
+
+        signal.signal(signal.SIGUSR1, handler)
+
+    def stop(self) -> None:
+        """
+        Stop `run_forever()`. Running jobs finish in the background.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def fail(self, error: Exception) -> None:
+        """
+        Stop `run_forever()` with an error raised outside of the jobs, e.g. by the work queue worker.
+
+        :param error: Error re-raised by `run_forever()`
+        """
+        with self._cond:
+            self._error = error
+            self._cond.notify()
+
+    def run_forever(self) -> None:
+        """
+        Start the jobs when they are due, until `stop()` is called or a job raises one of the `fatal` errors.
+
+        :raises Exception: The fatal error raised by a job
+        """
+        self.report()
+        with self._cond:
+            while not self._stopped and self._error is None:
+                now = time.time()
+                for name, job in self._jobs.items():
+                    if job["next"] <= now:
+                        self._start(name, job, now)
+                wake = min((job["next"] for job in self._jobs.values()), default=now + 3600)
+                self._cond.wait(max(0.0, wake - time.time()))
+            if self._error is not None:
+                raise self._error
+
+    def report(self) -> None:
+        """
+        Log the next run of every job.
+        """
+        for name, at in sorted(self.next_runs().items(), key=lambda entry: entry[1]):
+            self.logger.info("Next « {job} » run at « {time} ».", job=name, time=datetime.fromtimestamp(at).strftime(self.date_format))
+
+    def _triggered(self, names: Optional[List[str]]) -> None:
+        """
+        Handle a "run now" signal.
+
+        :param names: Names of the jobs to run, all jobs when None
+        """
+        self.logger.info("Run requested for « {jobs} ».", jobs=", ".join(names if names is not None else self.jobs()))
+        self.run_now(names)
+
+    def _following(self, job: dict, after: float) -> float:
+        """
+        Compute the scheduled time of the run following `after`, without jitter.
+
+        :param job: Job dictionary
+        :param after: Timestamp after which the run must happen
+        :return: Timestamp of the next run
+        """
+        if job["cron"] is not None:
+            return job["cron"].next_after(datetime.fromtimestamp(after)).timestamp()
+        base = job["base"] + job["interval"]
+        if base <= after:
+            # Keep the phase: skip the occurrences missed while the job was running or the machine was asleep
+            base += ((after - base) // job["interval"] + 1) * job["interval"]
+        return base
+
+    def _start(self, name: str, job: dict, now: float) -> None:
+        """
+        Start a due job and schedule its next run. Must be called with `_cond` held.
+
+        :param name: Job name
+        :param job: Job dictionary
+        :param now: Current timestamp
+        """
+        manual = job.pop("manual", False)
+        if not manual:
+            job["base"] = self._following(job, now)
+        job["next"] = job["base"] + random.uniform(0, self.jitter)
+
+        if job["running"]:
+            self.logger.warning("« {job} » is still running, this run is skipped.", job=name)
+            return
+        job["running"] = True
+        threading.Thread(target=self._run, args=(name, job), name=f"job-{name}", daemon=True).start()
+
+    def _run(self, name: str, job: dict) -> None:
+        """
+        Run a job in its thread, holding its locks.
+
+        :param name: Job name
+        :param job: Job dictionary
+        """
+        locks = [self._locks[lock] for lock in job["locks"]]
+        # Locks are always taken in the same order, so two jobs can never wait for each other
+        for lock in locks:
+            lock.acquire()
+        started = time.monotonic()
+        try:
+            self.logger.info("Starting « {job} ».", job=name)
+            job["func"]()
+            self.logger.info("« {job} » finished in « {duration} » seconds.", job=name, duration=int(time.monotonic() - started))
+        except self.fatal as err:
+            with self._cond:
+                self._error = err
+                self._cond.notify()
+        except Exception as err:
+            self.logger.error("An error has occurred « {error} ».", error={"error": err, "job": name})
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+            with self._cond:
+                job["running"] = False
+            self.logger.info(
+                "Next « {job} » run at « {time} ».",
+                job=name,
+                time=datetime.fromtimestamp(job["next"]).strftime(self.date_format),
+            )
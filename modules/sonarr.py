@@ -10,16 +10,24 @@ Dependencies:
     - pyarr: Library for interfacing with Sonarr API.
     - modules.utils: Utility functions for handling trailers, downloading from YouTube, and post-processing with FFMPEG.
     - modules.logger.Logger: Logger instance for logging messages.
+    - modules.pipeline.TrailerPipeline: Staged pipeline running the lookups, downloads and ffmpeg jobs.
+    - modules.work_queue.WorkQueue: Shared work queue of the distributed mode.
     - modules.exceptions.InsufficientDiskSpaceError: Exception raised when there is insufficient disk space for operations.
 
 Functions:
-    - sonarr(logger, config, utils):
+    - process_show(logger, config, utils, pipeline, show, force=False):
+        Prepare the seasons of one series and submit them to the trailer pipeline.
+
+    - sonarr(logger, config, utils, pipeline=None, sync=None, queue=None):
         Main function to find and download trailers for TV series using Sonarr API.
 
     - Args:
         logger (Logger): Logger instance for logging messages.
         config (dict): Configuration dictionary containing settings from `config.yaml`.
         utils (Utils): Utility functions instance for handling trailer downloads and processing.
+        pipeline (TrailerPipeline, optional): Shared trailer pipeline. A private one is used when omitted.
+        sync (IncrementalSync, optional): Incremental sync selecting the changed items.
+        queue (WorkQueue, optional): Shared work queue receiving the series in distributed mode.
 
 Usage:
     This module is intended to be executed as a standalone script to find and download trailers for TV series
@@ -29,14 +37,124 @@ Usage:
 
 import os
 from pyarr import SonarrAPI
+from modules import log_context
 from modules.utils import Utils
 from modules.logger import Logger
-from modules.exceptions import InsufficientDiskSpaceError
+from modules.pipeline import TrailerPipeline
+from modules.incremental_sync import IncrementalSync
+from modules.work_queue import WorkQueue
+from modules.exceptions import InsufficientDiskSpaceError, FfmpegCommandMissing
+
+
+def process_show(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline, show: dict, force: bool = False) -> None:
+    """
+    Prepare the seasons of one Sonarr series and submit them to the trailer pipeline.
+
+    :param logger: Logger instance for logging messages
+    :param config: Configuration dictionary
+    :param utils: Utility functions instance for various helper functions
+    :param pipeline: Trailer pipeline the seasons are submitted to
+    :param show: Sonarr series resource
+    :param force: Ignore the state store and check every season even if it was checked recently
+    """
+    # Every record about this series carries its ids and the same correlation id
+    with log_context.bind(library="sonarr", arr_id=show.get("id"), tmdb_id=show.get("tmdbId"), correlation_id=log_context.new_correlation_id()):
+        path = show.get("path", None)
+        title = utils.get_title(show)
+        # defined title to use for all process
+        show["use_title"] = title
+        year = show.get("year", None)
+        # for tmp folder name
+        show["tmp"] = f"{title} ({year})"
+
+        if path is None or title is None:
+            # radarr item dont have path or title
+            logger.warning("Warning « {warning} ».", warning=show)
+            return
+
+        # Each season is an independent job, so it gets its own copy of the show metadata
+        title_format = config.get("YT_DLP_SEARCH_KEYWORD_SEASON", "{show} Season {season_number}")
+        jobs = []
+        for season in show.get("seasons", []):
+            season_item = dict(show)
+            season_item["use_title"] = title_format.format(show=title, season_number=season["seasonNumber"])
+            season_item["tmp"] = f"{season_item['use_title']} ({year})"
+            job = {
+                "library": "sonarr",
+                "item": season_item,
+                "tmdb_id": show.get("tmdbId"),
+                "item_type": "tv",
+                "season_number": season["seasonNumber"],
+            }
+            # Skip seasons with a recent outcome before touching the file system
+            if force or not pipeline.should_skip(job):
+                jobs.append(job)
+
+        if len(jobs) == 0:
+            return
+
+        show["trailers_dest"] = os.path.join(show["path"], config["APP_DEFAULT_DIR"])
+        # Sonarr root folder, the free space is measured once for all its series
+        root = os.path.dirname(os.path.normpath(show["path"]))
+
+        custom_path = config.get("APP_CUSTOM_PATH", None)
+        custom_name = config.get("APP_CUSTOM_NAME_SHOW", None)
+        # create folder in custom path using name cache folder
+        if custom_path and custom_name:
+            show["trailers_dest"] = os.path.join(custom_path, custom_name, title)
+            root = custom_path
+
+        # The trailer folders are only created when a trailer is written
+        try:
+            # Skip if not enough space
+            utils.check_space(show["trailers_dest"], root)
+        except InsufficientDiskSpaceError as err:
+            logger.error("An error has occurred « {error} ».", error=err)
+            return
+
+        ready = []
+        for job in jobs:
+            season_item = job["item"]
+            season_item["trailers_dest"] = os.path.join(show["trailers_dest"], season_item["use_title"])
+            # Remove the half-finished downloads of an interrupted run
+            utils.clean_partials(season_item)
+
+            try:
+                # Skip if not enough space
+                utils.check_space(season_item["trailers_dest"], root)
+            except InsufficientDiskSpaceError as err:
+                logger.error("An error has occurred: {error}.", error=err)
+                continue
+
+            trailers_in_outputs_folder = utils.scan.listdir(season_item["trailers_dest"])
+            count = len(trailers_in_outputs_folder)
+
+            if config["APP_ONLY_ONE_TRAILER"] and count >= 1:
+                logger.success("« {title} » already has « {count} » trailers.", title=season_item["use_title"], count=count)
+                pipeline.skip_existing(job, trailers_in_outputs_folder)
+                continue
+
+            logger.info("Search trailers for « {title} ».", title=season_item["use_title"])
+            job["existing"] = trailers_in_outputs_folder
+            ready.append(job)
+
+        # The seasons of a show are looked up together, one TMDB request for up to 20 seasons
+        pipeline.submit_batch(ready)
 
 
-def sonarr(logger: Logger, config: dict, utils: Utils):
+def sonarr(logger: Logger, config: dict, utils: Utils, pipeline: TrailerPipeline = None, sync: IncrementalSync = None, queue: WorkQueue = None):
     """
     Main function to find and download trailers for TV series using Sonarr API.
+
+    Every season is submitted to the trailer pipeline as its own job; the function returns once every
+    submitted season has been handled.
+
+    :param logger: Logger instance for logging messages
+    :param config: Configuration dictionary containing Sonarr API host and other settings
+    :param utils: Utility functions instance for various helper functions
+    :param pipeline: Shared trailer pipeline, a private one is started when omitted
+    :param sync: Incremental sync, when given only the items changed since the last successful pass are processed
+    :param queue: Shared work queue, when given the series are queued for the nodes instead of processed here
     """
 
     host = config.get("SONARR_HOST", None)
@@ -46,80 +164,42 @@ def sonarr(logger: Logger, config: dict, utils: Utils):
         logger.warning("{app} not configured.", app="Sonarr")
         return
 
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = TrailerPipeline(logger, config, utils)
+        pipeline.start()
+
     try:
         # Initialize Sonarr API
         sonarr_api = SonarrAPI(host, api)
-        print("--------------------------------")
         logger.info("TV Show trailers finders started.")
 
         # Iterate through all TV series in Sonarr
-        for show in sonarr_api.get_series():
+        shows = sonarr_api.get_series()
+        if sync is not None:
+            # In distributed mode the watermark advances once the items are queued: the items the nodes have not
+            # finished, or failed, are selected again until they are done
+            retry = queue.unfinished("sonarr") if queue is not None else None
+            shows = sync.select("sonarr", sonarr_api, shows, id_field="seriesId", retry=retry)
+
+        for show in shows:
             assert isinstance(show, dict)
-
-            path = show.get("path", None)
-            title = utils.get_title(show)
-            # defined title to use for all process
-            show["use_title"] = title
-            year = show.get("year", None)
-            # for tmp folder name
-            show["tmp"] = f"{title} ({year})"
-
-            if path is None or title is None:
-                # radarr item dont have path or title
-                logger.warning("Warning « {warning} ».", warning=show)
-                continue
-
-            show["trailers_dest"] = os.path.join(show["path"], config["APP_DEFAULT_DIR"])
-
-            custom_path = config.get("APP_CUSTOM_PATH", None)
-            custom_name = config.get("APP_CUSTOM_NAME_SHOW", None)
-            # create folder in custom path using name cache folder
-            if custom_path and custom_name:
-                show["trailers_dest"] = os.path.join(custom_path, custom_name, title)
-
-            # create outputs folder if not exist
-            os.makedirs(show["trailers_dest"], exist_ok=True)
-
-            try:
-                # Skip if not enough space
-                utils.check_space(show["trailers_dest"])
-            except InsufficientDiskSpaceError as err:
-                logger.error("An error has occurred « {error} ».", error=err)
-                continue
-
-            print("--------------------------------")
-
-            seasons = show.get("seasons", [])
-            if len(seasons) > 0:
-                for season in seasons:
-                    title_format = config.get("YT_DLP_SEARCH_KEYWORD_SEASON", "{show} Season {season_number}")
-                    show["use_title"] = title_format.format(show=title, season_number=season["seasonNumber"])
-                    show["trailers_dest"] = os.path.join(show["trailers_dest"], show["use_title"])
-
-
-                    os.makedirs(show["outputs_folder"], exist_ok=True)
-                    try:
-                        # Skip if not enough space
-                        utils.check_space(show["outputs_folder"])
-                    except InsufficientDiskSpaceError as err:
-                        logger.error("An error has occurred: {error}.", error=err)
-                        continue
-                     
-                    trailers_in_outputs_folder = os.listdir(show["outputs_folder"])
-                    count = len(trailers_in_outputs_folder)
-
-                    if config["APP_ONLY_ONE_TRAILER"] and count >= 1:
-                        logger.success("« {title} » already has « {count} » trailers.", title=show["use_title"], count=count)
-                        continue
-
-                    logger.info("Search trailers for « {title} ».", title=show["use_title"])
-                    season_trailers = utils.trailer_pull(show["tmdbId"], "tv", show, seasonNumber=season["seasonNumber"])
-                    list_of_trailers = utils.get_new_trailers(season_trailers, trailers_in_outputs_folder)
-                    utils.download_trailers(list_of_trailers, show)
-                    print("--------------------------------")
-
+            if queue is None:
+                process_show(logger, config, utils, pipeline, show)
+
+        if queue is not None:
+            # Distributed mode: the nodes sharing the queue claim and process the series
+            queue.enqueue("sonarr", shows)
+        else:
+            pipeline.wait("sonarr")
+        if sync is not None:
+            sync.commit("sonarr")
         logger.info("TV Show trailers finder ended.")
-        print("--------------------------------")
+    except FfmpegCommandMissing:
+        raise
     except Exception as err:
         debug = {"error": err, "host": host}
         logger.error("An error has occurred « {error} ».", error=debug)
+    finally:
+        if own_pipeline:
+            pipeline.close()
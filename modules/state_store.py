@@ -0,0 +1,231 @@
+"""
+Module providing a persistent, on-disk record of the items already processed.
+
+Every library item handled by the trailer pipeline is recorded in a small SQLite database, keyed by library,
+Radarr/Sonarr id, TMDB id and season number, together with the time of the check, its outcome, the video keys
+that were downloaded and the trailer files that were written. Later cycles consult the store before touching the
+file system or TMDB: items with a recent trailer are skipped until `APP_STATE_RECHECK_DAYS` have passed, and items
+that keep ending without a trailer are retried with an exponential back-off.
+
+The store also keeps the incremental sync watermarks of each library (see `modules.incremental_sync`).
+
+Dependencies:
+    - os: Operating system interface for file operations.
+    - json: Serialisation of the video key and file path lists.
+    - sqlite3: Embedded database used for the store.
+    - threading: Serialises access to the shared connection.
+    - time: Timestamps of the checks.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - StateStore(Translator):
+        Persistent record of processed items with skip and back-off rules.
+
+Configuration:
+    - APP_STATE_PATH (str): Path of the SQLite database. The store is disabled when empty.
+    - APP_STATE_RECHECK_DAYS (int): Days before an item with a trailer is checked again. Defaults to 30.
+    - APP_STATE_RETRY_HOURS (int): First back-off delay for an item without a trailer, in hours. Defaults to 6.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Set
+from modules.logger import Logger
+from modules.translator import Translator
+
+
+class StateStore(Translator):
+    """
+    Persistent record of the items processed by the trailer pipeline.
+
+    Outcomes:
+        - downloaded: A trailer was written.
+        - no_candidates: No candidate produced a file.
+        - too_long: Every candidate was rejected by `YT_DLP_MAX_LENGTH`.
+        - failed: The job raised an error.
+    """
+
+    OUTCOMES = ("downloaded", "no_candidates", "too_long", "failed")
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Open (and create if needed) the state database.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.path = config["APP_STATE_PATH"]
+        self.recheck_seconds = config.get("APP_STATE_RECHECK_DAYS", 30) * 86400
+        self.retry_seconds = config.get("APP_STATE_RETRY_HOURS", 6) * 3600
+        self._lock = threading.Lock()
+        super().__init__(config.get("APP_TRANSLATE"))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                library TEXT NOT NULL,
+                arr_id INTEGER NOT NULL,
+                tmdb_id INTEGER NOT NULL,
+                season INTEGER NOT NULL,
+                last_check REAL NOT NULL,
+                outcome TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                video_keys TEXT,
+                file_paths TEXT,
+                PRIMARY KEY (library, arr_id, tmdb_id, season)
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync (
+                library TEXT PRIMARY KEY,
+                watermark REAL NOT NULL,
+                last_full REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(job: dict) -> tuple:
+        """
+        Build the store key of a pipeline job.
+
+        :param job: Pipeline job dictionary
+        :return: Tuple (library, arr id, TMDB id, season number), the season is -1 for movies
+        """
+        season = job.get("season_number")
+        return (job["library"], job["item"].get("id", 0), job.get("tmdb_id") or 0, -1 if season is None else season)
+
+    def get(self, job: dict) -> Optional[dict]:
+        """
+        Return the stored state of a job, if any.
+
+        :param job: Pipeline job dictionary
+        :return: Dictionary with last_check, outcome, attempts, video_keys and file_paths, or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_check, outcome, attempts, video_keys, file_paths FROM items WHERE library=? AND arr_id=? AND tmdb_id=? AND season=?",
+                self.key(job),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "last_check": row[0],
+            "outcome": row[1],
+            "attempts": row[2],
+            "video_keys": json.loads(row[3] or "[]"),
+            "file_paths": json.loads(row[4] or "[]"),
+        }
+
+    def retry_at(self, state: dict) -> float:
+        """
+        Compute when an item should be checked again.
+
+        Items with a trailer wait `APP_STATE_RECHECK_DAYS`. Other outcomes wait `APP_STATE_RETRY_HOURS`, doubled
+        after every consecutive attempt and capped at `APP_STATE_RECHECK_DAYS`.
+
+        :param state: Stored state returned by `get()`
+        :return: Timestamp of the next check
+        """
+        if state["outcome"] == "downloaded":
+            delay = self.recheck_seconds
+        else:
+            delay = min(self.retry_seconds * 2 ** max(state["attempts"] - 1, 0), self.recheck_seconds)
+        return state["last_check"] + delay
+
+    def due_ids(self, library: str) -> Set[int]:
+        """
+        Return the Radarr/Sonarr ids of the items of a library whose next check is due, so an incremental pass
+        retries them even if Radarr/Sonarr did not change them.
+
+        :param library: Library name
+        :return: Set of *arr ids, a TV show is due when one of its seasons is
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT arr_id, last_check, outcome, attempts FROM items WHERE library=?", (library,)).fetchall()
+        now = time.time()
+        return {arr_id for arr_id, last_check, outcome, attempts in rows if now >= self.retry_at({"last_check": last_check, "outcome": outcome, "attempts": attempts})}
+
+    def should_skip(self, job: dict) -> bool:
+        """
+        Check whether a job can be skipped because of a recent outcome.
+
+        :param job: Pipeline job dictionary
+        :return: True if the item was checked recently enough
+        """
+        state = self.get(job)
+        if state is None or time.time() >= self.retry_at(state):
+            return False
+        self.logger.debug(
+            "« {title} » was checked recently « {outcome} », next check after « {date} ».",
+            title=job["item"].get("use_title"),
+            outcome=state["outcome"],
+            date=time.strftime("%Y-%m-%d %H:%M", time.localtime(self.retry_at(state))),
+        )
+        return True
+
+    def record(self, job: dict, outcome: str) -> None:
+        """
+        Store the outcome of a job. Consecutive outcomes without a trailer increase the back-off.
+
+        :param job: Pipeline job dictionary, `video_keys` and `file_paths` are stored when present
+        :param outcome: One of `OUTCOMES`
+        """
+        key = self.key(job)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT attempts FROM items WHERE library=? AND arr_id=? AND tmdb_id=? AND season=?",
+                key,
+            ).fetchone()
+            attempts = 0 if outcome == "downloaded" else (row[0] if row else 0) + 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (time.time(), outcome, attempts, json.dumps(job.get("video_keys", [])), json.dumps(job.get("file_paths", []))),
+            )
+            self._db.commit()
+
+    def get_sync(self, library: str) -> Optional[dict]:
+        """
+        Return the incremental sync watermarks of a library.
+
+        :param library: Library name
+        :return: Dictionary with watermark and last_full timestamps, or None if the library was never synced
+        """
+        with self._lock:
+            row = self._db.execute("SELECT watermark, last_full FROM sync WHERE library=?", (library,)).fetchone()
+        if row is None:
+            return None
+        return {"watermark": row[0], "last_full": row[1]}
+
+    def set_sync(self, library: str, watermark: float, last_full: float) -> None:
+        """
+        Store the incremental sync watermarks of a library.
+
+        :param library: Library name
+        :param watermark: Start time of the last successful pass
+        :param last_full: Start time of the last successful full pass
+        """
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sync VALUES (?, ?, ?)", (library, watermark, last_full))
+            self._db.commit()
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._db.close()
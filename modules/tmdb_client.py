@@ -0,0 +1,185 @@
+"""
+Module providing a pooled, rate-limited HTTP client for the TMDB API.
+
+All TMDB requests go through a single `requests.Session`, so TLS connections are kept alive and reused across
+items and worker threads. Requests use separate connect and read timeouts, failed requests are retried with an
+exponential back-off on 429 and 5xx responses (honouring the `Retry-After` header), and a token bucket keeps the
+request rate under TMDB's limits even when several lookup workers run at once.
+
+When `TMDB_CACHE_PATH` is set, responses are kept in an on-disk `HttpCache`: fresh entries are served without a
+request and stale ones are revalidated with `If-None-Match`/`If-Modified-Since`.
+
+Dependencies:
+    - json: Decoding of the cached responses.
+    - threading: Protects the token bucket shared by the lookup workers.
+    - time: Clock and sleep used by the token bucket.
+    - requests: HTTP session with connection pooling.
+    - requests.adapters.HTTPAdapter: Connection pool and retry policy of the session.
+    - urllib3.util.retry.Retry: Retry policy with back-off and `Retry-After` support.
+    - modules.http_cache.HttpCache: On-disk response cache.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.metrics.metrics: Registry receiving the request counts and durations.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - TmdbClient(Translator):
+        Shared TMDB session with pooling, timeouts, retries and rate limiting.
+
+Configuration:
+    - TMDB_API_KEY (str): TMDB API key.
+    - TMDB_CONNECT_TIMEOUT (float): Connect timeout in seconds. Defaults to 5.
+    - TMDB_READ_TIMEOUT (float): Read timeout in seconds. Defaults to 20.
+    - TMDB_RETRIES (int): Number of retries on connection errors, 429 and 5xx responses. Defaults to 3.
+    - TMDB_RATE_LIMIT (float): Maximum number of requests per second. Defaults to 40.
+    - TMDB_VERIFY_SSL (bool): Verify the TLS certificate of the API. Defaults to True.
+    - TMDB_CACHE_PATH (str): Path of the response cache database, see `modules.http_cache`. Disabled when empty.
+"""
+
+import json
+import threading
+import time
+from typing import Optional
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from modules.http_cache import HttpCache
+from modules.logger import Logger
+from modules.metrics import metrics
+from modules.translator import Translator
+
+
+class TmdbClient(Translator):
+    """
+    Shared TMDB session with connection pooling, timeouts, retries and rate limiting.
+
+    Attributes:
+        logger (Logger): Logger instance for logging messages.
+        config (dict): Configuration dictionary.
+        session (requests.Session): Session shared by every request.
+        cache (HttpCache): On-disk response cache, None when disabled.
+    """
+
+    BASE_URL = "https://api.themoviedb.org/3"
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Initialize the client and its connection pool.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.timeout = (config.get("TMDB_CONNECT_TIMEOUT", 5), config.get("TMDB_READ_TIMEOUT", 20))
+        self.verify = config.get("TMDB_VERIFY_SSL", True)
+        if not self.verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        retry = Retry(
+            total=config.get("TMDB_RETRIES", 3),
+            backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        # One pooled connection per lookup worker, so concurrent lookups never wait for a socket
+        pool_size = max(10, int(config.get("APP_TMDB_WORKERS", 1)))
+        self.session = requests.Session()
+        self.session.headers.update({"accept": "application/json"})
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+        self.rate = float(config.get("TMDB_RATE_LIMIT", 40))
+        self._tokens = self.rate
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.cache = HttpCache(logger, config) if config.get("TMDB_CACHE_PATH") else None
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    def _acquire(self) -> None:
+        """
+        Take one token from the bucket, sleeping until one is available.
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def url(self, path: str) -> str:
+        """
+        Build the full URL of an API path.
+
+        :param path: API path such as "/movie/603/videos"
+        :return: Full URL
+        """
+        return f"{self.BASE_URL}/{path.lstrip('/')}"
+
+    def get(self, path: str, params: Optional[dict] = None) -> dict:
+        """
+        Send a GET request to the TMDB API and decode the JSON response.
+
+        With the cache enabled, a fresh cached response is returned without any request, and a stale one is
+        revalidated with a conditional request.
+
+        :param path: API path such as "/movie/603/videos"
+        :param params: Query parameters, the API key is added automatically
+        :return: Decoded JSON response
+        :raises requests.RequestException: If the request still fails after the retries
+        :raises ValueError: If the response is not valid JSON
+        """
+        url = self.url(path)
+        headers = {}
+        key = entry = None
+        if self.cache is not None:
+            key = self.cache.key(url, params)
+            entry = self.cache.get(key)
+            if entry is not None and entry["fresh"]:
+                self.cache.count("hits")
+                return json.loads(entry["body"])
+            if entry is not None and entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry is not None and entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            response = self.session.get(
+                url,
+                params={"api_key": self.config["TMDB_API_KEY"], **(params or {})},
+                headers=headers,
+                timeout=self.timeout,
+                verify=self.verify,
+            )
+        except requests.RequestException:
+            metrics.inc("trailer_finder_tmdb_requests_total", status="error")
+            raise
+        finally:
+            metrics.observe("trailer_finder_tmdb_request_duration_seconds", time.perf_counter() - started)
+        metrics.inc("trailer_finder_tmdb_requests_total", status=response.status_code)
+        if response.status_code == 304 and entry is not None:
+            self.cache.count("revalidated")
+            self.cache.refresh(key)
+            return json.loads(entry["body"])
+        response.raise_for_status()
+        data = response.json()
+        if self.cache is not None:
+            self.cache.count("misses")
+            self.cache.put(key, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return data
+
+    def close(self) -> None:
+        """
+        Close the pooled connections and the response cache.
+        """
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
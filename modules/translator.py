@@ -5,9 +5,16 @@ This module provides functionality for translating messages into different langu
 based on loaded translation files. It supports various locales configured through
 the 'locales' directory. Translations are accessed using keys defined in these files.
 
+The catalogs are shared by the whole process: every class inheriting `Translator`
+uses the same cache, each locale file is parsed at most once and only when it is first
+needed (the active locale, plus English as fallback), and templates are prepared once
+so templates without placeholders are returned without formatting. A missing key is
+reported once instead of on every call.
+
 Dependencies:
     - os: Operating system interface for file operations.
     - json: Module for parsing JSON files used for translation storage.
+    - threading: Protects the shared catalogs.
 
 Classes:
     - Translator:
@@ -18,10 +25,10 @@ Attributes:
 
 Methods:
     - __init__(local="en"):
-        Initializes the Translator with a default locale and loads translation files.
+        Initializes the Translator with a default locale.
 
     - _load_translations():
-        Loads translation files from the 'locales' directory.
+        Returns the catalogs of the active locale and of the English fallback.
 
     - translate(msg_key, **kwargs):
         Translates a message key to the appropriate language string.
@@ -36,6 +43,40 @@ Usage:
 
 import os
 import json
+import threading
+
+LOCALES_DIR = "locales"
+FALLBACK_LOCALE = "en"
+
+# Process-wide catalogs: locale -> {key: (template, has_placeholders)}
+_catalogs = {}
+# Missing keys already reported, as (locale, key) pairs
+_reported = set()
+_lock = threading.Lock()
+
+
+def _catalog(locale):
+    """
+    Returns the compiled catalog of a locale, parsing its file on first use.
+
+    Args:
+        locale (str): Locale name, such as 'en'.
+
+    Returns:
+        dict: Mapping of message key to (template, has_placeholders), empty if the locale does not exist.
+    """
+    catalog = _catalogs.get(locale)
+    if catalog is not None:
+        return catalog
+    with _lock:
+        if locale not in _catalogs:
+            try:
+                with open(os.path.join(LOCALES_DIR, f"{locale}.json"), "r", encoding="utf-8") as f:
+                    messages = json.load(f)
+            except FileNotFoundError:
+                messages = {}
+            _catalogs[locale] = {key: (template, "{" in template) for key, template in messages.items() if template}
+        return _catalogs[locale]
 
 
 class Translator:
@@ -48,29 +89,23 @@ class Translator:
 
     def __init__(self, local="en"):
         """
-        Initializes the Translator with a default locale and loads translation files.
+        Initializes the Translator with a default locale.
+
+        The catalogs are loaded lazily and shared by every instance.
 
         Args:
             local (str): The default language locale. Default is 'en'.
         """
-        self.local = local
-        self.translations = self._load_translations()
+        self.local = local or FALLBACK_LOCALE
 
     def _load_translations(self):
         """
-        Loads translation files from the 'locales' directory.
+        Returns the catalogs of the active locale and of the English fallback.
 
         Returns:
-            dict: A dictionary of translations for each supported locale.
+            dict: A dictionary of translations for each loaded locale.
         """
-        translations = {}
-        locales_dir = "locales"
-        for filename in os.listdir(locales_dir):
-            if filename.endswith(".json"):
-                locale = filename[:-5]
-                with open(os.path.join(locales_dir, filename), "r", encoding="utf-8") as f:
-                    translations[locale] = json.load(f)
-        return translations
+        return {locale: {key: template for key, (template, _) in _catalog(locale).items()} for locale in {self.local, FALLBACK_LOCALE}}
 
     def translate(self, msg_key, **kwargs):
         """
@@ -83,16 +118,31 @@ class Translator:
         Returns:
             str: The translated and formatted message string.
         """
-        msg_template = self.translations.get(self.local, {}).get(msg_key)
+        entry = _catalog(self.local).get(msg_key) or _catalog(FALLBACK_LOCALE).get(msg_key)
         try:
-            if msg_template:
-                return msg_template.format(**kwargs)
-            raise KeyError(msg_key)
-        except KeyError as err:
-            # These print statements are important for development and debugging purposes.
-            # They help identify missing translation keys.
-            # Do not remove them, as they are useful for identifying and fixing translation errors.
-            print("******************************")
-            print(f"Missing translate for: {err}")
-            print("******************************")
+            if entry is None:
+                raise KeyError(msg_key)
+            template, has_placeholders = entry
+            return template.format(**kwargs) if has_placeholders else template
+        except (KeyError, IndexError) as err:
+            self._report_missing(msg_key, err)
             return msg_key
+
+    def _report_missing(self, msg_key, err):
+        """
+        Prints a missing translation, once per locale and key.
+
+        Args:
+            msg_key (str): The key that could not be translated.
+            err (Exception): The lookup or formatting error.
+        """
+        with _lock:
+            if (self.local, msg_key) in _reported:
+                return
+            _reported.add((self.local, msg_key))
+        # These print statements are important for development and debugging purposes.
+        # They help identify missing translation keys.
+        # Do not remove them, as they are useful for identifying and fixing translation errors.
+        print("******************************")
+        print(f"Missing translate for: {err}")
+        print("******************************")
@@ -7,17 +7,23 @@ like search prefixes, custom paths, and API keys.
 
 Dependencies:
     - os: Operating system interface for file operations.
+    - json: Sidecar file recording the YouTube id of each trailer.
     - shutil: High-level file operations utility.
     - re: Regular expression operations for string manipulation.
     - datetime: Date and time handling.
+    - shlex: Splitting of the FFMPEG command template into an argument list.
+    - time: Wall time of the FFMPEG jobs.
     - subprocess: Subprocess management for executing FFMPEG commands.
     - requests: HTTP library for making requests to external APIs.
-    - urllib3: HTTP client utility for disabling SSL warnings.
     - modules.logger.Logger: Logger instance for logging messages.
+    - modules.tmdb_client.TmdbClient: Pooled, rate-limited client used for the TMDB API.
+    - modules.scan_index.ScanIndex: Cached listings and free space of the trailer folders.
     - modules.youtube_dl.YoutubeDL: Class for downloading trailers using `yt-dlp`.
     - modules.exceptions.FfmpegError: Exception raised for errors during FFMPEG processing.
     - modules.exceptions.FfmpegCommandMissing: Exception raised when FFMPEG command is not defined in `config.yaml`.
     - modules.exceptions.InsufficientDiskSpaceError: Exception raised when there is insufficient disk space.
+    - modules.metrics.metrics: Registry receiving the ffmpeg job durations.
+    - modules.profiler.profiler: Stage timers of the TMDB lookups and the post-processing.
 
 Classes:
     - Utils(Translator):
@@ -27,6 +33,8 @@ Attributes:
     logger (Logger): Logger instance for logging messages.
     config (dict): Configuration dictionary containing settings from `config.yaml`.
     yt_downloader (YoutubeDL): Instance of YoutubeDL for downloading trailers using `yt-dlp`.
+    tmdb (TmdbClient): Shared TMDB client.
+    scan (ScanIndex): Cached listings and free space of the trailer folders.
 
 Usage:
     This module provides essential utility functions for handling trailers, downloading from YouTube,
@@ -35,23 +43,32 @@ Usage:
 """
 
 import os
+import json
 import shutil
 import re
+import shlex
+import time
 from datetime import datetime, timezone
 import subprocess
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Set, Tuple, Union
 import requests
-import urllib3
 from modules.logger import Logger
 from modules.youtube_dl import YoutubeDL
+from modules.tmdb_client import TmdbClient
+from modules.scan_index import ScanIndex
 from modules.exceptions import FfmpegError, FfmpegCommandMissing, InsufficientDiskSpaceError
+from modules.metrics import metrics
+from modules.profiler import profiler
 from modules.translator import Translator
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
 
 class Utils(Translator):
+    # Maximum number of sub-requests TMDB accepts in one `append_to_response`
+    TMDB_APPEND_LIMIT = 20
+
+    # Hidden file of each trailer folder mapping the trailer files to their YouTube ids
+    SIDECAR = ".trailers.json"
+
     def __init__(self, logger: Logger, config: Dict[str, Union[str, int, bool, list]]) -> None:
         """
         Initialize Utils class with a logger and configuration.
@@ -62,6 +79,10 @@ class Utils(Translator):
         self.logger = logger
         self.config = config
         self.yt_downloader = YoutubeDL(logger, config)
+        self.tmdb = TmdbClient(logger, config)
+        self.scan = ScanIndex(logger, config)
+        # Staging directories older than this were left behind by a previous run
+        self.started = time.time()
         super().__init__(config.get("APP_TRANSLATE"))
 
     def replace_slash_backslash(self, text: str) -> str:
@@ -94,6 +115,7 @@ class Utils(Translator):
 
         return title
 
+    @profiler.hook("trailer_pull")
     def trailer_pull(self, tmdb_id: str, item_type: str, item: dict, seasonNumber=None) -> List[Dict[str, Union[str, bool, datetime]]]:
         """
         Retrieve trailer information from TMDB API.
@@ -105,51 +127,89 @@ class Utils(Translator):
         :return: List of cleaned trailer information
         """
 
-        base_link = "api.themoviedb.org/3"
-        api_key = self.config["TMDB_API_KEY"]
-
         if seasonNumber:
-            url = f"https://{base_link}/tv/{tmdb_id}/season/{seasonNumber}/videos"
+            path = f"/tv/{tmdb_id}/season/{seasonNumber}/videos"
         else:
-            url = f"https://{base_link}/{item_type}/{tmdb_id}/videos"
+            path = f"/{item_type}/{tmdb_id}/videos"
 
-        headers = {"accept": "application/json"}
+        url = self.tmdb.url(path)
         self.logger.info("Retrieving information about « {info} ».", info=url)
 
         try:
-            response = requests.get(
-                url,
-                params={
-                    "api_key": api_key,
-                    "language": self.config["TMDB_LANGUAGE_TRAILER"],
-                },
-                headers=headers,
-                timeout=3000,
-                verify=False,
-            )
-            response.raise_for_status()
+            raw_trailers = self.tmdb.get(path, params={"language": self.config["TMDB_LANGUAGE_TRAILER"]})
+            return self._clean_trailers(raw_trailers, url)
 
-            trailers = []
-            raw_trailers = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.logger.error("Failed to retrieve trailers from TMDB API: {error}", error=str(e))
+            return []
 
-            for trailer in raw_trailers.get("results", []):
-                if self._should_add_trailer(trailer):
-                    trailer_data = {
-                        "query_type": f"API (TMDB) {url}",
-                        "yt_link": self.config["YT_DLP_BASE_URL"] + trailer["key"],
-                        "name": self.replace_slash_backslash(trailer["name"]),
-                        "published_at": datetime.strptime(trailer["published_at"], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc),
-                    }
-                    trailers.append(trailer_data)
+    @profiler.hook("trailer_pull_seasons")
+    def trailer_pull_seasons(self, tmdb_id: str, season_numbers: List[int], item: dict) -> Dict[int, List[Dict[str, Union[str, bool, datetime]]]]:
+        """
+        Retrieve the trailer information of several seasons of a TV show with as few TMDB requests as possible.
 
-            if self.config.get("APP_ONLY_ONE_TRAILER", False):
-                trailers.sort(key=lambda x: abs(datetime.now(timezone.utc) - x["published_at"]))
+        The season video lists are appended to the show request with `append_to_response` (at most
+        `TMDB_APPEND_LIMIT` per request). Seasons missing from the response, or every season of a failed request,
+        fall back to `trailer_pull()`. Season 0 uses the show-level videos, like `trailer_pull()`.
 
-            return trailers
+        :param tmdb_id: TMDB ID of the TV show
+        :param season_numbers: Season numbers to retrieve
+        :param item: Metadata of the item
+        :return: Cleaned trailer information per season number
+        """
+        path = f"/tv/{tmdb_id}"
+        url = self.tmdb.url(path)
+        appends = {season: "videos" if not season else f"season/{season}/videos" for season in season_numbers}
+        names = list(dict.fromkeys(appends.values()))
+        results = {}
+
+        for start in range(0, len(names), self.TMDB_APPEND_LIMIT):
+            chunk = names[start : start + self.TMDB_APPEND_LIMIT]
+            self.logger.info("Retrieving information about « {info} ».", info=f"{url}?append_to_response={','.join(chunk)}")
+            try:
+                raw = self.tmdb.get(path, params={"language": self.config["TMDB_LANGUAGE_TRAILER"], "append_to_response": ",".join(chunk)})
+            except (requests.RequestException, ValueError) as e:
+                self.logger.error("Failed to retrieve trailers from TMDB API: {error}", error=str(e))
+                continue
+            for name in chunk:
+                if isinstance(raw.get(name), dict):
+                    results[name] = self._clean_trailers(raw[name], f"{url}/{name}")
+
+        trailers = {}
+        for season, name in appends.items():
+            if name in results:
+                trailers[season] = results[name]
+            else:
+                # TMDB did not return this list: ask for it on its own
+                trailers[season] = self.trailer_pull(tmdb_id, "tv", item, seasonNumber=season)
+        return trailers
+
+    def _clean_trailers(self, raw_trailers: dict, url: str) -> List[Dict[str, Union[str, bool, datetime]]]:
+        """
+        Keep the videos of a TMDB video list that match the configured conditions.
 
-        except (requests.RequestException, ValueError) as e:
-            self.logger.error("Failed to retrieve trailers from TMDB API: {error}", error=str(e))
-            return []
+        :param raw_trailers: TMDB video list response
+        :param url: URL the list was retrieved from, reported as the query type
+        :return: List of cleaned trailer information
+        """
+        trailers = []
+
+        for trailer in raw_trailers.get("results", []):
+            if self._should_add_trailer(trailer):
+                trailer_data = {
+                    "query_type": f"API (TMDB) {url}",
+                    "yt_link": self.config["YT_DLP_BASE_URL"] + trailer["key"],
+                    "name": self.replace_slash_backslash(trailer["name"]),
+                    "published_at": datetime.strptime(trailer["published_at"], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc),
+                    "official": trailer.get("official", False),
+                    "size": trailer.get("size"),
+                }
+                trailers.append(trailer_data)
+
+        if self.config.get("APP_ONLY_ONE_TRAILER", False):
+            trailers.sort(key=lambda x: abs(datetime.now(timezone.utc) - x["published_at"]))
+
+        return trailers
 
     def _should_add_trailer(self, trailer: dict) -> bool:
         """
@@ -167,56 +227,229 @@ class Utils(Translator):
 
         return all(condition[0] is None or condition[1](trailer) for condition in conditions)
 
-    def post_process(self, cache_path: str, files: List[str], item: Dict[str, str]) -> None:
+    @profiler.hook("post_process")
+    def post_process(self, cache_path: str, files: List[str], item: Dict[str, str]) -> List[str]:
         """
         Perform post-processing on downloaded trailers using FFMPEG.
 
         :param cache_path: Path to the cache directory containing trailers
         :param files: List of downloaded trailer filenames
         :param item: Metadata of the item (movie or TV show)
+        :return: List of the trailer files written
         """
-        trailers_path = os.path.join(item["path"], "trailers")
-        os.makedirs(trailers_path, exist_ok=True)
-
-        ffmpeg_cmd_template = self.config.get("FFMPEG_COMMAND_TEMPLATE", None)
-        if ffmpeg_cmd_template is None:
-            raise FfmpegCommandMissing(self.translate("The ffmpeg command is not defined in config.yaml."))
+        written_sources = []
 
         # Iterate through each downloaded file and perform FFMPEG processing
         for file in files:
-            filename = os.path.splitext(os.path.basename(file))[0]
-            filetype = self.config.get("FFMPEG_FILE_TYPE", "mkv")
-
-            cmd = ffmpeg_cmd_template.format(
-                path=f"{cache_path}/{file}",
-                thread=self.config.get("FFMPEG_THREAD_COUNT", 4),
-                buffer=self.config.get("FFMPEG_BUFFER_SIZE", "1M"),
-                path_file=f"{item['trailers_dest']}/{filename}.{filetype}",
-            )
-
-            # Log the FFMPEG command used for processing
-            self.logger.info("ffmpeg command « {cmd} ».", cmd=cmd)
+            path_file = self.trailer_path(file, item)
 
-            subprocess_args = {}
-            if self.config.get("APP_QUIET_MODE", False):
-                subprocess_args["stdout"] = subprocess.DEVNULL
-                subprocess_args["stderr"] = subprocess.DEVNULL
-                subprocess_args["stdin"] = subprocess.DEVNULL
+            if not self.needs_transcode(file, item):
+                self.move_downloaded(cache_path, file, path_file)
+                written_sources.append((file, path_file))
+                continue
 
+            cmd, staged_file = self.ffmpeg_command(cache_path, file)
+            started = time.monotonic()
             try:
                 # Execute the FFMPEG command with subprocess
-                subprocess.run(cmd, **subprocess_args, check=False, shell=True)
-            except subprocess.CalledProcessError as e:
+                result = subprocess.run(cmd, **self.ffmpeg_streams(), check=False)
+            except OSError as e:
                 raise FfmpegError(self.translate("The ffmpeg command has an error « {error} ».", error=e))
+
+            if self.ffmpeg_finished(file, started, result.returncode, staged_file):
+                self.finalize(staged_file, path_file)
+                written_sources.append((file, path_file))
+        return self.end_post_process(cache_path, item, written_sources)
+
+    def trailer_path(self, file: str, item: Dict[str, str]) -> str:
+        """
+        Build the final path of the trailer made from a downloaded file.
+
+        :param file: Downloaded trailer filename
+        :param item: Metadata of the item (movie or TV show)
+        :return: Path of the trailer in the item's trailer folder
+        """
+        filename = os.path.splitext(os.path.basename(file))[0]
+        return f"{item['trailers_dest']}/{filename}.{self.config.get('FFMPEG_FILE_TYPE', 'mkv')}"
+
+    def move_downloaded(self, cache_path: str, file: str, path_file: str) -> None:
+        """
+        Move a file downloaded directly in the target format into the trailer folder, without ffmpeg.
+
+        :param cache_path: Path to the cache directory containing trailers
+        :param file: Downloaded trailer filename
+        :param path_file: Final path of the trailer
+        """
+        filetype = self.config.get("FFMPEG_FILE_TYPE", "mkv")
+        self.logger.info("« {file} » is already in the « {filetype} » format, ffmpeg is skipped.", file=file, filetype=filetype)
+        self.finalize(f"{cache_path}/{file}", path_file)
+
+    def ffmpeg_command(self, cache_path: str, file: str) -> Tuple[List[str], str]:
+        """
+        Build the FFMPEG command converting one downloaded file, and log it.
+
+        :param cache_path: Path to the cache directory containing trailers
+        :param file: Downloaded trailer filename
+        :return: Argument list of the command and the staged file it writes
+        :raises FfmpegCommandMissing: If the command template is not defined in config.yaml
+        """
+        ffmpeg_cmd_template = self.config.get("FFMPEG_COMMAND_TEMPLATE", None)
+        if ffmpeg_cmd_template is None:
+            raise FfmpegCommandMissing(self.translate("The ffmpeg command is not defined in config.yaml."))
+
+        filename = os.path.splitext(os.path.basename(file))[0]
+        filetype = self.config.get("FFMPEG_FILE_TYPE", "mkv")
+        # ffmpeg writes into the staging directory, the trailer only appears in its folder once complete
+        staged_file = os.path.join(cache_path, ".done", f"{filename}.{filetype}")
+        os.makedirs(os.path.dirname(staged_file), exist_ok=True)
+        values = {
+            "path": f"{cache_path}/{file}",
+            "thread": self.config.get("FFMPEG_THREAD_COUNT", 4),
+            "buffer": self.config.get("FFMPEG_BUFFER_SIZE", "1M"),
+            "path_file": staged_file,
+        }
+        # The template is split before the values are inserted, so paths are never interpreted by a shell
+        cmd = [arg.format(**values) for arg in shlex.split(ffmpeg_cmd_template)]
+
+        # Log the FFMPEG command used for processing
+        self.logger.info("ffmpeg command « {cmd} ».", cmd=shlex.join(cmd))
+        return cmd, staged_file
+
+    def ffmpeg_streams(self) -> dict:
+        """
+        Standard streams of the FFMPEG processes, discarded in quiet mode.
+
+        :return: Keyword arguments for `subprocess.run()` or `asyncio.create_subprocess_exec()`
+        """
+        if self.config.get("APP_QUIET_MODE", False):
+            return {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "stdin": subprocess.DEVNULL}
+        return {}
+
+    def ffmpeg_finished(self, file: str, started: float, returncode: int, staged_file: str) -> bool:
+        """
+        Record and log the end of an FFMPEG job.
+
+        :param file: Downloaded trailer filename
+        :param started: `time.monotonic()` when the job started
+        :param returncode: Exit code of the job
+        :param staged_file: Staged file the job writes
+        :return: True if the job succeeded and wrote its file
+        """
+        metrics.observe("trailer_finder_ffmpeg_duration_seconds", time.monotonic() - started, result="ok" if returncode == 0 else "error")
+        log = self.logger.info if returncode == 0 else self.logger.error
+        log(
+            "ffmpeg job « {file} » finished in « {duration} » seconds with exit code « {code} ».",
+            file=file,
+            duration=round(time.monotonic() - started, 1),
+            code=returncode,
+        )
+        return returncode == 0 and os.path.exists(staged_file)
+
+    def end_post_process(self, cache_path: str, item: Dict[str, str], written_sources: List[Tuple[str, str]]) -> List[str]:
+        """
+        Record the sources of the trailers written and remove the staging directory.
+
+        :param cache_path: Path to the cache directory containing trailers
+        :param item: Metadata of the item (movie or TV show)
+        :param written_sources: (downloaded filename, trailer path) of every trailer written
+        :return: List of the trailer files written
+        """
+        # Remember which videos the trailers come from, so they are never downloaded again
+        downloaded = item.get("downloaded_formats", {})
+        sources = {}
+        for file, path_file in written_sources:
+            if downloaded.get(file, {}).get("id"):
+                sources[os.path.basename(path_file)] = downloaded[file]["id"]
+        if sources:
+            self.write_sidecar(item["trailers_dest"], sources)
+
         # Always remove the cache_path after FFMPEG execution
-        shutil.rmtree(cache_path)
+        self.discard_staging(cache_path, item)
+        return [path_file for _, path_file in written_sources]
 
-    def download_trailers(self, links: List[dict], item: Dict[str, str]) -> None:
+    def finalize(self, source: str, destination: str) -> None:
         """
-        Download trailers from YouTube using YoutubeDL.
+        Move a finished trailer into its folder.
+
+        The staging directory is on the same filesystem as the destination, so the move is an atomic rename;
+        a copy is only made for the `tmp/` fallback on another filesystem.
+
+        :param source: Finished file in the staging directory
+        :param destination: Final path of the trailer
+        """
+        # The trailer folder is only created once there is a trailer to put in it
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        try:
+            os.replace(source, destination)
+        except OSError:
+            shutil.move(source, destination)
+        self.scan.add(destination)
+
+    def discard_staging(self, cache_path: str, item: Dict[str, str] = None) -> None:
+        """
+        Remove a staging directory, its `.partial` parent once empty, and the empty folders created for it.
+
+        :param cache_path: Staging directory returned by `YoutubeDL.staging_path()`
+        :param item: Metadata of the item, with the `staging_created` folders recorded by the download
+        """
+        shutil.rmtree(cache_path, ignore_errors=True)
+        parents = [os.path.dirname(cache_path)]
+        if os.path.basename(parents[0]) != self.yt_downloader.PARTIAL_DIR:
+            parents = []
+        parents += [path for path in (item or {}).get("staging_created", []) if path != cache_path and path not in parents]
+        for parent in parents:
+            try:
+                os.rmdir(parent)
+            except OSError:
+                # Not empty: another item of the same folder is still staged, or a trailer was written
+                pass
+
+    def clean_partials(self, item: Dict[str, str]) -> None:
+        """
+        Remove the staging directory an interrupted previous run left for an item.
+
+        Only directories last modified before this process started are removed, so jobs in flight are never touched.
+
+        :param item: Metadata of the item, with its `trailers_dest`
+        """
+        cache_path = self.yt_downloader.staging_path(item)
+        # The cached listing of the parent folder tells whether there is anything to check
+        if not self.scan.exists(os.path.dirname(cache_path)):
+            return
+        try:
+            if os.path.getmtime(cache_path) < self.started:
+                self.logger.info("Removing the unfinished trailers of « {path} ».", path=cache_path)
+                self.discard_staging(cache_path)
+        except OSError:
+            # No staging directory for this item
+            pass
+
+    def needs_transcode(self, file: str, item: Dict[str, str]) -> bool:
+        """
+        Check whether a downloaded file must go through the ffmpeg command.
+
+        Only files downloaded in direct-to-target mode (`YT_DLP_DIRECT_TO_TARGET`) whose container is
+        `FFMPEG_FILE_TYPE` and whose audio codec is the one expected for it are used as they are.
+
+        :param file: Name of the downloaded file
+        :param item: Metadata of the item, with the `downloaded_formats` recorded by the download
+        :return: True if ffmpeg must run
+        """
+        if not self.yt_downloader.direct_to_target():
+            return True
+        filetype = self.config.get("FFMPEG_FILE_TYPE", "mkv")
+        downloaded = item.get("downloaded_formats", {}).get(file)
+        if downloaded is None or downloaded.get("ext") != filetype:
+            return True
+        return not (downloaded.get("acodec") or "").startswith(self.yt_downloader.DIRECT_AUDIO_CODECS[filetype])
+
+    def build_links(self, links: List[dict], item: Dict[str, str]) -> List[dict]:
+        """
+        Complete the TMDB trailer links with the *arr YouTube trailer id and the configured search prefixes.
 
         :param links: List of YouTube trailer links
         :param item: Metadata of the item (movie or TV show)
+        :return: List of links to try, in order
         """
 
         prefix_search = self.config.get("YT_SEARCH_PREFIX", [])
@@ -238,6 +471,16 @@ class Utils(Translator):
             }
             links.append(link)
 
+        return links
+
+    def download_trailers(self, links: List[dict], item: Dict[str, str]) -> None:
+        """
+        Download trailers from YouTube using YoutubeDL.
+
+        :param links: List of YouTube trailer links
+        :param item: Metadata of the item (movie or TV show)
+        """
+        links = self.build_links(links, item)
         cache_path = self.yt_downloader.download_trailers(links, item)
 
         if os.path.exists(cache_path):
@@ -246,15 +489,16 @@ class Utils(Translator):
                 self.post_process(cache_path, files, item)
                 return
 
-    def check_space(self, path: str) -> bool:
+    def check_space(self, path: str, root: str = None) -> bool:
         """
         Check available disk space to ensure there is enough space to download and process trailers.
 
-        :param path: Path where trailers will be downloaded
+        :param path: Path where trailers will be downloaded, it does not need to exist yet
+        :param root: Library root holding `path`, the free space is measured once per root for `APP_SPACE_CACHE_SECONDS`
         :return: Boolean indicating if there is enough space
         """
 
-        total, used, free = shutil.disk_usage(path)
+        free = self.scan.disk_free(path, root)
         free_gb = free / (1024**3)  # Convert bytes to GB
         if free_gb < self.config.get("APP_FREE_SPACE_GB", 5):
             raise InsufficientDiskSpaceError(
@@ -265,19 +509,103 @@ class Utils(Translator):
                 )
             )
 
-    def get_new_trailers(self, trailer_names: List[str], existing_files: List[str]) -> List[str]:
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """
+        Normalise a trailer name for comparisons: case, punctuation and repeated spaces are ignored.
+
+        :param name: Trailer name or file name without extension
+        :return: Normalised name
+        """
+        return re.sub(r"[\W_]+", " ", name.casefold()).strip()
+
+    def video_id(self, trailer: dict) -> Optional[str]:
+        """
+        Extract the YouTube id of a trailer link.
+
+        :param trailer: Trailer link information
+        :return: YouTube id, or None for links that are not a video URL (e.g. searches)
+        """
+        link = trailer.get("yt_link", "")
+        base_url = self.config.get("YT_DLP_BASE_URL", "")
+        if base_url and link.startswith(base_url):
+            return link[len(base_url) :]
+        return None
+
+    def read_sidecar(self, trailers_dest: str) -> Dict[str, str]:
         """
-        Get trailer names that do not already exist in the specified folder.
+        Read the YouTube ids of the trailers of a folder.
+
+        :param trailers_dest: Trailer folder
+        :return: Mapping of trailer file name to YouTube id, empty if the folder has no sidecar
+        """
+        path = os.path.join(trailers_dest, self.SIDECAR)
+        # The cached listing avoids opening a file that does not exist
+        if not self.scan.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                sources = json.load(file)
+        except (OSError, ValueError) as err:
+            self.logger.warning("An error has occurred « {error} ».", error=err)
+            return {}
+        return sources if isinstance(sources, dict) else {}
+
+    def write_sidecar(self, trailers_dest: str, sources: Dict[str, str]) -> None:
+        """
+        Add trailers to the sidecar of a folder.
+
+        :param trailers_dest: Trailer folder
+        :param sources: Mapping of trailer file name to YouTube id
+        """
+        path = os.path.join(trailers_dest, self.SIDECAR)
+        # Entries of trailers deleted since the last write are dropped
+        merged = {name: video_id for name, video_id in self.read_sidecar(trailers_dest).items() if self.scan.exists(os.path.join(trailers_dest, name))}
+        merged.update(sources)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(merged, file, indent=2, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except OSError as err:
+            self.logger.warning("An error has occurred « {error} ».", error=err)
+            return
+        self.scan.add(path)
+
+    def existing_video_ids(self, trailers_dest: str, existing_files: List[str]) -> Set[str]:
+        """
+        Return the YouTube ids of the trailers still present in a folder.
+
+        :param trailers_dest: Trailer folder
+        :param existing_files: Files of the folder
+        :return: Set of YouTube ids
+        """
+        if not existing_files:
+            return set()
+        present = set(existing_files)
+        return {video_id for name, video_id in self.read_sidecar(trailers_dest).items() if name in present}
+
+    def get_new_trailers(self, trailer_names: List[Union[dict, str]], existing_files: List[str], video_ids: Optional[Set[str]] = None) -> List[Union[dict, str]]:
+        """
+        Get trailers that do not already exist in the specified folder.
+
+        A trailer exists when a file has the same normalised name, or when its YouTube id is one of `video_ids`.
+        Both checks are set lookups.
 
-        :param trailer_names: List of trailer names to check
+        :param trailer_names: List of trailer links (as returned by `trailer_pull`) or trailer names to check
         :param existing_files: Files existing
-        :return: List of trailer names that do not already exist in the folder
+        :param video_ids: YouTube ids of the existing trailers, see `existing_video_ids()`
+        :return: List of trailers that do not already exist in the folder
         """
-        existing_names = [os.path.splitext(file)[0] for file in existing_files]
+        existing_names = {self.normalize_name(os.path.splitext(file)[0]) for file in existing_files}
+        video_ids = video_ids or set()
 
         new_trailers = []
-        for name in trailer_names:
-            if name not in existing_names:
-                new_trailers.append(name)
+        for trailer in trailer_names:
+            name = trailer.get("name", "") if isinstance(trailer, dict) else trailer
+            if self.normalize_name(name) in existing_names:
+                continue
+            if isinstance(trailer, dict) and self.video_id(trailer) in video_ids:
+                continue
+            new_trailers.append(trailer)
 
         return new_trailers
@@ -0,0 +1,212 @@
+"""
+Module providing a webhook listener so Radarr and Sonarr can request a trailer as soon as an item is added.
+
+Radarr and Sonarr can notify a "Webhook" connection on events such as "On Grab", "On Import" or "On Series
+Add". This module runs a small HTTP server that accepts those payloads, looks the item up through the Radarr or
+Sonarr API and submits it to the trailer pipeline (`Utils.trailer_pull` → `YoutubeDL.download_trailers` →
+`Utils.post_process`) without waiting for the next cycle. Events for the same item that arrive within
+`APP_WEBHOOK_DELAY` seconds are coalesced into a single job.
+
+Dependencies:
+    - json: Parsing of the webhook payloads.
+    - threading: Server and dispatcher threads.
+    - http.server: Built-in HTTP server.
+    - urllib.parse: Query string parsing for the optional token.
+    - time.monotonic: Clock used to coalesce events.
+    - pyarr: Radarr and Sonarr API clients used to fetch the full item.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.radarr.process_movie: Prepares a movie and submits it to the pipeline.
+    - modules.sonarr.process_show: Prepares the seasons of a series and submits them to the pipeline.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - WebhookServer(Translator):
+        HTTP listener feeding Radarr/Sonarr webhook events into the trailer pipeline.
+
+Configuration:
+    - APP_WEBHOOK_ENABLED (bool): Start the listener. Defaults to False.
+    - APP_WEBHOOK_HOST (str): Address to listen on. Defaults to "0.0.0.0".
+    - APP_WEBHOOK_PORT (int): Port to listen on. Defaults to 8686.
+    - APP_WEBHOOK_TOKEN (str): Optional token, required as `?token=` in the webhook URL when set.
+    - APP_WEBHOOK_DELAY (int): Seconds to wait for duplicate events before processing an item. Defaults to 30.
+    - APP_WEBHOOK_EVENTS (list): Accepted event types. Defaults to Grab, Download, MovieAdded and SeriesAdd.
+
+Usage:
+    Add a "Webhook" connection in Radarr/Sonarr pointing to ``http://<host>:<port>/`` (method POST). A payload can
+    be posted locally for testing:
+
+    .. code-block:: bash
+
+        curl -X POST http://localhost:8686/ -H "Content-Type: application/json" \\
+             -d '{"eventType": "Download", "movie": {"id": 1, "title": "Dune"}}'
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+from urllib.parse import parse_qs, urlparse
+from pyarr import RadarrAPI, SonarrAPI
+from modules.logger import Logger
+from modules.radarr import process_movie
+from modules.sonarr import process_show
+from modules.translator import Translator
+
+
+class WebhookServer(Translator):
+    """
+    HTTP listener feeding Radarr/Sonarr webhook events into the trailer pipeline.
+
+    Attributes:
+        logger (Logger): Logger instance for logging messages.
+        config (dict): Configuration dictionary.
+        utils (Utils): Utility functions instance.
+        pipeline (TrailerPipeline): Pipeline the items are submitted to.
+    """
+
+    DEFAULT_EVENTS = ["Grab", "Download", "MovieAdded", "SeriesAdd"]
+
+    def __init__(self, logger: Logger, config: dict, utils, pipeline) -> None:
+        """
+        Initialize the webhook server.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        :param utils: Utility functions instance
+        :param pipeline: Trailer pipeline the items are submitted to
+        """
+        self.logger = logger
+        self.config = config
+        self.utils = utils
+        self.pipeline = pipeline
+        self.delay = config.get("APP_WEBHOOK_DELAY", 30)
+        self.events = set(config.get("APP_WEBHOOK_EVENTS") or self.DEFAULT_EVENTS)
+        self.token = config.get("APP_WEBHOOK_TOKEN") or None
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._server = None
+        super().__init__(config.get("APP_TRANSLATE"))
+
+    def start(self) -> None:
+        """
+        Start the HTTP server and the dispatcher in background threads.
+        """
+        host = self.config.get("APP_WEBHOOK_HOST", "0.0.0.0")
+        port = self.config.get("APP_WEBHOOK_PORT", 8686)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="webhook-server", daemon=True).start()
+        threading.Thread(target=self._dispatch, name="webhook-dispatcher", daemon=True).start()
+        self.logger.info("Webhook listener started on « {address} ».", address=f"{host}:{port}")
+
+    def stop(self) -> None:
+        """
+        Stop the HTTP server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def handle_event(self, payload: dict) -> str:
+        """
+        Queue the item referenced by a webhook payload.
+
+        :param payload: Decoded Radarr or Sonarr webhook payload
+        :return: "queued", "ignored" or "test"
+        """
+        event = payload.get("eventType")
+        if event == "Test":
+            return "test"
+        if event not in self.events:
+            return "ignored"
+
+        if isinstance(payload.get("movie"), dict):
+            library, resource = "radarr", payload["movie"]
+        elif isinstance(payload.get("series"), dict):
+            library, resource = "sonarr", payload["series"]
+        else:
+            return "ignored"
+
+        if resource.get("id") is None:
+            return "ignored"
+
+        self.logger.info("Webhook « {event} » received for « {title} ».", event=event, title=resource.get("title"))
+        with self._cond:
+            # A new event for an item already waiting only pushes its deadline back
+            self._pending[(library, resource["id"])] = monotonic() + self.delay
+            self._cond.notify()
+        return "queued"
+
+    def _dispatch(self) -> None:
+        """
+        Dispatcher loop: process every item whose coalescing delay has expired.
+        """
+        while True:
+            with self._cond:
+                while True:
+                    now = monotonic()
+                    due = [key for key, deadline in self._pending.items() if deadline <= now]
+                    if due:
+                        break
+                    timeout = min(self._pending.values()) - now if self._pending else None
+                    self._cond.wait(timeout)
+                for key in due:
+                    del self._pending[key]
+            for library, item_id in due:
+                self._process(library, item_id)
+
+    def _process(self, library: str, item_id: int) -> None:
+        """
+        Fetch the full item from Radarr/Sonarr and submit it to the pipeline.
+
+        :param library: "radarr" or "sonarr"
+        :param item_id: Radarr movie id or Sonarr series id
+        """
+        try:
+            if library == "radarr":
+                api = RadarrAPI(self.config["RADARR_HOST"], self.config["RADARR_API"])
+                process_movie(self.logger, self.config, self.utils, self.pipeline, api.get_movie(item_id), force=True)
+            else:
+                api = SonarrAPI(self.config["SONARR_HOST"], self.config["SONARR_API"])
+                process_show(self.logger, self.config, self.utils, self.pipeline, api.get_series(item_id), force=True)
+        except Exception as err:
+            self.logger.error("An error has occurred « {error} ».", error={"error": err, "library": library, "id": item_id})
+
+    def _handler_class(self):
+        """
+        Build the request handler class bound to this server.
+
+        :return: Subclass of `BaseHTTPRequestHandler`
+        """
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if webhook.token and parse_qs(urlparse(self.path).query).get("token", [None])[0] != webhook.token:
+                    self._reply(401, {"status": "unauthorized"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"status": "invalid"})
+                    return
+                if not isinstance(payload, dict):
+                    self._reply(400, {"status": "invalid"})
+                    return
+                self._reply(200, {"status": webhook.handle_event(payload)})
+
+            def _reply(self, code: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Requests are reported through the application logger instead of stderr
+                pass
+
+        return Handler
@@ -0,0 +1,331 @@
+"""
+Module providing a work queue shared by several Trailer Finder nodes, so they can process one library together.
+
+The queue is a SQLite database on storage mounted by every node (`APP_QUEUE_PATH`). The coordinator node runs the
+scheduled Radarr and Sonarr passes, but instead of processing the items itself it adds them to the queue. Every
+node, the coordinator included, claims batches of items, processes them with its own pipeline and marks them done.
+
+An item is claimed with a lease: while the node works on it, a heartbeat extends the lease every third of
+`APP_QUEUE_LEASE_SECONDS`. If a node stops, its leases expire and the items are claimed by another node. An item
+claimed `APP_QUEUE_MAX_ATTEMPTS` times without being completed is marked as failed until the next pass queues it
+again. Claims run in an exclusive transaction, so an item is only held by one node at a time, and completion is
+idempotent: completing an item twice, or after its lease moved to another node, leaves it done.
+
+Queuing an item that is already pending or claimed only refreshes its data, so a pass starting before the previous
+one is finished does not duplicate the work.
+
+The database uses the rollback journal rather than WAL, which needs shared memory that network filesystems do not
+provide; the shared storage must support file locks (NFS with locking, SMB).
+
+Dependencies:
+    - json: Serialisation of the Radarr/Sonarr resources.
+    - os: Operating system interface for file operations.
+    - socket: Host name used in the default node name.
+    - sqlite3: Database holding the queue.
+    - threading: Worker and heartbeat threads.
+    - time: Lease expiry.
+    - modules.logger.Logger: Logger instance for logging messages.
+    - modules.metrics.metrics: Registry receiving the number of queued items per status.
+    - modules.translator.Translator: Translator class for translating messages.
+
+Classes:
+    - WorkQueue(Translator):
+        Shared queue of library items with leases, heartbeats and idempotent completion.
+
+Configuration:
+    - APP_QUEUE_PATH (str): Path of the queue database on the shared storage. The queue is disabled when empty.
+    - APP_QUEUE_ROLE (str): "coordinator" to run the library passes and queue their items, "worker" to only process
+      queued items. Defaults to "worker".
+    - APP_NODE_NAME (str): Name of the node in the queue. Defaults to the host name and process id.
+    - APP_QUEUE_LEASE_SECONDS (int): Duration of a lease without heartbeat. Defaults to 600.
+    - APP_QUEUE_BATCH (int): Number of items claimed at once. Defaults to 20.
+    - APP_QUEUE_POLL_SECONDS (int): Seconds between two looks at an empty queue. Defaults to 30.
+    - APP_QUEUE_MAX_ATTEMPTS (int): Claims of an item before it is marked as failed. Defaults to 3.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Set
+from modules.logger import Logger
+from modules.metrics import metrics
+from modules.translator import Translator
+
+
+class WorkQueue(Translator):
+    """
+    Shared queue of Radarr/Sonarr items with leases, heartbeats and idempotent completion.
+
+    Statuses:
+        - pending: Waiting to be claimed.
+        - leased: Claimed by the node in `owner` until `lease_until`.
+        - done: Processed.
+        - failed: Claimed `APP_QUEUE_MAX_ATTEMPTS` times without being completed.
+
+    Usage:
+        .. code-block:: python
+
+            queue = WorkQueue(logger, config)
+            queue.enqueue("radarr", radarr_api.get_movie())
+            queue.start(pipeline, process, on_error)
+    """
+
+    STATUSES = ("pending", "leased", "done", "failed")
+    ROLES = ("coordinator", "worker")
+
+    def __init__(self, logger: Logger, config: dict) -> None:
+        """
+        Open (and create if needed) the queue database.
+
+        :param logger: Logger instance for logging messages
+        :param config: Configuration dictionary
+        """
+        self.logger = logger
+        self.config = config
+        self.path = config["APP_QUEUE_PATH"]
+        self.role = config.get("APP_QUEUE_ROLE", "worker")
+        self.node = config.get("APP_NODE_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = max(1, config.get("APP_QUEUE_LEASE_SECONDS", 600))
+        self.batch_size = max(1, config.get("APP_QUEUE_BATCH", 20))
+        self.poll_seconds = max(1, config.get("APP_QUEUE_POLL_SECONDS", 30))
+        self.max_attempts = max(1, config.get("APP_QUEUE_MAX_ATTEMPTS", 3))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        super().__init__(config.get("APP_TRANSLATE"))
+        if self.role not in self.ROLES:
+            logger.warning("Unknown queue role « {role} », the node runs as « worker ».", role=self.role)
+            self.role = "worker"
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode: the transactions are opened explicitly, with BEGIN IMMEDIATE when they write
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        # WAL needs shared memory between the nodes, which network filesystems do not provide
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS queue (
+                library TEXT NOT NULL,
+                arr_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                queued REAL NOT NULL,
+                finished REAL,
+                PRIMARY KEY (library, arr_id)
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS queue_claim ON queue (status, queued)")
+        metrics.gauge("trailer_finder_work_queue_items", lambda: [({"status": status}, count) for status, count in self.counts().items()])
+
+    def enqueue(self, library: str, items: Iterable[dict]) -> int:
+        """
+        Queue library items. Items already pending or claimed keep their state, finished ones are queued again.
+
+        :param library: Library name ("radarr" or "sonarr")
+        :param items: Radarr movies or Sonarr series
+        :return: Number of items queued
+        """
+        now = time.time()
+        rows = [(library, item["id"], json.dumps(item), now) for item in items]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    """
+                    INSERT INTO queue (library, arr_id, payload, status, queued) VALUES (?, ?, ?, 'pending', ?)
+                    ON CONFLICT (library, arr_id) DO UPDATE SET
+                        payload = excluded.payload,
+                        queued = CASE WHEN status IN ('done', 'failed') THEN excluded.queued ELSE queued END,
+                        attempts = CASE WHEN status IN ('done', 'failed') THEN 0 ELSE attempts END,
+                        status = CASE WHEN status IN ('done', 'failed') THEN 'pending' ELSE status END
+                    """,
+                    rows,
+                )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        self.logger.info("« {count} » « {library} » items queued for the nodes.", count=len(rows), library=library.capitalize())
+        # The worker of this node does not have to wait for its next poll
+        self._wake.set()
+        return len(rows)
+
+    def claim(self, limit: int) -> List[dict]:
+        """
+        Lease up to `limit` items to this node: pending items, and claimed items whose lease expired.
+
+        :param limit: Maximum number of items
+        :return: Claimed entries with library, arr_id, item and attempts
+        """
+        now = time.time()
+        claimed = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT library, arr_id, payload, status, owner, attempts FROM queue "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) ORDER BY queued LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                for library, arr_id, payload, status, owner, attempts in rows:
+                    item = json.loads(payload)
+                    if status == "leased":
+                        self.logger.warning("The lease of « {title} » held by « {node} » expired.", title=item.get("title"), node=owner)
+                    if attempts >= self.max_attempts:
+                        self._db.execute("UPDATE queue SET status = 'failed', owner = NULL, finished = ? WHERE library = ? AND arr_id = ?", (now, library, arr_id))
+                        self.logger.error("« {title} » was claimed « {count} » times without finishing, it is marked as failed.", title=item.get("title"), count=attempts)
+                        continue
+                    self._db.execute(
+                        "UPDATE queue SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 WHERE library = ? AND arr_id = ?",
+                        (self.node, now + self.lease_seconds, library, arr_id),
+                    )
+                    claimed.append({"library": library, "arr_id": arr_id, "item": item, "attempts": attempts + 1})
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def heartbeat(self) -> None:
+        """
+        Extend the leases of every item claimed by this node.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE queue SET lease_until = ? WHERE owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, self.node),
+            )
+
+    def complete(self, entries: List[dict]) -> None:
+        """
+        Mark claimed items as done. Items already done are left as they are.
+
+        :param entries: Entries returned by `claim()`
+        """
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE queue SET status = 'done', owner = ?, finished = ? WHERE library = ? AND arr_id = ? AND status != 'done'",
+                [(self.node, now, entry["library"], entry["arr_id"]) for entry in entries],
+            )
+
+    def release(self, entries: List[dict]) -> None:
+        """
+        Give claimed items back to the queue, e.g. when this node stops.
+
+        :param entries: Entries returned by `claim()`
+        """
+        with self._lock:
+            self._db.executemany(
+                "UPDATE queue SET status = 'pending', owner = NULL, lease_until = 0 WHERE library = ? AND arr_id = ? AND owner = ? AND status = 'leased'",
+                [(entry["library"], entry["arr_id"], self.node) for entry in entries],
+            )
+
+    def unfinished(self, library: str) -> Set[int]:
+        """
+        Return the ids of the items of a library still pending or failed, which an incremental pass must queue again
+        even if Radarr/Sonarr did not change them.
+
+        :param library: Library name
+        :return: Set of *arr ids
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT arr_id FROM queue WHERE library = ? AND status IN ('pending', 'failed')", (library,)).fetchall()
+        return {arr_id for arr_id, in rows}
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Count the items of every status.
+
+        :return: Dictionary of status to number of items
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in self.STATUSES}
+
+    def start(self, pipeline, process: Callable[[str, dict], None], on_error: Callable[[Exception], None]) -> None:
+        """
+        Start the worker and heartbeat threads of this node.
+
+        :param pipeline: Trailer pipeline the items are submitted to
+        :param process: Function preparing one item and submitting it to the pipeline, called with the library
+            name and the Radarr/Sonarr resource
+        :param on_error: Function called with the error that stopped the worker, e.g. a missing ffmpeg command
+        """
+        threading.Thread(target=self._work, args=(pipeline, process, on_error), name="queue-worker", daemon=True).start()
+        threading.Thread(target=self._beat, name="queue-heartbeat", daemon=True).start()
+        self.logger.info("Node « {node} » started as « {role} » on the queue « {path} ».", node=self.node, role=self.role, path=self.path)
+
+    def stop(self) -> None:
+        """
+        Stop the worker once its current batch is finished.
+        """
+        self._stopped.set()
+        self._wake.set()
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self._db.close()
+
+    def _work(self, pipeline, process: Callable[[str, dict], None], on_error: Callable[[Exception], None]) -> None:
+        """
+        Worker loop: claim a batch, submit its items, wait for the pipeline and mark them done.
+
+        :param pipeline: Trailer pipeline the items are submitted to
+        :param process: Function preparing one item and submitting it to the pipeline
+        :param on_error: Function called with the error that stopped the worker
+        """
+        processed = 0
+        while not self._stopped.is_set():
+            try:
+                entries = self.claim(self.batch_size)
+            except sqlite3.Error as err:
+                self.logger.error("An error has occurred « {error} ».", error={"error": err, "queue": self.path})
+                self._stopped.wait(self.poll_seconds)
+                continue
+
+            if not entries:
+                if processed:
+                    self.logger.info("The queue is empty, « {count} » items processed by « {node} ».", count=processed, node=self.node)
+                    pipeline.summary()
+                    processed = 0
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            try:
+                for entry in entries:
+                    process(entry["library"], entry["item"])
+                for library in sorted({entry["library"] for entry in entries}):
+                    pipeline.wait(library)
+                self.complete(entries)
+                processed += len(entries)
+            except sqlite3.Error as err:
+                # The leases expire and the items are claimed again
+                self.logger.error("An error has occurred « {error} ».", error={"error": err, "queue": self.path})
+            except Exception as err:
+                self.release(entries)
+                on_error(err)
+                return
+
+    def _beat(self) -> None:
+        """
+        Heartbeat loop: extend the leases of this node three times per lease duration.
+        """
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.heartbeat()
+            except sqlite3.Error as err:
+                self.logger.error("An error has occurred « {error} ».", error={"error": err, "queue": self.path})
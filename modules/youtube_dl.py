@@ -5,12 +5,37 @@ This module contains utility functions to interact with YouTube's API using `yt-
 post-processing tasks using FFMPEG. It leverages configurations from `config.yaml` to customize behavior such as
 download formats, interval requests, and error handling.
 
+Building a `yt_dlp.YoutubeDL` loads every extractor and postprocessor, which costs tens of milliseconds. Each
+download worker therefore keeps one long-lived instance and only swaps the per-item `outtmpl` between links.
+
+Candidates are resolved before anything is downloaded: the metadata of every link (TMDB videos, the *arr
+`youTubeTrailerId`, then the search prefixes) is extracted in parallel with `extract_info(download=False)`,
+candidates longer than `YT_DLP_MAX_LENGTH` are discarded, and the others are ranked by official-ness, source,
+resolution and recency. Only the winner is downloaded (one per link when `APP_ONLY_ONE_TRAILER` is off), and the
+search prefixes are only queried when no TMDB or *arr candidate is usable. The winner is downloaded from the
+metadata of the probe with `process_ie_result`; only the flat entries of the search prefixes are extracted again.
+
+Downloads are staged in a hidden `.partial` directory beside the item's trailer folder, on the same filesystem,
+so `Utils.post_process` can move the finished trailer in place with an atomic `os.replace`.
+
+In direct-to-target mode (`YT_DLP_DIRECT_TO_TARGET`), the format selector is derived from `FFMPEG_FILE_TYPE` and
+`TMDB_SIZE` so that yt-dlp downloads streams that can be muxed straight into the final container; the codecs of
+every downloaded file are recorded so `Utils.post_process` can skip ffmpeg when no transcode is needed.
+
 Dependencies:
     - os: Operating system interface for file operations.
+    - shutil: Removal of the leftovers of an earlier attempt.
+    - threading: Per-worker storage of the yt-dlp instances.
+    - time: Measure of the yt-dlp startup cost and of the downloads.
+    - concurrent.futures.ThreadPoolExecutor: Parallel metadata extraction of the candidates.
+    - datetime: Recency of the candidates.
     - yt_dlp: Library for downloading videos from YouTube.
     - modules.logger.Logger: Logger instance for logging messages.
     - modules.exceptions.DurationError: Exception raised when trailer duration exceeds the maximum length.
     - modules.exceptions.DownloadError: Exception raised for errors during trailer downloads.
+    - modules.log_context: Fields of the item, carried over to the probe threads.
+    - modules.metrics.metrics: Registry receiving the download durations and sizes.
+    - modules.profiler.profiler: Stage timers of the searches, the duration filter and the downloads.
     - modules.translator.Translator: Translator class for translating messages.
 
 Classes:
@@ -21,6 +46,11 @@ Attributes:
     logger (Logger): Logger instance for logging messages.
     config (dict): Configuration dictionary containing settings from `config.yaml`.
 
+Configuration:
+    - YT_DLP_PROBE_WORKERS (int): Number of candidates whose metadata is extracted at once. Defaults to 4.
+    - YT_DLP_DIRECT_TO_TARGET (bool): Select formats matching `FFMPEG_FILE_TYPE` to avoid re-encoding. Defaults to False.
+    - YT_DLP_CACHE_DIR (str): yt-dlp cache directory (deciphered signature functions). Defaults to yt-dlp's own.
+
 Usage:
     This module provides essential functions for downloading trailers from YouTube, processing them with FFMPEG,
     and interacting with external APIs like TMDB. Ensure `config.yaml` is configured correctly with relevant API keys
@@ -28,13 +58,28 @@ Usage:
 """
 
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
 import yt_dlp
+from modules import log_context
 from modules.logger import Logger
 from modules.exceptions import DurationError, DownloadError
+from modules.metrics import metrics
+from modules.profiler import profiler
 from modules.translator import Translator
 
 
 class YoutubeDL(Translator):
+    # Hidden staging directory created beside each trailer folder
+    PARTIAL_DIR = ".partial"
+
+    # Audio codec the trailers must have in each container for the ffmpeg step to be skipped
+    DIRECT_AUDIO_CODECS = {"mkv": "mp4a", "mp4": "mp4a", "webm": "opus"}
+
     def __init__(self, logger: Logger, config: dict) -> None:
         """
         Initialize YoutubeDL class with a logger and configuration.
@@ -44,6 +89,9 @@ class YoutubeDL(Translator):
         """
         self.logger = logger
         self.config = config
+        self._local = threading.local()
+        self._probe_pool = None
+        self._probe_lock = threading.Lock()
         super().__init__(config.get("APP_TRANSLATE"))
 
     def progress_hooks(self, d: dict):
@@ -57,6 +105,7 @@ class YoutubeDL(Translator):
         if d["status"] == "error":
             raise DownloadError(self.translate("The download of the trailer « {title} » failed.", title=title))
 
+    @profiler.hook("match_filter")
     def match_filter(self, info, *, incomplete):
         """
         Check the duration of a video and raise an error if it exceeds the maximum length.
@@ -80,14 +129,134 @@ class YoutubeDL(Translator):
                 )
             )
 
-    def yt_dlp_process(self, link: dict, ytdl_opts: dict) -> None:
+    def _downloader(self) -> tuple:
+        """
+        Return the yt-dlp instance of the calling thread, creating it on first use.
+
+        The hooks of the instance record their results in a state dictionary that `download_trailers()` resets for
+        every item, so the instance itself can be reused for the lifetime of the worker.
+
+        :return: Tuple (yt_dlp.YoutubeDL, state dictionary with video_keys and rejected lists)
+        """
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is not None:
+            return ydl, self._local.state
+
+        state = {"video_keys": [], "rejected": []}
+
+        def progress_hooks(d: dict):
+            info_dict = d.get("info_dict")
+            if d["status"] == "finished" and isinstance(info_dict, dict) and info_dict.get("id") not in state["video_keys"]:
+                state["video_keys"].append(info_dict.get("id"))
+            self.progress_hooks(d)
+
+        def match_filter(info, *, incomplete):
+            try:
+                return self.match_filter(info, incomplete=incomplete)
+            except DurationError:
+                state["rejected"].append(info.get("id"))
+                raise
+
+        ytdl_opts = {
+            "progress_hooks": [progress_hooks],
+            "format": self.format_selector(),
+            "noplaylist": True,
+            "no_warnings": self.config.get("YT_DLP_NO_WARNINGS", False),
+            "ignoreerrors": True,
+            "quiet": self.config.get("APP_QUIET_MODE", False),
+            "noprogress": self.config.get("APP_QUIET_MODE", False),
+            "sleep_interval_requests": self.config.get("YT_DLP_INTERVAL_REQUESTS", 1),
+            "match_filter": match_filter,
+        }
+        if self.config.get("YT_DLP_CACHE_DIR"):
+            ytdl_opts["cachedir"] = self.config["YT_DLP_CACHE_DIR"]
+        if self.direct_to_target():
+            ytdl_opts["merge_output_format"] = self.config.get("FFMPEG_FILE_TYPE", "mkv")
+        if self.config.get("YT_DLP_SKIP_INTROS", False):
+            ytdl_opts["postprocessors"] = [
+                {"key": "SponsorBlock"},
+                {"key": "ModifyChapters", "remove_sponsor_segments": self.config.get("YT_DLP_SPONSORS_BLOCK", [])},
+            ]
+
+        started = time.perf_counter()
+        ydl = yt_dlp.YoutubeDL(ytdl_opts)
+        self.logger.debug(
+            "yt-dlp downloader created for « {worker} » in « {duration} » ms.",
+            worker=threading.current_thread().name,
+            duration=int((time.perf_counter() - started) * 1000),
+        )
+        self._local.ydl = ydl
+        self._local.state = state
+        return ydl, state
+
+    def staging_path(self, item: dict) -> str:
+        """
+        Return the directory where the trailers of an item are downloaded and processed.
+
+        The directory is `<parent>/.partial/<name>` for a trailer folder `<parent>/<name>`, so it lives on the same
+        filesystem as the destination. Items without a trailer folder use `tmp/`.
+
+        :param item: Metadata of the item (movie or TV show)
+        :return: Staging directory of the item
+        """
+        dest = item.get("trailers_dest")
+        if not dest:
+            return f"tmp/{item['tmp']}"
+        dest = os.path.normpath(dest)
+        return os.path.join(os.path.dirname(dest), self.PARTIAL_DIR, os.path.basename(dest))
+
+    def direct_to_target(self) -> bool:
+        """
+        Check whether trailers are downloaded directly in the final container.
+
+        :return: True if `YT_DLP_DIRECT_TO_TARGET` is enabled and `FFMPEG_FILE_TYPE` is supported
+        """
+        return self.config.get("YT_DLP_DIRECT_TO_TARGET", False) and self.config.get("FFMPEG_FILE_TYPE", "mkv") in self.DIRECT_AUDIO_CODECS
+
+    def format_selector(self) -> str:
+        """
+        Build the yt-dlp format selector.
+
+        In direct-to-target mode, streams that can be muxed into `FFMPEG_FILE_TYPE` without re-encoding are preferred,
+        up to the `TMDB_SIZE` height; `YT_DLP_FORMAT` remains the last fallback.
+
+        :return: Format selector
+        """
+        fallback = self.config.get("YT_DLP_FORMAT", "bestvideo+bestaudio")
+        if not self.direct_to_target():
+            return fallback
+        filetype = self.config.get("FFMPEG_FILE_TYPE", "mkv")
+        audio = f"[acodec^={self.DIRECT_AUDIO_CODECS[filetype]}]"
+        size = self.config.get("TMDB_SIZE", None)
+        height = f"[height<={size}]" if size else ""
+        # Any video codec can be stored in Matroska, the other containers need streams of their own type
+        container = "" if filetype == "mkv" else f"[ext={filetype}]"
+        return f"bv*{height}{container}+ba{audio}/b{height}{container}{audio}/{fallback}"
+
+    @staticmethod
+    def _set_outtmpl(ydl: yt_dlp.YoutubeDL, outtmpl: str) -> None:
+        """
+        Swap the output template of a yt-dlp instance.
+
+        :param ydl: yt-dlp instance
+        :param outtmpl: New output template
+        """
+        # yt-dlp normalises `outtmpl` into a dictionary of templates when the instance is built
+        ydl.params["outtmpl"]["default"] = outtmpl
+
+    def yt_dlp_process(self, link: dict, ytdl_opts: Optional[dict] = None) -> None:
         """
         Download trailer using yt-dlp.
 
+        The download uses the yt-dlp instance of the calling thread; only the `outtmpl` of `ytdl_opts` is applied,
+        the other options come from the configuration.
+
         :param link: Trailer link information
         :param ytdl_opts: Options for yt-dlp
         """
-        ydl = yt_dlp.YoutubeDL(ytdl_opts)
+        ydl, _ = self._downloader()
+        if ytdl_opts and ytdl_opts.get("outtmpl"):
+            self._set_outtmpl(ydl, ytdl_opts["outtmpl"])
 
         title = link.get("name")
         yt_link = link.get("yt_link")
@@ -96,55 +265,241 @@ class YoutubeDL(Translator):
         self.logger.info("Trailer download from « {link} » for « {title} ».", title=f"{title}", link=yt_link)
         ydl.download(yt_link)
 
+    def _prober(self) -> yt_dlp.YoutubeDL:
+        """
+        Return the metadata-only yt-dlp instance of the calling thread, creating it on first use.
+
+        Search results are extracted flat, so a search costs a single request instead of one per result.
+
+        :return: yt_dlp.YoutubeDL instance
+        """
+        ydl = getattr(self._local, "prober", None)
+        if ydl is None:
+            opts = {
+                "quiet": True,
+                "no_warnings": True,
+                "noplaylist": True,
+                "ignoreerrors": True,
+                "skip_download": True,
+                "extract_flat": "in_playlist",
+                "sleep_interval_requests": self.config.get("YT_DLP_INTERVAL_REQUESTS", 1),
+            }
+            if self.config.get("YT_DLP_CACHE_DIR"):
+                opts["cachedir"] = self.config["YT_DLP_CACHE_DIR"]
+            ydl = yt_dlp.YoutubeDL(opts)
+            self._local.prober = ydl
+        return ydl
+
+    @profiler.hook("ytdlp_search")
+    def probe(self, link: dict, tier: int) -> List[dict]:
+        """
+        Extract the metadata of a link without downloading anything.
+
+        :param link: Trailer link information
+        :param tier: Priority of the link source (0 TMDB, 1 *arr, 2 search)
+        :return: One candidate per video found, with id, url, title, duration, height, published, official and
+            the extracted `info` when the entry is a full video rather than a flat search result
+        """
+        self.logger.info("Search trailers with « {query} ».", query=link["query_type"])
+        try:
+            info = self._prober().extract_info(link["yt_link"], download=False)
+        except Exception as err:
+            self.logger.error("Unexpected error for {link}: {error}", link=link.get("yt_link"), error=str(err))
+            return []
+        if not info:
+            return []
+
+        published = link.get("published_at")
+        candidates = []
+        entries = list(info["entries"] or []) if "entries" in info else [info]
+        for entry in entries:
+            if not entry or not entry.get("id"):
+                continue
+            upload_date = entry.get("timestamp") or entry.get("release_timestamp")
+            if upload_date is None and entry.get("upload_date"):
+                upload_date = datetime.strptime(entry["upload_date"], "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+            candidates.append(
+                {
+                    "id": entry["id"],
+                    "url": entry.get("webpage_url") or entry.get("url") or link["yt_link"],
+                    "title": entry.get("title") or link.get("name"),
+                    "duration": entry.get("duration"),
+                    "height": entry.get("height") or link.get("size") or 0,
+                    "published": published.timestamp() if published else upload_date or 0,
+                    "official": bool(link.get("official")),
+                    "tier": tier,
+                    "link": link,
+                    # Fully extracted videos are downloaded from this metadata, flat search entries are extracted again
+                    "info": entry if entry.get("_type", "video") == "video" and entry.get("formats") else None,
+                }
+            )
+        return candidates
+
+    @profiler.hook("match_filter")
+    def rank(self, candidates: List[dict], rejected: Optional[list] = None, known: Optional[set] = None) -> List[dict]:
+        """
+        Drop the candidates longer than `YT_DLP_MAX_LENGTH` or already downloaded, and sort the others, best first.
+
+        Candidates are ordered by official-ness, source, resolution (up to `TMDB_SIZE`) and recency.
+
+        :param candidates: Candidates returned by `probe()`
+        :param rejected: Optional list receiving the ids of the candidates that are too long
+        :param known: Optional set of YouTube ids already present in the trailer folder
+        :return: Accepted candidates, best first
+        """
+        max_length = self.config.get("YT_DLP_MAX_LENGTH", None)
+        target = self.config.get("TMDB_SIZE", None)
+        accepted = []
+        seen = set(known or ())
+        for candidate in candidates:
+            if candidate["id"] in seen:
+                continue
+            seen.add(candidate["id"])
+            duration = candidate["duration"]
+            if max_length is not None and duration and int(duration) > int(max_length):
+                self.logger.debug(
+                    "Trailer « {title} » is greater than « {duration} ».",
+                    title=candidate["title"],
+                    duration=f"{duration}/{max_length}",
+                )
+                if rejected is not None:
+                    rejected.append(candidate["id"])
+                continue
+            accepted.append(candidate)
+
+        def key(candidate: dict) -> tuple:
+            height = candidate["height"]
+            return (not candidate["official"], candidate["tier"], -min(height, target) if target else -height, -candidate["published"])
+
+        return sorted(accepted, key=key)
+
+    def resolve(self, links: List[dict], rejected: Optional[list] = None, known: Optional[set] = None) -> List[dict]:
+        """
+        Probe the links in parallel and rank the candidates.
+
+        TMDB and *arr links are probed first; the search links are only probed when none of them is usable.
+
+        :param links: List of trailer links, as built by `Utils.build_links()`
+        :param rejected: Optional list receiving the ids of the candidates that are too long
+        :param known: Optional set of YouTube ids already present in the trailer folder
+        :return: Accepted candidates, best first
+        """
+        with self._probe_lock:
+            if self._probe_pool is None:
+                self._probe_pool = ThreadPoolExecutor(max_workers=max(1, int(self.config.get("YT_DLP_PROBE_WORKERS", 4))), thread_name_prefix="probe")
+
+        tiers = [[], [], []]
+        for link in links:
+            query_type = link.get("query_type", "")
+            tier = 0 if query_type.startswith("API (TMDB)") else 1 if query_type.startswith("*arr") else 2
+            tiers[tier].append((link, tier))
+
+        # The probe threads log on behalf of the item being resolved
+        fields = log_context.current()
+
+        def probe(args: tuple) -> List[dict]:
+            with log_context.bind(**fields):
+                return self.probe(*args)
+
+        ranked = []
+        for batch in (tiers[0] + tiers[1], tiers[2]):
+            if not batch:
+                continue
+            results = self._probe_pool.map(probe, batch)
+            ranked = self.rank([candidate for candidates in results for candidate in candidates], rejected, known)
+            if ranked:
+                break
+        return ranked
+
     def download_trailers(self, links: list, item: dict) -> str:
         """
         Download trailers from YouTube.
 
+        The candidates are resolved first (see `resolve()`), then only the best one is downloaded, falling back to
+        the next one if the download fails. When `APP_ONLY_ONE_TRAILER` is off, the best candidate of every link is
+        downloaded.
+
+        The ids of the downloaded videos are stored in `item["video_keys"]`, the number of candidates rejected
+        by `YT_DLP_MAX_LENGTH` in `item["duration_rejections"]` and the container and audio codec of every
+        downloaded file in `item["downloaded_formats"]`.
+
         :param links: List of YouTube trailer links
         :param item: Metadata of the item (movie or TV show)
         :return: Path to the cache directory where trailers are downloaded
         """
 
         title = item["use_title"]
-        cache_path = f"tmp/{item['tmp']}"
+        cache_path = self.staging_path(item)
+        # Leftovers of an earlier attempt would be mistaken for new downloads
+        shutil.rmtree(cache_path, ignore_errors=True)
+        # Remember the folders created for the staging directory, they are removed with it when no trailer is written
+        created = []
+        parent = cache_path
+        while parent and not os.path.isdir(parent):
+            created.append(parent)
+            parent = os.path.dirname(parent)
+        item["staging_created"] = created
         os.makedirs(cache_path, exist_ok=True)
 
-        ytdl_opts = {
-            "progress_hooks": [self.progress_hooks],
-            "format": self.config.get("YT_DLP_FORMAT", "bestvideo+bestaudio"),
-            "noplaylist": True,
-            "no_warnings": self.config.get("YT_DLP_NO_WARNINGS", False),
-            "ignoreerrors": True,
-            "quiet": self.config.get("APP_QUIET_MODE", False),
-            "noprogress": self.config.get("APP_QUIET_MODE", False),
-            "sleep_interval_requests": self.config.get("YT_DLP_INTERVAL_REQUESTS", 1),
-            "match_filter": self.match_filter,
-        }
-        if self.config.get("YT_DLP_SKIP_INTROS", False):
-            ytdl_opts["postprocessors"] = [
-                {"key": "SponsorBlock"},
-                {"key": "ModifyChapters", "remove_sponsor_segments": self.config.get("YT_DLP_SPONSORS_BLOCK", [])},
-            ]
-        # Loop through each trailer link and attempt to download it
+        ydl, state = self._downloader()
+        state["video_keys"] = video_keys = []
+        state["rejected"] = rejected = []
+        downloaded_formats = {}
 
-        for link in links:
-            # if only one trailer use default name
-            if self.config.get("APP_ONLY_ONE_TRAILER", True):
-                # if have trailer continue to another item
-                if len(os.listdir(cache_path)) == 1:
-                    continue
-                ytdl_opts["outtmpl"] = f"{cache_path}/{title}.%(ext)s"
+        candidates = self.resolve(links, rejected, item.get("existing_video_ids"))
+        only_one = self.config.get("APP_ONLY_ONE_TRAILER", True)
+        if candidates:
+            best = candidates[0]
+            self.logger.info(
+                "« {count} » trailer candidates for « {title} », best is « {candidate} ».",
+                count=len(candidates),
+                title=title,
+                candidate=f"{best['title']} ({best['height'] or '?'}p, {best['duration'] or '?'} s)",
+            )
+        else:
+            self.logger.warning("No trailers were found with « {query} ».", query=", ".join(link["query_type"] for link in links))
+
+        used_links = set()
+        for candidate in candidates:
+            link = candidate["link"]
+            if only_one:
+                # Fall back to the next candidate only while nothing was downloaded
+                if len(os.listdir(cache_path)) >= 1:
+                    break
+                self._set_outtmpl(ydl, f"{cache_path}/{title}.%(ext)s")
             else:
-                ytdl_opts["outtmpl"] = f"{cache_path}/{link['name']}"
+                # One trailer per link: the best candidate of each link
+                if id(link) in used_links:
+                    continue
+                self._set_outtmpl(ydl, f"{cache_path}/{link['name']}")
 
-            self.logger.info("Search trailers with « {query} ».", query=link["query_type"])
+            started = time.perf_counter()
+            result = "failed"
             try:
-                ydl = yt_dlp.YoutubeDL(ytdl_opts)
-                self.logger.info("Trailer download from « {link} » for « {title} ».", title=f"{title}", link=link.get("yt_link"))
-                ydl.download(link.get("yt_link"))
-                if len(os.listdir(cache_path)) == 0:
-                    self.logger.warning("No trailers were found with « {query} ».", query=link["query_type"])
+                self.logger.info("Trailer download from « {link} » for « {title} ».", title=f"{title}", link=candidate["url"])
+                with profiler.stage("ytdlp_download"):
+                    if candidate.get("info"):
+                        info = ydl.process_ie_result(ydl.sanitize_info(candidate["info"], remove_private_keys=True), download=True)
+                    else:
+                        info = ydl.extract_info(candidate["url"], download=True)
+                for download in (info or {}).get("requested_downloads", []):
+                    if download.get("filepath"):
+                        if os.path.exists(download["filepath"]):
+                            result = "downloaded"
+                            metrics.inc("trailer_finder_ytdlp_downloaded_bytes_total", os.path.getsize(download["filepath"]))
+                        downloaded_formats[os.path.basename(download["filepath"])] = {
+                            "id": info.get("id"),
+                            "ext": download.get("ext") or info.get("ext"),
+                            "acodec": download.get("acodec") or info.get("acodec"),
+                        }
+                if candidate["id"] in video_keys:
+                    used_links.add(id(link))
             except DownloadError as e:
-                self.logger.error("Unexpected error for {link}: {error}", link=f"{title} - {link}", error=str(e))
+                self.logger.error("Unexpected error for {link}: {error}", link=f"{title} - {candidate['url']}", error=str(e))
                 continue
+            finally:
+                metrics.observe("trailer_finder_ytdlp_download_duration_seconds", time.perf_counter() - started, result=result)
+        item["video_keys"] = video_keys
+        item["duration_rejections"] = len(rejected)
+        item["downloaded_formats"] = downloaded_formats
         return cache_path